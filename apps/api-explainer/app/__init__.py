@@ -1,2 +1,4 @@
+import time
 
-
+# Start of the app import, for the start-up report: the package runs before any of its modules
+IMPORT_STARTED = time.perf_counter()
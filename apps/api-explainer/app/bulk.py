@@ -0,0 +1,280 @@
+"""Explain a corpus of documents offline, without the HTTP service.
+
+Usage (from apps/api-explainer):
+
+    python -m app.bulk corpus.jsonl -o results.jsonl --report report.json
+    python -m app.bulk archive/ -o results.jsonl --workers 8
+
+A JSONL corpus has one ``POST /explain`` body per line (``docText``,
+``docMeta``, ``locale``; ``deviceId`` is not needed), optionally with an
+``id``. A directory corpus is every ``*.txt`` file below it, identified by
+its relative path. Documents are read lazily and explained in batches across
+a process pool with a bounded number of batches in flight, so memory stays
+flat however large the corpus is. Results are written in input order as
+``{"id", "ok", "result"}`` lines (``"error"`` instead of ``"result"`` for
+documents that failed), like the items of ``POST /explain/batch``. The
+response cache and rate limits are not involved.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO
+
+from .document import Document
+from .pipeline import explain_document, get_extractor
+from .registry import get_registry
+
+DEFAULT_LOCALE = "en-IN"
+DEFAULT_BATCH_SIZE = 32
+# Batches queued per worker beyond the one it is running
+_BATCHES_AHEAD = 2
+# Per-document durations kept for the latency percentiles (a uniform sample beyond this)
+_LATENCY_SAMPLE = 10_000
+
+
+class BulkRecord(NamedTuple):
+    """One corpus document; ``error`` instead of ``text`` when it could not be read."""
+
+    id: str
+    text: Optional[str]
+    type_hint: Optional[str] = None
+    pages: Optional[int] = None
+    locale: str = DEFAULT_LOCALE
+    error: Optional[str] = None
+
+
+# (id, ok, response or error message, seconds, characters)
+BulkOutcome = tuple[str, bool, Any, float, int]
+
+
+def read_jsonl(path: Path, locale: str = DEFAULT_LOCALE) -> Iterator[BulkRecord]:
+    """Records of a JSONL corpus, one line at a time; ids default to the line number."""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record_id = str(number)
+            try:
+                body = json.loads(line)
+                record_id = str(body.get("id", record_id))
+                meta = body.get("docMeta") or {}
+                text = body["docText"]
+                if not isinstance(text, str):
+                    raise TypeError("'docText' must be a string")
+                yield BulkRecord(record_id, text, meta.get("typeHint"), meta.get("pages"), body.get("locale", locale))
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                yield BulkRecord(record_id, None, error=f"Invalid record: {type(e).__name__}: {e}")
+
+
+def read_directory(path: Path, locale: str = DEFAULT_LOCALE) -> Iterator[BulkRecord]:
+    """Records of every ``*.txt`` file below ``path``, in path order, read as they are needed."""
+    for file_path in _text_files(path):
+        record_id = file_path.relative_to(path).as_posix()
+        try:
+            yield BulkRecord(record_id, file_path.read_text(encoding="utf-8"), locale=locale)
+        except (OSError, UnicodeDecodeError) as e:
+            yield BulkRecord(record_id, None, error=f"Unreadable file: {e}")
+
+
+def _text_files(directory: Path) -> Iterator[Path]:
+    """``*.txt`` files below ``directory`` depth first, each directory listed and sorted only when reached."""
+    with os.scandir(directory) as listing:
+        entries = sorted(listing, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _text_files(Path(entry.path))
+        elif entry.name.endswith(".txt") and entry.is_file():
+            yield Path(entry.path)
+
+
+def explain_records(records: List[BulkRecord]) -> List[BulkOutcome]:
+    """Explain a batch of records in a worker, capturing failures per record."""
+    outcomes: List[BulkOutcome] = []
+    for record in records:
+        if record.text is None:
+            outcomes.append((record.id, False, record.error, 0.0, 0))
+            continue
+        started = time.perf_counter()
+        try:
+            text = record.text.strip()
+            if not text:
+                raise ValueError("Document text is required")
+            response = explain_document(Document(text, record.pages), record.type_hint, record.pages, record.locale)
+            outcomes.append((record.id, True, response, time.perf_counter() - started, len(record.text)))
+        except Exception as e:
+            outcomes.append(
+                (record.id, False, f"{type(e).__name__}: {e}", time.perf_counter() - started, len(record.text))
+            )
+    return outcomes
+
+
+class BulkReport:
+    """Throughput and field coverage of a bulk run, accumulated one outcome at a time."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.documents = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.chars = 0
+        self._seconds: List[float] = []
+        self._explained = 0
+        self._rng = random.Random(0)
+        self._doc_types: Counter = Counter()
+        self._issuers: Dict[str, Counter] = {}
+        self._fields: Dict[str, Counter] = {}
+        self._errors: Counter = Counter()
+
+    def add(self, ok: bool, payload: Any, seconds: float, chars: int) -> None:
+        self.documents += 1
+        self.chars += chars
+        if not ok:
+            self.failed += 1
+            # Error kinds, not messages: messages can quote the document
+            self._errors[str(payload).split(":", 1)[0]] += 1
+            return
+        self._explained += 1
+        if len(self._seconds) < _LATENCY_SAMPLE:
+            self._seconds.append(seconds)
+        else:
+            # Reservoir sampling keeps memory flat on corpora of millions of documents
+            slot = self._rng.randrange(self._explained)
+            if slot < _LATENCY_SAMPLE:
+                self._seconds[slot] = seconds
+        doc_type = payload["docType"]
+        self._doc_types[doc_type] += 1
+        self._fields.setdefault(doc_type, Counter()).update(payload["extractions"].keys())
+        if payload.get("issuer"):
+            self._issuers.setdefault(doc_type, Counter())[payload["issuer"]] += 1
+        if "timedOutFields" in payload:
+            self.timed_out += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        templates = get_registry().current().templates
+        doc_types = {}
+        for doc_type, count in self._doc_types.most_common():
+            template = templates.get(doc_type)
+            names = [f.name for f in template.fields] if template else sorted(self._fields[doc_type])
+            fields = {name: round(self._fields[doc_type][name] / count, 4) for name in names}
+            doc_types[doc_type] = {
+                "documents": count,
+                "coverage": round(sum(fields.values()) / len(fields), 4) if fields else 0.0,
+                "fields": fields,
+                "issuers": dict(self._issuers.get(doc_type, Counter()).most_common()),
+            }
+        cuts = statistics.quantiles(self._seconds, n=100, method="inclusive") if len(self._seconds) > 1 else None
+        return {
+            "documents": self.documents,
+            "failed": self.failed,
+            "timedOut": self.timed_out,
+            "seconds": round(elapsed, 3),
+            "docsPerSecond": round(self.documents / elapsed, 1) if elapsed else 0.0,
+            "charsPerSecond": round(self.chars / elapsed) if elapsed else 0,
+            "p50Ms": round(statistics.median(self._seconds) * 1000, 3) if self._seconds else 0.0,
+            "p99Ms": round((cuts[98] if cuts else self._seconds[0]) * 1000, 3) if self._seconds else 0.0,
+            "errors": dict(self._errors.most_common()),
+            "docTypes": doc_types,
+        }
+
+
+def _batches(records: Iterable[BulkRecord], size: int) -> Iterator[List[BulkRecord]]:
+    iterator = iter(records)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _write(out: TextIO, report: BulkReport, outcomes: List[BulkOutcome]) -> None:
+    for record_id, ok, payload, seconds, chars in outcomes:
+        report.add(ok, payload, seconds, chars)
+        line = {"id": record_id, "ok": ok, "result" if ok else "error": payload}
+        out.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def run_bulk(
+    records: Iterable[BulkRecord],
+    out: TextIO,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> BulkReport:
+    """Explain ``records`` across ``workers`` processes (default: one per CPU) and write result lines to ``out``.
+
+    With one worker, documents are explained in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    report = BulkReport()
+    batches = _batches(records, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            _write(out, report, explain_records(batch))
+        return report
+
+    # Results are written in input order; reading pauses while this many batches are unwritten
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=get_extractor) as pool:
+        for batch in batches:
+            if len(pending) >= workers * (1 + _BATCHES_AHEAD):
+                _write(out, report, pending.popleft().result())
+            pending.append(pool.submit(explain_records, batch))
+        while pending:
+            _write(out, report, pending.popleft().result())
+    return report
+
+
+def print_report(report: Dict[str, Any], out: TextIO) -> None:
+    print(
+        f"{report['documents']} documents ({report['failed']} failed, {report['timedOut']} timed out) "
+        f"in {report['seconds']:.1f}s: {report['docsPerSecond']:.1f} docs/s, "
+        f"p50 {report['p50Ms']:.2f}ms, p99 {report['p99Ms']:.2f}ms per document",
+        file=out,
+    )
+    for doc_type, stats in report["docTypes"].items():
+        print(f"  {doc_type}: {stats['documents']} documents, {stats['coverage']:.0%} field coverage", file=out)
+        for name, rate in stats["fields"].items():
+            print(f"    {name:<24} {rate:6.1%}", file=out)
+    for error, count in report["errors"].items():
+        print(f"  error {error}: {count}", file=out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", type=Path, help="JSONL file or directory of .txt files")
+    parser.add_argument("-o", "--output", default="-", help="result JSONL file (default: stdout)")
+    parser.add_argument("--report", type=Path, help="also write the report as JSON to this file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="documents per worker task")
+    parser.add_argument("--locale", default=DEFAULT_LOCALE, help="locale for records that do not set one")
+    args = parser.parse_args(argv)
+
+    if args.corpus.is_dir():
+        records = read_directory(args.corpus, args.locale)
+    elif args.corpus.is_file():
+        records = read_jsonl(args.corpus, args.locale)
+    else:
+        print(f"No such corpus: {args.corpus}", file=sys.stderr)
+        return 1
+
+    if args.output == "-":
+        report = run_bulk(records, sys.stdout, args.workers, args.batch_size)
+    else:
+        with open(args.output, "w", encoding="utf-8") as out:
+            report = run_bulk(records, out, args.workers, args.batch_size)
+    summary = report.to_dict()
+    print_report(summary, sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
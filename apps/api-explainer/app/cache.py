@@ -1,56 +1,180 @@
 import hashlib
-import json
-from typing import Any, Optional
-
-from redis import Redis
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Optional
 
+from .codec import decode_value, encode_value
 from .config import settings
 
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
 
-_redis_client: Optional[Redis] = None
+class LRUCache:
+    """Bounded in-process LRU with per-entry TTL.
 
+    Values are shared with callers and must be treated as read-only.
+    """
 
-def get_redis() -> Optional[Redis]:
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store ``value``; ``ttl_seconds`` can only shorten the cache-wide TTL."""
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_l1 = LRUCache(settings.l1_cache_size, min(settings.l1_cache_ttl_seconds, settings.cache_ttl_days * 24 * 60 * 60))
+_stats: dict[str, dict[str, int]] = {
+    "l1": {"hits": 0, "misses": 0},
+    "redis": {"hits": 0, "misses": 0},
+}
+_redis_client: Optional["Redis"] = None
+
+
+def get_redis() -> Optional["Redis"]:
     global _redis_client
     if _redis_client is not None:
         return _redis_client
     if not settings.redis_url:
         return None
-    _redis_client = Redis.from_url(settings.redis_url, decode_responses=True)
+    # Imported on first use: workers without REDIS_URL never load the client
+    from redis.asyncio import Redis
+
+    _redis_client = Redis.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+    )
     return _redis_client
 
 
+async def close_redis() -> None:
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+
+
 def content_hash(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def cache_get(key: str) -> Optional[dict[str, Any]]:
-    client = get_redis()
-    if not client:
-        return None
-    raw = client.get(key)
-    return json.loads(raw) if raw else None
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Hit/miss counters per cache tier, plus the current L1 size."""
+    return {
+        "l1": {**_stats["l1"], "size": len(_l1)},
+        "redis": dict(_stats["redis"]),
+    }
+
 
+async def cache_get(key: str) -> Optional[dict[str, Any]]:
+    value = _l1.get(key)
+    if value is not None:
+        _stats["l1"]["hits"] += 1
+        return value
+    _stats["l1"]["misses"] += 1
 
-def cache_set(key: str, value: dict[str, Any]) -> None:
     client = get_redis()
     if not client:
-        return
-    ttl_seconds = settings.cache_ttl_days * 24 * 60 * 60
-    client.setex(key, ttl_seconds, json.dumps(value))
+        return None
+    async with client.pipeline(transaction=False) as pipe:
+        raw, pttl = await pipe.get(key).pttl(key).execute()
+    value = decode_value(raw)
+    if value is None:
+        _stats["redis"]["misses"] += 1
+        return None
+    _stats["redis"]["hits"] += 1
+    _l1_set_remaining(key, value, pttl)
+    return value
 
 
-def rate_limit_allow(device_id: str) -> bool:
-    """Allow request if under RATE_LIMIT_RPM for this device. Uses Redis if available.
-    Fallback: always allow when Redis is not configured.
+def _l1_set_remaining(key: str, value: dict[str, Any], pttl: int) -> None:
+    """Copy a Redis hit into L1 for no longer than Redis keeps it (``pttl`` in ms; -1 never expires).
+
+    Entries stored until midnight (date-relative responses) must not outlive it in L1.
     """
+    if pttl == -1:
+        _l1.set(key, value)
+    elif pttl > 0:
+        _l1.set(key, value, pttl / 1000)
+
+
+async def cache_set(key: str, value: dict[str, Any], ttl_seconds: Optional[int] = None) -> None:
+    """Store an entry for ``ttl_seconds`` (default ``CACHE_TTL_DAYS``)."""
+    _l1.set(key, value, ttl_seconds)
     client = get_redis()
     if not client:
-        return True
-    key = f"ratelimit:{device_id}:{int(__import__('time').time() // 60)}"
-    count = client.incr(key)
-    if count == 1:
-        client.expire(key, 60)
-    return count <= settings.rate_limit_rpm
-
+        return
+    ttl_seconds = ttl_seconds or settings.cache_ttl_days * 24 * 60 * 60
+    await client.setex(key, ttl_seconds, encode_value(value))
+
+
+async def cache_get_many(keys: list[str]) -> list[Optional[dict[str, Any]]]:
+    """Look up many keys: L1 first, then a single pipelined MGET (and PTTL of each) for the rest."""
+    values: list[Optional[dict[str, Any]]] = []
+    missing: list[int] = []
+    for i, key in enumerate(keys):
+        value = _l1.get(key)
+        if value is not None:
+            _stats["l1"]["hits"] += 1
+        else:
+            _stats["l1"]["misses"] += 1
+            missing.append(i)
+        values.append(value)
 
+    client = get_redis()
+    if not client or not missing:
+        return values
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.mget([keys[i] for i in missing])
+        for i in missing:
+            pipe.pttl(keys[i])
+        raws, *pttls = await pipe.execute()
+    for i, raw, pttl in zip(missing, raws, pttls):
+        value = decode_value(raw)
+        if value is None:
+            _stats["redis"]["misses"] += 1
+            continue
+        _stats["redis"]["hits"] += 1
+        values[i] = value
+        _l1_set_remaining(keys[i], value, pttl)
+    return values
+
+
+async def cache_set_many(items: dict[str, dict[str, Any]], ttl_seconds: Optional[int] = None) -> None:
+    """Store many entries with one pipelined round trip, for ``ttl_seconds`` (default ``CACHE_TTL_DAYS``)."""
+    for key, value in items.items():
+        _l1.set(key, value, ttl_seconds)
+    client = get_redis()
+    if not client or not items:
+        return
+    ttl_seconds = ttl_seconds or settings.cache_ttl_days * 24 * 60 * 60
+    async with client.pipeline(transaction=False) as pipe:
+        for key, value in items.items():
+            pipe.setex(key, ttl_seconds, encode_value(value))
+        await pipe.execute()
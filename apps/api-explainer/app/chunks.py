@@ -0,0 +1,235 @@
+"""Content-defined document chunks with cached per-chunk scan results.
+
+Near-duplicate uploads (a re-photographed bill, an added page) share most of
+their chunks. Each chunk's classifier keyword hits and, per doc type, the first
+match of the field patterns a request needed there are cached under a hash of
+the chunk's whitespace-normalized text, so only chunks that changed are
+scanned again. Chunks are scanned with the start of the next chunk as context,
+so results equal those of a search over the full text.
+"""
+
+import hashlib
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Set, Tuple, Union
+
+from .document import PAGE_BREAK, Document
+from .matching import WINDOW_OVERLAP, RegexBudgetExceeded, bounded_search
+from .registry import CompiledField, CompiledTemplate
+
+MIN_CHUNK_CHARS = 256
+MAX_CHUNK_CHARS = 4096
+# Cut after a line whose hash has these low bits clear: about one line in eight
+_BOUNDARY_MASK = 0x7
+# Bumped when the record layout changes, so records in the old layout are never read
+_RECORD_FORMAT = 2
+
+
+def normalize_line(line: str) -> str:
+    """Collapse whitespace so spacing noise from OCR does not change a chunk's hash."""
+    return " ".join(line.split())
+
+
+def split_chunks(text: str) -> List[Tuple[int, int]]:
+    """``[start, end)`` chunk spans covering ``text``.
+
+    Form-feed pages are chunks of their own. Otherwise chunks are runs of whole
+    lines cut where a line's normalized hash hits the boundary mask (once the
+    chunk holds ``MIN_CHUNK_CHARS``) or at ``MAX_CHUNK_CHARS``. Boundaries
+    depend only on nearby content, so an inserted or edited line changes only
+    the chunk containing it.
+    """
+    if PAGE_BREAK in text:
+        spans = []
+        start = 0
+        for page in text.split(PAGE_BREAK):
+            spans.append((start, start + len(page)))
+            start += len(page) + 1
+        return spans
+
+    spans = []
+    length = len(text)
+    start = pos = 0
+    while pos < length:
+        line_end = text.find("\n", pos)
+        if line_end == -1:
+            line_end = length
+        size = line_end - start
+        if size >= MAX_CHUNK_CHARS or (
+            size >= MIN_CHUNK_CHARS
+            and zlib.crc32(normalize_line(text[pos:line_end]).encode("utf-8")) & _BOUNDARY_MASK == 0
+        ):
+            spans.append((start, line_end))
+            start = line_end + 1
+        pos = line_end + 1
+    if start < length or not spans:
+        spans.append((start, length))
+    return spans
+
+
+def chunk_hash(chunk: str) -> str:
+    if "  " in chunk or " \n" in chunk or "\n " in chunk or chunk[:1] == " " or chunk[-1:] == " ":
+        # normalize_line, inlined as maps: this runs over every line of every request
+        chunk = "\n".join(map(" ".join, map(str.split, chunk.split("\n"))))
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+
+
+class DocumentChunks:
+    """Chunks of one document and their scan records, filled from the cache or on demand.
+
+    A chunk is scanned together with the first ``WINDOW_OVERLAP`` characters
+    after it, so a match that starts in the chunk and crosses into the next
+    is still found and its tail is not cut short; the cache key hashes that
+    whole scanned text. A record is ``{"keywords": [...], "crc": ..., "fields":
+    {scan_key: {field: [hit, ...]}}}``, with one hit per pattern scanned so
+    far, in priority order: ``[offset, length]`` of the value of the first
+    match starting in the chunk (offset from the chunk start), ``[offset, -1]``
+    for a match that runs past the scanned text and is searched again from
+    ``offset`` in the full text, or None. The scan key is the doc type, or
+    ``doc_type@issuer`` for an issuer's variant of the template, whose
+    pattern lists differ. Patterns are scanned only as far as a field needs
+    them, so a chunk after the one a field is found in is not searched for it.
+
+    Values themselves are not stored, so cached records hold no document text
+    (or PII). Field hits are only used when ``crc`` (the CRC-32 of the exact
+    scanned text) matches; a chunk differing only in spacing keeps its keyword
+    hits but is scanned for fields again. Records loaded from the cache are
+    shared and are copied before being extended.
+    """
+
+    def __init__(self, document: Union[str, Document], template_version: str):
+        self._document = Document.wrap(document)
+        self._text = text = self._document.text
+        self.spans = split_chunks(text)
+        length = len(text)
+        # Matches starting before the next chunk belong to this one; they are searched up to WINDOW_OVERLAP past it
+        self._owned_ends = [start for start, _ in self.spans[1:]] + [length]
+        self._scan_ends = [min(length, end + WINDOW_OVERLAP) if end < length else length for end in self._owned_ends]
+        self.keys = [
+            f"chunk:{_RECORD_FORMAT}:{template_version}:{chunk_hash(text[start:scan_end])}"
+            for (start, _), scan_end in zip(self.spans, self._scan_ends)
+        ]
+        self._records: List[Dict[str, Any]] = [{} for _ in self.spans]
+        self._crcs: Optional[List[int]] = None
+        self._updated: Set[int] = set()
+        self.reused = 0
+
+    def load(self, records: Iterable[Optional[Dict[str, Any]]]) -> None:
+        """Attach cached records, in ``keys`` order (None for misses)."""
+        self._records = []
+        for i, record in enumerate(records):
+            record = record or {}
+            if "fields" in record and record.get("crc") != self._crc(i):
+                # Same normalized text, different spacing: offsets and misses may not hold here
+                record = {"keywords": record["keywords"]} if "keywords" in record else {}
+            self._records.append(record)
+        self.reused = sum(1 for record in self._records if record)
+
+    def updated(self) -> Dict[str, Dict[str, Any]]:
+        """Records created or extended by this request, keyed for the cache."""
+        return {self.keys[i]: self._records[i] for i in sorted(self._updated)}
+
+    def adopt(self, updated: Dict[str, Dict[str, Any]]) -> None:
+        """Take over records created for these chunks elsewhere (e.g. in a worker process)."""
+        for i, key in enumerate(self.keys):
+            if key in updated:
+                self._records[i] = updated[key]
+                self._updated.add(i)
+
+    def _crc(self, i: int) -> int:
+        if self._crcs is None:
+            text = self._text
+            self._crcs = [
+                zlib.crc32(text[start:scan_end].encode("utf-8"))
+                for (start, _), scan_end in zip(self.spans, self._scan_ends)
+            ]
+        return self._crcs[i]
+
+    def _own(self, i: int) -> Dict[str, Any]:
+        """Record ``i``, copied on its first change by this request."""
+        if i not in self._updated:
+            record = self._records[i]
+            fields = record.get("fields", {})
+            self._records[i] = {
+                **record,
+                "fields": {key: {name: list(hits) for name, hits in by_field.items()} for key, by_field in fields.items()},
+            }
+            self._updated.add(i)
+        return self._records[i]
+
+    def keywords(self, find: Callable[[str], Iterable[int]]) -> Set[int]:
+        """Union of per-chunk keyword hits; ``find`` scans the lowercase text of chunks that have none cached."""
+        found: Set[int] = set()
+        for i, (start, _) in enumerate(self.spans):
+            if "keywords" not in self._records[i]:
+                self._own(i)["keywords"] = sorted(find(self._document.lower[start:self._scan_ends[i]]))
+            found.update(self._records[i]["keywords"])
+        return found
+
+    def field_match(
+        self, template: CompiledTemplate, field: CompiledField, window_chars: int, deadline: Optional[float]
+    ) -> Optional[Tuple[str, int, int, int]]:
+        """``(value, start, end, pattern index)`` of the field as a full-text search would find it, chunk by chunk.
+
+        Patterns are tried in priority order; for each, the first chunk where it
+        matches decides (an empty value moves on to the next pattern, as in
+        ``TemplateExtractor.extract``). Chunks without a record of the pattern
+        are scanned for it.
+        """
+        for priority, pattern in enumerate(field.patterns):
+            for i, (start, _) in enumerate(self.spans):
+                hit = self._hit(i, template, field, priority, window_chars, deadline)
+                if hit is None:
+                    continue
+                offset, length = hit
+                if length < 0:
+                    # Crosses the scanned text's end: only a search of the full text sees the whole match
+                    match = bounded_search(pattern, self._text, window_chars, deadline, start + offset)
+                    value = match.group(field.group_name) if match else None
+                    if not value:
+                        break
+                    return (value, *match.span(field.group_name), priority)
+                if not length:
+                    break
+                value_start = start + offset
+                return self._text[value_start:value_start + length], value_start, value_start + length, priority
+        return None
+
+    def _hit(
+        self,
+        i: int,
+        template: CompiledTemplate,
+        field: CompiledField,
+        priority: int,
+        window_chars: int,
+        deadline: Optional[float],
+    ) -> Optional[List[int]]:
+        """Chunk ``i``'s hit for the field's pattern ``priority``, scanning for it (and skipped patterns) if not recorded."""
+        hits = self._records[i].get("fields", {}).get(template.scan_key, {}).get(field.name, ())
+        if len(hits) <= priority:
+            record = self._own(i)
+            record["crc"] = self._crc(i)
+            hits = record["fields"].setdefault(template.scan_key, {}).setdefault(field.name, [])
+            for pattern in field.patterns[len(hits):priority + 1]:
+                hits.append(self._scan(i, pattern, field.group_name, window_chars, deadline))
+        return hits[priority]
+
+    def _scan(
+        self, i: int, pattern: Pattern[str], group: str, window_chars: int, deadline: Optional[float]
+    ) -> Optional[List[int]]:
+        """The record entry for the first match of ``pattern`` starting in chunk ``i``."""
+        start, _ = self.spans[i]
+        owned_end, scan_end = self._owned_ends[i], self._scan_ends[i]
+        if deadline is not None and time.perf_counter() > deadline:
+            raise RegexBudgetExceeded
+        # Chunks are usually no longer than a search window; those are searched whole
+        if 0 < window_chars < scan_end - start:
+            match = bounded_search(pattern, self._text, window_chars, deadline, start, scan_end)
+        else:
+            match = pattern.search(self._text, start, scan_end)
+        if match is None or match.start() >= owned_end:
+            return None
+        if match.end() > owned_end and scan_end < len(self._text):
+            return [match.start() - start, -1]
+        value = match.group(group) or ""
+        return [match.start(group) - start if value else 0, len(value)]
@@ -0,0 +1,108 @@
+"""Single-flight coalescing of concurrent explains of the same document.
+
+Identical documents arriving together (a circular mailed to a whole school)
+would all miss the cache and compute the same response before the first one
+stores it. Within a worker, requests for a key that is already being computed
+await that computation. Across workers, the computing request holds a short
+Redis lock (``COALESCE_LOCK_MS``) and the others poll Redis, backing off,
+until the response lands or the lock goes away.
+"""
+
+import asyncio
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .cache import get_redis
+from .codec import decode_value
+from .config import settings
+from .metrics import StageTimer, count_coalesced, stage
+
+# Polls for another worker's response start quick (small documents) and back off to the maximum
+_POLL_MIN_SECONDS = 0.01
+_POLL_MAX_SECONDS = 0.2
+
+# KEYS[1]: lock key, ARGV[1]: owner token
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_flights: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+
+
+async def coalesce(
+    key: str,
+    compute: Callable[[], Awaitable[Dict[str, Any]]],
+    timer: Optional[StageTimer] = None,
+) -> Dict[str, Any]:
+    """The response for cache ``key``: computed once per key however many requests await it.
+
+    ``compute`` must store its response under ``key`` so requests in other
+    workers can pick it up. It runs in a task of its own, so the requests
+    sharing it are unaffected if the one that started it disconnects; they
+    all see its result or exception. Time spent waiting on another request
+    is recorded as the ``coalesce`` stage.
+    """
+    flight = _flights.get(key)
+    if flight is not None:
+        count_coalesced("local")
+        with stage(timer, "coalesce"):
+            return await asyncio.shield(flight)
+    flight = asyncio.ensure_future(_fly(key, compute, timer))
+    _flights[key] = flight
+    flight.add_done_callback(lambda _: _flights.pop(key, None))
+    return await asyncio.shield(flight)
+
+
+async def _fly(
+    key: str, compute: Callable[[], Awaitable[Dict[str, Any]]], timer: Optional[StageTimer]
+) -> Dict[str, Any]:
+    client = get_redis()
+    if client is None or settings.coalesce_lock_ms <= 0:
+        count_coalesced("computed")
+        return await compute()
+
+    lock_key = f"lock:{key}"
+    token = secrets.token_hex(8)
+    if not await client.set(lock_key, token, nx=True, px=settings.coalesce_lock_ms):
+        with stage(timer, "coalesce"):
+            cached = await _await_remote(key, lock_key)
+        if cached is not None:
+            count_coalesced("redis")
+            return cached
+        # The other worker gave up or failed; compute without waiting again
+        count_coalesced("computed")
+        return await compute()
+    try:
+        count_coalesced("computed")
+        return await compute()
+    finally:
+        await client.eval(_RELEASE_LUA, 1, lock_key, token)
+
+
+async def _await_remote(key: str, lock_key: str) -> Optional[Dict[str, Any]]:
+    """Poll for the response another worker is computing; None once its lock is gone without one.
+
+    Each poll is one round trip reading Redis directly: the response is not in
+    this worker's L1, and counting every poll as a cache miss would drown the
+    real hit rate.
+    """
+    client = get_redis()
+    deadline = time.monotonic() + settings.coalesce_lock_ms / 1000
+    delay = _POLL_MIN_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, _POLL_MAX_SECONDS)
+        # Lock first: the response is stored before the lock is released, so a gone lock means a final read
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.exists(lock_key)
+            pipe.get(key)
+            locked, raw = await pipe.execute()
+        cached = decode_value(raw)
+        if cached is not None or not locked:
+            # Released without a response when the computation failed or timed out (those are not cached)
+            return cached
+    return None
@@ -0,0 +1,140 @@
+"""Binary encoding of Redis cache values.
+
+Every value starts with a format byte naming the codec that wrote it, so the
+encoding can change without flushing the cache: readers decode any format
+they know and treat the rest as misses. Entries written before format bytes
+existed are plain JSON text and are still read.
+
+Explain responses repeat field names, citation keys and summary phrasing, so
+they compress well; values of at least ``CACHE_COMPRESS_MIN_BYTES`` are
+zlib-compressed when that makes them smaller.
+"""
+
+import json
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from .config import settings
+
+# Legacy entries are JSON objects, so their first byte is "{"
+_LEGACY_JSON = ord("{")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON: no insignificant whitespace, UTF-8 instead of ``\\u`` escapes."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class CacheCodec(ABC):
+    """Packs the compact JSON of cache values, behind a one-byte format tag."""
+
+    name: str
+    format: int
+
+    @abstractmethod
+    def pack(self, data: bytes) -> bytes:
+        """``data`` packed for storage."""
+
+    @abstractmethod
+    def unpack(self, payload: bytes) -> bytes:
+        """The data ``payload`` was packed from."""
+
+
+class PlainCodec(CacheCodec):
+    """Compact JSON as is."""
+
+    name = "plain"
+    format = 1
+
+    def pack(self, data: bytes) -> bytes:
+        return data
+
+    def unpack(self, payload: bytes) -> bytes:
+        return payload
+
+
+class ZlibCodec(CacheCodec):
+    """Compact JSON, zlib-compressed at ``CACHE_COMPRESS_LEVEL``."""
+
+    name = "zlib"
+    format = 2
+
+    def pack(self, data: bytes) -> bytes:
+        return zlib.compress(data, settings.cache_compress_level)
+
+    def unpack(self, payload: bytes) -> bytes:
+        return zlib.decompress(payload)
+
+
+_CODECS: Dict[int, CacheCodec] = {}
+_CODECS_BY_NAME: Dict[str, CacheCodec] = {}
+
+
+def register_codec(codec: CacheCodec) -> None:
+    """Make ``codec`` available for decoding, and for writing via ``CACHE_CODEC=<name>``.
+
+    ``CACHE_CODEC`` is resolved when this module is imported, so only codecs
+    registered here can be selected for writing.
+    """
+    _CODECS[codec.format] = codec
+    _CODECS_BY_NAME[codec.name] = codec
+
+
+def codec_for_name(name: str) -> CacheCodec:
+    """The registered codec called ``name``; raises ValueError naming the known ones otherwise."""
+    codec = _CODECS_BY_NAME.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown CACHE_CODEC '{name}'; expected one of: {', '.join(sorted(_CODECS_BY_NAME))}")
+    return codec
+
+
+register_codec(PlainCodec())
+register_codec(ZlibCodec())
+# Fails the start-up, rather than every cache write, when CACHE_CODEC is misspelt
+_write_codec = codec_for_name(settings.cache_codec)
+
+_stats_lock = threading.Lock()
+_stats = {"values": 0, "json_bytes": 0, "stored_bytes": 0}
+
+
+def codec_stats() -> Dict[str, int]:
+    """Values written, their compact JSON size and the bytes actually stored (format bytes included)."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def encode_value(value: Any) -> bytes:
+    """``value`` as a format byte and payload, ready to store.
+
+    The ``CACHE_CODEC`` codec packs values of at least ``CACHE_COMPRESS_MIN_BYTES``
+    of JSON; smaller values, and those packing does not shrink, are stored plain.
+    """
+    data = dumps(value)
+    json_bytes = len(data)
+    codec_format = PlainCodec.format
+    codec = _write_codec
+    if codec.format != PlainCodec.format and json_bytes >= settings.cache_compress_min_bytes:
+        packed = codec.pack(data)
+        if len(packed) < json_bytes:
+            data, codec_format = packed, codec.format
+    with _stats_lock:
+        _stats["values"] += 1
+        _stats["json_bytes"] += json_bytes
+        _stats["stored_bytes"] += len(data) + 1
+    return bytes((codec_format,)) + data
+
+
+def decode_value(raw: bytes) -> Optional[Any]:
+    """The value ``raw`` encodes, or None when its format is unknown or it is corrupt (a cache miss)."""
+    if not raw:
+        return None
+    try:
+        if raw[0] == _LEGACY_JSON:
+            return json.loads(raw)
+        codec = _CODECS.get(raw[0])
+        return json.loads(codec.unpack(raw[1:])) if codec is not None else None
+    except (ValueError, zlib.error):
+        # A corrupt entry is recomputed and overwritten
+        return None
@@ -9,6 +9,26 @@ class Settings(BaseModel):
     rate_limit_rpm: int = int(os.getenv("RATE_LIMIT_RPM", "60"))
     cache_ttl_days: int = int(os.getenv("CACHE_TTL_DAYS", "30"))
     redis_url: str | None = os.getenv("REDIS_URL")
+    redis_max_connections: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    l1_cache_size: int = int(os.getenv("L1_CACHE_SIZE", "1024"))
+    l1_cache_ttl_seconds: int = int(os.getenv("L1_CACHE_TTL_SECONDS", "300"))
+    extract_workers: int = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+    explain_executor: str = os.getenv("EXPLAIN_EXECUTOR", "process")
+    explain_queue_size: int = int(os.getenv("EXPLAIN_QUEUE_SIZE", str(4 * (os.cpu_count() or 1))))
+    explain_timeout_seconds: float = float(os.getenv("EXPLAIN_TIMEOUT_SECONDS", "10"))
+    warm_start: bool = os.getenv("WARM_START", "true").lower() == "true"
+    cache_codec: str = os.getenv("CACHE_CODEC", "zlib")
+    cache_compress_min_bytes: int = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "512"))
+    cache_compress_level: int = int(os.getenv("CACHE_COMPRESS_LEVEL", "6"))
+    coalesce_lock_ms: int = int(os.getenv("COALESCE_LOCK_MS", "10000"))
+    batch_max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    stream_max_line_bytes: int = int(os.getenv("STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+    template_poll_seconds: float = float(os.getenv("TEMPLATE_POLL_SECONDS", "5"))
+    regex_budget_ms: int = int(os.getenv("REGEX_BUDGET_MS", "250"))
+    regex_window_chars: int = int(os.getenv("REGEX_WINDOW_CHARS", "4096"))
+    chunk_cache: bool = os.getenv("CHUNK_CACHE", "true").lower() == "true"
+    chunk_cache_ttl_seconds: int = int(os.getenv("CHUNK_CACHE_TTL_SECONDS", "86400"))
+    redact_pii: bool = os.getenv("REDACT_PII", "true").lower() == "true"
     disable_llm: bool = os.getenv("DISABLE_LLM", "true").lower() == "true"
 
 
@@ -0,0 +1,222 @@
+"""Per-request document text, normalized once, and the indexes shared by the extraction stages."""
+
+import re
+import unicodedata
+from bisect import bisect_right
+from functools import cached_property, lru_cache
+from typing import Any, Dict, List, Mapping, Match, Optional, Pattern, Tuple, Union
+
+from .matching import bounded_search
+from .registry import CompiledSection
+
+PAGE_BREAK = "\f"
+
+# ASCII folds: tabs and carriage returns become spaces, so CRLF text matches ``$`` like LF text
+_ASCII_FOLD = {"\t": " ", "\r": " ", "\v": " "}
+# Typographic punctuation that NFKC leaves alone
+_PUNCTUATION_FOLD = {"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"', "\u2010": "-", "\u2013": "-", "\u2014": "-"}
+# OCR letter/digit confusions inside numbers: "2O25", "1,2O0.00", "1I0". Only letters with digits (or
+# digit separators) on both sides: "5l", "10l" and "2o" are units and words. One pattern per letter so
+# each keeps a literal first character for the regex engine's fast scan
+_OCR_DIGITS = tuple(
+    (re.compile(rf"{letter}(?:(?<=\d{letter})(?=\d|[,.]\d)|(?<=\d[,.]{letter})(?=\d))"), digit)
+    for letter, digit in (("O", "0"), ("o", "0"), ("I", "1"), ("l", "1"))
+)
+_ASCII_RUNS = re.compile(r"[\x00-\x7f]+")
+# Distinct non-ASCII characters whose folds are kept; a document in another script uses a few hundred
+_FOLD_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=_FOLD_CACHE_SIZE)
+def _fold_char(char: str) -> str:
+    """Replacement for one non-ASCII character: ASCII digits for any decimal digit, else its
+    one-character NFKC form (full-width letters, non-breaking and other Unicode spaces)."""
+    if char.isdecimal():
+        return str(unicodedata.decimal(char))
+    if char in _PUNCTUATION_FOLD:
+        return _PUNCTUATION_FOLD[char]
+    if char.isspace() and char not in "\n\f\x1c\x1d\x1e\x85\u2028\u2029":
+        return " "
+    folded = unicodedata.normalize("NFKC", char)
+    return folded if len(folded) == 1 else char
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of document text that every stage matches against.
+
+    Unicode is folded to ASCII where a single character will do (NFKC, other
+    scripts' digits, typographic quotes and dashes, Unicode spaces), tabs and
+    carriage returns become spaces, and OCR's O/o and I/l inside numbers become
+    0 and 1. Every replacement is one character for one, so offsets (citation
+    spans) are the same in the original and the normalized text, and
+    normalizing twice is a no-op.
+    """
+    folds = _ASCII_FOLD.items()
+    if not text.isascii():
+        chars = set(_ASCII_RUNS.sub("", text))
+        folds = [*folds, *((char, _fold_char(char)) for char in chars)]
+    # A few targeted replace() calls beat one dict-driven translate() several times over
+    for char, replacement in folds:
+        if char != replacement and char in text:
+            text = text.replace(char, replacement)
+    for pattern, digit in _OCR_DIGITS:
+        text = pattern.sub(digit, text)
+    return text
+
+
+def lower_text(text: str) -> str:
+    """``text.lower()`` with one character per character, so offsets into ``text`` still hold.
+
+    The few characters that lowercase to several ("İ" to "i" and a combining dot) keep the first.
+    """
+    lower = text.lower()
+    if len(lower) == len(text):
+        return lower
+    return text.translate({ord(char): char.lower()[0] for char in set(text) if len(char.lower()) > 1}).lower()
+
+
+class Document:
+    """One request's normalized text plus the views stages share instead of re-deriving them.
+
+    ``lower`` and ``lines`` are computed on first use and cached, so the
+    classifier, extractor, chunk cache and redactor work off a single copy.
+    """
+
+    def __init__(self, text: str, pages: Optional[int] = None, normalized: bool = False):
+        self.text = text if normalized else normalize_text(text)
+        self.pages = pages
+
+    @classmethod
+    def wrap(cls, text: Union[str, "Document"], pages: Optional[int] = None) -> "Document":
+        """``text`` if it is already a Document, else a normalized Document of it."""
+        return text if isinstance(text, Document) else cls(text, pages)
+
+    @cached_property
+    def lower(self) -> str:
+        """Lowercase view for case-insensitive keyword scans, offset for offset with ``text``."""
+        return lower_text(self.text)
+
+    def lower_prefix(self, chars: int) -> str:
+        """Lowercase of the first ``chars`` characters, cut from ``lower`` when a scan already built it."""
+        lower = self.__dict__.get("lower")
+        return lower[:chars] if lower is not None else lower_text(self.text[:chars])
+
+    @cached_property
+    def lines(self) -> "LineIndex":
+        return LineIndex(self.text, self.pages)
+
+
+class LineIndex:
+    """Offset → (page, line) lookups for one document, built lazily on first use.
+
+    Line starts are recorded once and resolved with ``bisect``. Pages come from
+    form-feed page breaks in the text when present; otherwise, when the caller
+    reports more than one page (``DocMeta.pages``), lines are spread evenly
+    across that many pages.
+    """
+
+    def __init__(self, text: str, pages: Optional[int] = None):
+        self._text = text
+        self._pages = pages if pages and pages > 0 else 1
+        self._line_starts: Optional[List[int]] = None
+        self._page_starts: Optional[List[int]] = None
+
+    @property
+    def line_starts(self) -> List[int]:
+        """Offset of the first character of each line."""
+        if self._line_starts is None:
+            starts = [0]
+            find = self._text.find
+            pos = find("\n")
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = find("\n", pos + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    @property
+    def page_starts(self) -> List[int]:
+        """Offset of the first character of each page."""
+        if self._page_starts is None:
+            if PAGE_BREAK in self._text:
+                starts = [0]
+                pos = self._text.find(PAGE_BREAK)
+                while pos != -1:
+                    starts.append(pos + 1)
+                    pos = self._text.find(PAGE_BREAK, pos + 1)
+            else:
+                lines = self.line_starts
+                pages = min(self._pages, len(lines))
+                starts = [lines[-(-page * len(lines) // pages)] for page in range(pages)]
+            self._page_starts = starts
+        return self._page_starts
+
+    def line(self, offset: int) -> int:
+        """One-based document line containing ``offset``."""
+        return bisect_right(self.line_starts, offset)
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        """One-based ``(page, line within page)`` containing ``offset``."""
+        page = bisect_right(self.page_starts, offset)
+        return page, self.line(offset) - self.line(self.page_starts[page - 1]) + 1
+
+    def citation(self, field: str, start: int, end: int) -> Dict[str, Any]:
+        """Citation for a match spanning ``text[start:end]``."""
+        page, line = self.locate(start)
+        return make_citation(field, page, line, start, end)
+
+
+class SectionIndex:
+    """Section name → ``[start, end)`` window for one document, found lazily per section.
+
+    A section starts at the first hit of any of its anchors and ends after
+    ``max_chars`` characters, at the first anchor hit of another section within
+    that range, or at the end of the text, whichever comes first. Anchors are
+    searched one at a time so each keeps the regex engine's literal-prefix
+    scan, and only sections that a field asks for are looked up.
+    """
+
+    def __init__(self, text: str, sections: Mapping[str, CompiledSection], deadline: Optional[float] = None):
+        self._text = text
+        self._sections = sections
+        self._deadline = deadline
+        self._windows: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    def window(self, section: str) -> Optional[Tuple[int, int]]:
+        """Window of ``section``, or None if none of its anchors occur."""
+        if section not in self._windows:
+            self._windows[section] = self._find(self._sections[section])
+        return self._windows[section]
+
+    def _search(self, anchor: Pattern[str], pos: int, endpos: int) -> Optional[Match[str]]:
+        # Anchors are short linted headings; search them whole, only honouring the deadline
+        return bounded_search(anchor, self._text, 0, self._deadline, pos, endpos)
+
+    def _find(self, section: CompiledSection) -> Optional[Tuple[int, int]]:
+        length = len(self._text)
+        start = None
+        for anchor in section.anchors:
+            match = self._search(anchor, 0, length if start is None else start)
+            if match:
+                start = match.start()
+        if start is None:
+            return None
+        end = min(length, start + section.max_chars)
+        for other in self._sections.values():
+            if other is section:
+                continue
+            for anchor in other.anchors:
+                match = self._search(anchor, start + 1, end)
+                if match:
+                    end = match.start()
+        return start, end
+
+
+def make_citation(field: str, page: int, line: int, start: int, end: int) -> Dict[str, Any]:
+    return {
+        "field": field,
+        "source": f"page{page}:line{line}",
+        "page": page,
+        "line": line,
+        "span": [start, end],
+    }
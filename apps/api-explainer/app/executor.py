@@ -0,0 +1,259 @@
+"""Process pool for fanning extraction work out across cores."""
+
+import asyncio
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+from .chunks import DocumentChunks
+from .config import settings
+from .document import Document
+from .metrics import StageTimer
+from .pipeline import explain_document, get_extractor
+
+# (normalized text, typeHint, pages, locale)
+ExplainJob = tuple[str, Optional[str], Optional[int], str]
+# (ok, response or error: a message, or the ExecutorSaturated/ExplainTimeout that stopped it)
+ExplainOutcome = tuple[bool, Any]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+# Admission control: /explain documents and /explain/batch chunks running or queued on the executor
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+# Moving average of job durations, for the Retry-After estimate
+_average_job_seconds = 0.0
+_AVERAGE_WEIGHT = 0.2
+
+
+class ExecutorSaturated(Exception):
+    """Every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Extraction executor saturated; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ExplainTimeout(Exception):
+    """A document was not explained within ``EXPLAIN_TIMEOUT_SECONDS``."""
+
+
+def _init_worker() -> None:
+    """Load templates once per worker process instead of on its first job."""
+    get_extractor()
+
+
+def explain_jobs(jobs: list[ExplainJob]) -> list[ExplainOutcome]:
+    """Explain a chunk of documents, capturing failures per document."""
+    outcomes: list[ExplainOutcome] = []
+    for text, type_hint, pages, locale in jobs:
+        try:
+            document = Document(text, pages, normalized=True)
+            outcomes.append((True, explain_document(document, type_hint, pages, locale)))
+        except Exception as e:
+            outcomes.append((False, f"{type(e).__name__}: {e}"))
+    return outcomes
+
+
+def explain_job(
+    document: Document,
+    type_hint: Optional[str],
+    pages: Optional[int],
+    locale: str,
+    chunks: Optional[DocumentChunks],
+) -> tuple[dict[str, Any], StageTimer, dict[str, dict[str, Any]]]:
+    """Explain one document in a worker process.
+
+    Returns the response with the stage timer and chunk records filled in the
+    worker, for the request to merge back.
+    """
+    timer = StageTimer()
+    response = explain_document(document, type_hint, pages, locale, timer, chunks)
+    return response, timer, chunks.updated() if chunks is not None else {}
+
+
+def _worker_ready() -> None:
+    pass
+
+
+def _new_process_pool(start_method: str) -> ProcessPoolExecutor:
+    if start_method not in multiprocessing.get_all_start_methods():
+        start_method = "spawn"
+    return ProcessPoolExecutor(
+        max_workers=settings.extract_workers,
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=_init_worker,
+    )
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """The process pool, started on first use if ``start_process_pool`` did not run (or it broke).
+
+    By then the server runs other threads, which forking could copy
+    mid-operation (held locks included), so these workers come from a fork
+    server and load the templates themselves.
+    """
+    global _pool
+    if _pool is None:
+        _pool = _new_process_pool("forkserver")
+    return _pool
+
+
+def start_process_pool() -> None:
+    """Start every worker of the process pool now, instead of on the first requests.
+
+    Called at start-up, before the server runs other threads: the workers are
+    forked, so they share whatever the server loaded before, copy-on-write.
+    """
+    global _pool
+    if _pool is None:
+        _pool = _new_process_pool("fork")
+    for future in [_pool.submit(_worker_ready) for _ in range(settings.extract_workers)]:
+        future.result()
+
+
+def _discard_process_pool(pool: Optional[ProcessPoolExecutor]) -> None:
+    """Drop ``pool`` after a worker died in it, so the next job starts a new one."""
+    global _pool
+    if pool is not None and _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Executor for ``EXPLAIN_EXECUTOR=thread``: same bounds, but extraction shares the GIL."""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=settings.extract_workers, thread_name_prefix="explain")
+    return _thread_pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool, _thread_pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(cancel_futures=True)
+        _thread_pool = None
+
+
+def _retry_after() -> int:
+    """Seconds until a slot is likely free: the queue ahead drained at the average job rate."""
+    queued = max(1, _in_flight - settings.extract_workers + 1)
+    return max(1, math.ceil(_average_job_seconds * queued / settings.extract_workers))
+
+
+def _free_slots() -> int:
+    return settings.extract_workers + settings.explain_queue_size - _in_flight
+
+
+def _admit() -> None:
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight >= settings.extract_workers + settings.explain_queue_size:
+            raise ExecutorSaturated(_retry_after())
+        _in_flight += 1
+
+
+def _release(started: float) -> None:
+    global _in_flight, _average_job_seconds
+    seconds = time.perf_counter() - started
+    with _in_flight_lock:
+        _in_flight -= 1
+        _average_job_seconds += _AVERAGE_WEIGHT * (seconds - _average_job_seconds)
+
+
+def _submit(executor: Executor, fn: Any, *args: Any) -> "asyncio.Future[Any]":
+    """Submit an admitted job; its slot is held until the job really ends, even after a timeout."""
+    started = time.perf_counter()
+    try:
+        future: Future = executor.submit(fn, *args)
+    except BaseException:
+        _release(started)
+        raise
+    future.add_done_callback(lambda _: _release(started))
+    return asyncio.wrap_future(future)
+
+
+async def run_explain(
+    document: Document,
+    type_hint: Optional[str],
+    pages: Optional[int],
+    locale: str,
+    timer: StageTimer,
+    chunks: Optional[DocumentChunks] = None,
+) -> dict[str, Any]:
+    """Explain one document on the extraction executor (``EXPLAIN_EXECUTOR``).
+
+    At most ``EXTRACT_WORKERS + EXPLAIN_QUEUE_SIZE`` documents are admitted at
+    once; beyond that ``ExecutorSaturated`` is raised straight away rather
+    than queueing without bound. ``ExplainTimeout`` is raised once the job
+    has taken ``EXPLAIN_TIMEOUT_SECONDS``; a queued job is cancelled, a
+    running one finishes in the background and keeps its slot until it does.
+    In process mode the worker's stage timings and chunk records are merged
+    into ``timer`` and ``chunks``; if a worker died, the pool is discarded
+    for the next document to start a new one and ``BrokenProcessPool`` is
+    raised.
+    """
+    _admit()
+    pool = get_process_pool() if settings.explain_executor == "process" else None
+    try:
+        if pool is not None:
+            job = _submit(pool, explain_job, document, type_hint, pages, locale, chunks)
+        else:
+            job = _submit(get_thread_pool(), explain_document, document, type_hint, pages, locale, timer, chunks)
+        result = await asyncio.wait_for(job, settings.explain_timeout_seconds)
+    except asyncio.TimeoutError:
+        raise ExplainTimeout(f"Document not explained within {settings.explain_timeout_seconds:g}s") from None
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+    if settings.explain_executor != "process":
+        return result
+    response, worker_timer, updated = result
+    timer.merge(worker_timer)
+    if chunks is not None:
+        chunks.adopt(updated)
+    return response
+
+
+async def _run_chunk(jobs: list[ExplainJob]) -> list[ExplainOutcome]:
+    """Run one chunk of a batch as an admitted job with ``EXPLAIN_TIMEOUT_SECONDS`` per document."""
+    error: Any
+    pool = None
+    try:
+        _admit()
+        pool = get_process_pool() if settings.explain_executor == "process" else None
+        job = _submit(pool or get_thread_pool(), explain_jobs, jobs)
+        return await asyncio.wait_for(job, settings.explain_timeout_seconds * len(jobs))
+    except ExecutorSaturated as e:
+        error = e
+    except asyncio.TimeoutError:
+        error = ExplainTimeout(f"Documents not explained within {settings.explain_timeout_seconds:g}s each")
+    except BrokenProcessPool as e:
+        _discard_process_pool(pool)
+        error = e
+    return [(False, error)] * len(jobs)
+
+
+async def run_jobs(jobs: list[ExplainJob]) -> list[ExplainOutcome]:
+    """Run jobs on the extraction executor in a few chunks per worker, preserving order.
+
+    Each chunk is admitted and timed out like a ``run_explain`` document, so
+    a batch is split over the free slots rather than queueing past them. The
+    documents of a chunk that is not admitted, times out or loses its worker
+    fail on their own; the rest of the batch is unaffected.
+    """
+    if not jobs:
+        return []
+    chunk_count = max(1, min(settings.extract_workers * 4, _free_slots(), len(jobs)))
+    chunk_size = math.ceil(len(jobs) / chunk_count)
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    results = await asyncio.gather(*(_run_chunk(chunk) for chunk in chunks))
+    return [outcome for chunk in results for outcome in chunk]
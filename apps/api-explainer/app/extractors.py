@@ -1,11 +1,34 @@
 """Template-based extraction engine for document processing."""
 
-import json
+import logging
 import re
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
 
-TEMPLATES_DIR = Path(__file__).parent.parent.parent.parent / "packages" / "templates" / "compiled"
+from .chunks import DocumentChunks
+from .config import settings
+from .document import Document, LineIndex, SectionIndex, make_citation, normalize_text
+from .matching import KeywordMatcher, RegexBudgetExceeded, bounded_search
+from .registry import (
+    ISSUER_SCAN_CHARS,
+    TEMPLATES_DIR,
+    CompiledField,
+    CompiledTemplate,
+    CompiledTransactionTable,
+    TemplateRegistry,
+)
+from .rules import AMOUNT_NOISE, EnsureAmountNumeric
+from .transactions import TransactionColumns
+
+logger = logging.getLogger(__name__)
+
+
+
+def _regex_deadline() -> Optional[float]:
+    """``time.perf_counter`` deadline for one request's regex matching, or None if unlimited."""
+    if settings.regex_budget_ms <= 0:
+        return None
+    return time.perf_counter() + settings.regex_budget_ms / 1000
 
 
 class DocumentClassifier:
@@ -47,20 +70,27 @@ class DocumentClassifier:
         ]
     }
     
+    _matcher = KeywordMatcher(KEYWORD_PATTERNS)
+    
+    @classmethod
+    def score(cls, text: Union[str, Document]) -> Dict[str, int]:
+        """Score every doc type by distinct keyword hits in a single scan of the text."""
+        return cls._matcher.scores(Document.wrap(text).lower)
+    
+    @classmethod
+    def keywords(cls, lowercase_text: str) -> Set[int]:
+        """Indices of the classifier keywords present in already-lowercased text."""
+        return cls._matcher.find(lowercase_text)
+    
     @classmethod
-    def classify(cls, text: str, type_hint: Optional[str] = None) -> str:
-        """Classify document type from text content."""
+    def classify(
+        cls, text: Union[str, Document], type_hint: Optional[str] = None, keywords: Optional[Iterable[int]] = None
+    ) -> str:
+        """Classify document type from text content, or from keyword hits found earlier."""
         if type_hint:
             return type_hint
         
-        text_lower = text.lower()
-        scores = {}
-        
-        for doc_type, patterns in cls.KEYWORD_PATTERNS.items():
-            score = sum(1 for pattern in patterns if re.search(pattern, text_lower, re.IGNORECASE))
-            if score > 0:
-                scores[doc_type] = score
-        
+        scores = cls.score(text) if keywords is None else cls._matcher.label_scores(keywords)
         if scores:
             return max(scores.items(), key=lambda x: x[1])[0]
         
@@ -70,80 +100,181 @@ class DocumentClassifier:
 class TemplateExtractor:
     """Extract fields using compiled JSON templates."""
     
-    def __init__(self):
-        self._templates: Dict[str, Dict[str, Any]] = {}
-        self._load_templates()
+    def __init__(self, registry: Optional[TemplateRegistry] = None):
+        self._registry = registry or TemplateRegistry(TEMPLATES_DIR)
     
-    def _load_templates(self):
-        """Load compiled templates from disk."""
-        if not TEMPLATES_DIR.exists():
-            return
-        
-        for template_file in TEMPLATES_DIR.glob("*.json"):
-            if template_file.name == "index.json":
-                continue
-            try:
-                with open(template_file, "r", encoding="utf-8") as f:
-                    template = json.load(f)
-                    self._templates[template["id"]] = template
-            except Exception:
-                continue
+    @property
+    def _templates(self) -> Mapping[str, CompiledTemplate]:
+        return self._registry.current().templates
     
-    def extract(self, text: str, doc_type: str) -> Dict[str, Any]:
-        """Extract fields from text using template."""
+    def extract(
+        self,
+        text: Union[str, Document],
+        doc_type: str,
+        pages: Optional[int] = None,
+        field_timings: Optional[Dict[str, float]] = None,
+        chunks: Optional[DocumentChunks] = None,
+        field_sources: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Extract fields from text using template.
+        
+        ``text`` is normalized first unless it is already a ``Document``, whose
+        own page count then applies instead of ``pages``. Fields bound to a
+        template section are searched in that section's window first and in
+        the full text only if that finds nothing. Other fields are read from
+        ``chunks`` when given, so chunks with cached scan records are not
+        searched again. When ``field_timings`` is given, the seconds spent matching each field are
+        recorded into it. The document's issuer is detected first (reported
+        as ``issuer``); its override patterns, if any, are tried before each
+        field's own. ``field_sources`` receives, per field, whether an
+        ``issuer`` or ``generic`` pattern matched it, or ``missed``. Templates with a transaction table also get a
+        columnar ``transactions`` summary when rows are found. Matching stops
+        once the request's regex budget (``REGEX_BUDGET_MS``) is spent; the
+        fields not yet matched (and ``transactions``) are listed under
+        ``timedOutFields``.
+        """
         template = self._templates.get(doc_type)
         if not template:
-            return {}
+            return {"extractions": {}, "citations": [], "confidence": 0.0}
         
+        document = Document.wrap(text, pages)
+        text = document.text
+        line_index = document.lines
+        started = time.perf_counter() if field_timings is not None else 0.0
+        # Lowercasing text with non-ASCII characters (₹) is slow; reuse the classifier's lowercase text if it exists
+        issuer = template.detect_issuer(document.lower_prefix(ISSUER_SCAN_CHARS), lowercase=True)
+        template = template.for_issuer(issuer)
+        if field_timings is not None:
+            field_timings["issuer"] = time.perf_counter() - started
         extractions = {}
         citations = []
+        timed_out: List[str] = []
+        deadline = _regex_deadline()
+        sections = SectionIndex(text, template.sections, deadline)
         
-        fields = template.get("fields", {})
-        for field_name, field_def in fields.items():
-            patterns = field_def.get("patterns", [])
-            
-            for pattern_str in patterns:
-                try:
-                    # Normalize excessive backslash escaping from JSON/YAML
-                    # JSON stores patterns with double-escaped backslashes
-                    # We need to reduce them: \\\\ becomes \, \\\\s becomes \s, etc.
-                    # Do this iteratively until no more reduction is possible
-                    normalized_pattern = pattern_str
-                    prev_pattern = ""
-                    while normalized_pattern != prev_pattern:
-                        prev_pattern = normalized_pattern
-                        normalized_pattern = normalized_pattern.replace("\\\\", "\\")
-                    
-                    pattern = re.compile(normalized_pattern)
-                    match = pattern.search(text)
-                    
-                    if match:
-                        value = match.group("value")
-                        if value:
-                            extractions[field_name] = self._normalize_value(field_name, value)
-                            citations.append({
-                                "field": field_name,
-                                "source": f"line:{text[:match.start()].count(chr(10)) + 1}"
-                            })
-                            break
-                except Exception:
-                    continue
+        for position, field in enumerate(template.fields):
+            started = time.perf_counter() if field_timings is not None else 0.0
+            try:
+                if chunks is not None and not field.section:
+                    found = chunks.field_match(template, field, settings.regex_window_chars, deadline)
+                else:
+                    found = self._locate_field(field, text, deadline, sections)
+            except RegexBudgetExceeded:
+                timed_out = [f.name for f in template.fields[position:]]
+                logger.warning("Regex budget exceeded extracting %s; timed out: %s", doc_type, timed_out)
+                break
+            finally:
+                if field_timings is not None:
+                    field_timings[field.name] = time.perf_counter() - started
+            if found:
+                value, start, end, priority = found
+                extractions[field.name] = self._normalize_value(field.name, value)
+                citations.append(line_index.citation(field.name, start, end))
+            if field_sources is not None:
+                field_sources[field.name] = (
+                    "missed" if not found else "issuer" if priority < field.issuer_patterns else "generic"
+                )
         
-        # Apply post-rules
-        self._apply_post_rules(extractions, template.get("post_rules", []))
+        # Apply post-rules, then raise red flags over the final values
+        self._apply_post_rules(extractions, template.post_rules)
+        keywords = template.red_flags.find_keywords(document.lower) if template.red_flags.keywords else ()
+        red_flags = template.red_flags.evaluate(extractions, keywords, timed_out)
         
-        return {
+        transactions = None
+        if template.transactions is not None:
+            started = time.perf_counter()
+            try:
+                if timed_out:
+                    raise RegexBudgetExceeded
+                transactions = self._scan_transactions(template.transactions, text, sections, deadline)
+            except RegexBudgetExceeded:
+                timed_out.append("transactions")
+                logger.warning("Regex budget exceeded scanning %s transactions", doc_type)
+            if field_timings is not None:
+                field_timings["transactions"] = time.perf_counter() - started
+        
+        result = {
             "extractions": extractions,
             "citations": citations,
-            "confidence": self._calculate_confidence(extractions, len(fields))
+            "confidence": self._calculate_confidence(extractions, len(template.fields))
         }
+        if issuer:
+            result["issuer"] = issuer
+        if transactions is not None:
+            result["transactions"] = transactions
+        if red_flags:
+            result["redFlags"] = red_flags
+        if timed_out:
+            result["timedOutFields"] = timed_out
+        return result
+    
+    @staticmethod
+    def _scan_transactions(
+        table: CompiledTransactionTable, text: str, sections: SectionIndex, deadline: Optional[float]
+    ) -> Optional[Dict[str, Any]]:
+        """Columnar transaction summary, or None when the document has no rows."""
+        window = sections.window(table.section) if table.section else None
+        columns = TransactionColumns(table)
+        columns.scan(text, settings.regex_window_chars, deadline, *(window or (0, len(text))))
+        return columns.summary() if len(columns) else None
+    
+    @classmethod
+    def _locate_field(
+        cls, field: CompiledField, text: str, deadline: Optional[float], sections: SectionIndex
+    ) -> Optional[Tuple[str, int, int, int]]:
+        """``(value, start, end, pattern index)`` of a field, from its section window first, then the full text."""
+        window = sections.window(field.section) if field.section else None
+        found = cls._search_field(field, text, deadline, window) if window else None
+        if found is None:
+            found = cls._search_field(field, text, deadline)
+        if found is None:
+            return None
+        priority, match = found
+        return (match.group(field.group_name), *match.span(field.group_name), priority)
+
+    @staticmethod
+    def _search_field(
+        field: CompiledField,
+        text: str,
+        deadline: Optional[float],
+        window: Optional[Tuple[int, int]] = None,
+    ) -> Optional[Tuple[int, re.Match]]:
+        """Pattern index and first match with a non-empty value group, trying patterns in priority order.
+        
+        ``window`` limits the search to a ``[start, end)`` range; a match
+        running into the window's end may be cut short and is skipped.
+        """
+        length = len(text)
+        start, end = window or (0, length)
+        for priority, pattern in enumerate(field.patterns):
+            match = bounded_search(pattern, text, settings.regex_window_chars, deadline, start, end)
+            if match and match.group(field.group_name) and (match.end() < end or end == length):
+                return priority, match
+        return None
+    
+    def stream(self, doc_type: str, opening: str = "") -> Optional["StreamingExtraction"]:
+        """Start an incremental extraction for a document delivered page by page.
+        
+        The issuer is detected from ``opening``, the document's first pages.
+        """
+        template = self._templates.get(doc_type)
+        if not template:
+            return None
+        issuer = template.detect_issuer(normalize_text(opening)) if opening else None
+        return StreamingExtraction(self, template.for_issuer(issuer))
+    
+    def _finalize_value(self, template: CompiledTemplate, field_name: str, raw: str) -> Any:
+        """Normalize one raw match and apply the template's post-rules to it."""
+        value = {field_name: self._normalize_value(field_name, raw)}
+        self._apply_post_rules(value, template.post_rules)
+        return value[field_name]
     
     def _normalize_value(self, field_name: str, value: str) -> Any:
         """Normalize extracted value based on field type."""
         # Amount fields
         if "amount" in field_name.lower() or "due" in field_name.lower() or "balance" in field_name.lower():
             # Remove currency symbols and commas
-            cleaned = re.sub(r"[₹,\s]", "", value)
+            cleaned = value.translate(AMOUNT_NOISE)
             try:
                 return float(cleaned)
             except ValueError:
@@ -152,20 +283,10 @@ class TemplateExtractor:
         # Date fields - keep as string for now
         return value.strip()
     
-    def _apply_post_rules(self, extractions: Dict[str, Any], rules: List[Dict[str, Any]]):
-        """Apply post-processing rules."""
+    def _apply_post_rules(self, extractions: Dict[str, Any], rules: Sequence[EnsureAmountNumeric]):
+        """Apply the template's compiled post-rules."""
         for rule in rules:
-            if "ensure_amount_numeric" in rule:
-                fields = rule["ensure_amount_numeric"]
-                for field in fields:
-                    if field in extractions:
-                        value = extractions[field]
-                        if isinstance(value, str):
-                            cleaned = re.sub(r"[₹,\s]", "", str(value))
-                            try:
-                                extractions[field] = float(cleaned)
-                            except ValueError:
-                                pass
+            rule.apply(extractions)
     
     def _calculate_confidence(self, extractions: Dict[str, Any], total_fields: int) -> float:
         """Calculate extraction confidence score."""
@@ -181,6 +302,118 @@ class TemplateExtractor:
         return round(base_confidence, 2)
 
 
+class StreamingExtraction:
+    """Incremental extraction over pages fed one at a time.
+    
+    Only the current page is held in memory. A field is resolved as soon as its
+    first (highest-priority) pattern matches; a match from a lower-priority
+    pattern is held back until a better one turns up or the document ends, so
+    the final result equals ``TemplateExtractor.extract`` over the pages joined
+    with form feeds (except for matches that straddle a page break, and fields
+    whose template section would pick a later match: pages are searched whole,
+    without section windows). Transaction rows are accumulated page by page.
+    The regex budget applies per page; fields left unscanned on a page that
+    ran out of budget are reported as timed out unless a later page resolves
+    them.
+    """
+    
+    def __init__(self, extractor: TemplateExtractor, template: CompiledTemplate):
+        self._extractor = extractor
+        self._template = template
+        self._pending = {field.name: field for field in template.fields}
+        self._candidates: Dict[str, Tuple[int, str, Dict[str, Any]]] = {}
+        self._page = 0
+        self._offset = 0
+        self._timed_out: Dict[str, None] = {}
+        self._transactions = TransactionColumns(template.transactions) if template.transactions else None
+        self._keywords: Set[str] = set()
+        self.extractions: Dict[str, Any] = {}
+        self.citations: List[Dict[str, Any]] = []
+    
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Scan the next page; return citations of fields resolved by it."""
+        text = normalize_text(text)
+        self._page += 1
+        if self._template.red_flags.keywords:
+            self._keywords.update(self._template.red_flags.find_keywords(text.lower()))
+        line_index = LineIndex(text)
+        resolved = []
+        deadline = _regex_deadline()
+        pending = list(self._pending.items())
+        for position, (name, field) in enumerate(pending):
+            candidate = self._candidates.get(name)
+            limit = candidate[0] if candidate else len(field.patterns)
+            for priority, pattern in enumerate(field.patterns[:limit]):
+                try:
+                    match = bounded_search(pattern, text, settings.regex_window_chars, deadline)
+                except RegexBudgetExceeded:
+                    self._timed_out.update(dict.fromkeys(n for n, _ in pending[position:]))
+                    if self._transactions is not None:
+                        self._timed_out["transactions"] = None
+                    logger.warning("Regex budget exceeded on page %d of %s", self._page, self._template.id)
+                    self._offset += len(text) + 1
+                    return resolved
+                if not match:
+                    continue
+                value = match.group(field.group_name)
+                if not value:
+                    continue
+                start, end = match.span(field.group_name)
+                citation = make_citation(
+                    name, self._page, line_index.line(start), self._offset + start, self._offset + end
+                )
+                if priority == 0:
+                    self._candidates.pop(name, None)
+                    resolved.append(self._resolve(name, value, citation))
+                else:
+                    self._candidates[name] = (priority, value, citation)
+                break
+        if self._transactions is not None and "transactions" not in self._timed_out:
+            try:
+                self._transactions.scan(text, settings.regex_window_chars, deadline)
+            except RegexBudgetExceeded:
+                # Rows from this page are incomplete; later pages cannot make up for them
+                self._timed_out["transactions"] = None
+                logger.warning("Regex budget exceeded scanning transactions on page %d", self._page)
+        self._offset += len(text) + 1
+        return resolved
+    
+    def finish(self) -> List[Dict[str, Any]]:
+        """Resolve fields whose best match came from a fallback pattern."""
+        resolved = [
+            self._resolve(name, value, citation)
+            for name, (_, value, citation) in self._candidates.items()
+        ]
+        self._candidates.clear()
+        return resolved
+    
+    def result(self) -> Dict[str, Any]:
+        """Extraction result in the same shape as ``TemplateExtractor.extract``."""
+        order = {field.name: i for i, field in enumerate(self._template.fields)}
+        result = {
+            "extractions": dict(sorted(self.extractions.items(), key=lambda item: order[item[0]])),
+            "citations": sorted(self.citations, key=lambda c: order[c["field"]]),
+            "confidence": self._extractor._calculate_confidence(self.extractions, len(self._template.fields))
+        }
+        if self._template.issuer:
+            result["issuer"] = self._template.issuer
+        if self._transactions and "transactions" not in self._timed_out:
+            result["transactions"] = self._transactions.summary()
+        timed_out = [name for name in self._timed_out if name not in self.extractions]
+        red_flags = self._template.red_flags.evaluate(self.extractions, self._keywords, timed_out)
+        if red_flags:
+            result["redFlags"] = red_flags
+        if timed_out:
+            result["timedOutFields"] = sorted(timed_out, key=lambda name: order.get(name, len(order)))
+        return result
+    
+    def _resolve(self, name: str, raw: str, citation: Dict[str, Any]) -> Dict[str, Any]:
+        del self._pending[name]
+        self.extractions[name] = self._extractor._finalize_value(self._template, name, raw)
+        self.citations.append(citation)
+        return citation
+
+
 class SummaryGenerator:
     """Generate plain-language summaries from extractions."""
     
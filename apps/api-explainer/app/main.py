@@ -1,11 +1,65 @@
+import gc
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from . import IMPORT_STARTED
+from .cache import close_redis, get_redis
 from .config import settings
-from .routers import health, explain, templates
+from .executor import shutdown_process_pool, start_process_pool
+from .metrics import record_startup, startup_report
+from .pipeline import get_extractor
+from .routers import health, explain, metrics, templates
 from .middleware import request_id_middleware
 
+logger = logging.getLogger(__name__)
+
+
+async def warm_up() -> None:
+    """Load everything the first requests would otherwise wait for, timing each step.
+
+    Templates are loaded here, before the extraction workers are started, so
+    forked workers inherit the compiled templates (copy-on-write) instead of
+    each loading its own. ``gc.freeze`` keeps the collector from touching, and
+    so copying, the shared objects in every worker.
+    """
+    started = time.perf_counter()
+    get_extractor()
+    record_startup("templates", time.perf_counter() - started)
+    if settings.explain_executor == "process":
+        started = time.perf_counter()
+        gc.freeze()
+        start_process_pool()
+        record_startup("workers", time.perf_counter() - started)
+    client = get_redis()
+    if client is not None:
+        started = time.perf_counter()
+        try:
+            await client.ping()
+        except Exception as e:
+            # Not fatal: requests run without the cache until Redis is reachable
+            logger.warning("Redis not reachable at start-up: %s", e)
+        record_startup("redis", time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.warm_start:
+        await warm_up()
+    report = startup_report()
+    logger.info(
+        "Started in %.0f ms (%s)",
+        sum(report.values()) * 1000,
+        ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in report.items()),
+    )
+    yield
+    shutdown_process_pool()
+    await close_redis()
+
 
-app = FastAPI(title="SimpleDoc API", version="0.1.0")
+app = FastAPI(title="SimpleDoc API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,9 +72,11 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(explain.router)
 app.include_router(templates.router)
+app.include_router(metrics.router)
 
 @app.middleware("http")
 async def _request_id(request, call_next):
     return await request_id_middleware(request, call_next)
 
 
+record_startup("import", time.perf_counter() - IMPORT_STARTED)
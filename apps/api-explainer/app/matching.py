@@ -0,0 +1,176 @@
+"""Regex matching helpers: single-pass multi-keyword matching and budgeted search."""
+
+import re
+import time
+from typing import Dict, Iterable, List, Mapping, Match, Optional, Pattern, Sequence, Set
+
+_QUANTIFIERS = "*+?{"
+
+
+def _leading_literal(pattern: str) -> Optional[str]:
+    """Return the literal first character of ``pattern`` if it is safe to factor out."""
+    if not pattern or not pattern[0].isalnum() or "|" in pattern:
+        return None
+    if len(pattern) > 1 and pattern[1] in _QUANTIFIERS:
+        return None
+    return pattern[0]
+
+
+def _literal_prefix(pattern: str) -> str:
+    """The literal text every match of ``pattern`` starts with ("" when there is none)."""
+    if "|" in pattern:
+        return ""
+    end = 0
+    while end < len(pattern) and (pattern[end].isalnum() or pattern[end] in " -_"):
+        end += 1
+    if end < len(pattern) and pattern[end] in _QUANTIFIERS:
+        # The quantifier applies to the last character, which may repeat or be absent
+        end -= 1
+    return pattern[:end]
+
+
+class KeywordMatcher:
+    """Find which of many labelled keyword regexes occur in a text in one scan.
+
+    All keywords are compiled into one alternation of named groups, factored by
+    leading character so the regex engine keeps its first-character prefilter.
+    The scan resumes one character after each hit, so keywords overlapping an
+    earlier hit are still found, and keywords sharing the hit's leading
+    character are confirmed with an anchored ``match``. The result is the same
+    set a separate ``re.search`` per keyword would find.
+
+    Keywords are matched case-sensitively; callers lowercase the text and write
+    keywords in lowercase.
+    """
+
+    def __init__(self, keywords: Mapping[str, Sequence[str]]):
+        self._labels = list(keywords)
+        self._patterns: List[str] = []
+        self._labels_by_keyword: List[List[str]] = []
+        seen: Dict[str, int] = {}
+        for label, patterns in keywords.items():
+            for pattern in patterns:
+                if pattern not in seen:
+                    seen[pattern] = len(self._patterns)
+                    self._patterns.append(pattern)
+                    self._labels_by_keyword.append([])
+                self._labels_by_keyword[seen[pattern]].append(label)
+
+        buckets: Dict[str, List[int]] = {}
+        unfactored: List[int] = []
+        for i, pattern in enumerate(self._patterns):
+            lead = _leading_literal(pattern)
+            if lead is None:
+                unfactored.append(i)
+            else:
+                buckets.setdefault(lead, []).append(i)
+
+        branches = [
+            re.escape(lead) + "(?:" + "|".join(f"(?P<k{i}>{self._patterns[i][1:]})" for i in members) + ")"
+            for lead, members in buckets.items()
+        ]
+        branches.extend(f"(?P<k{i}>{self._patterns[i]})" for i in unfactored)
+        self._combined = re.compile("|".join(branches)) if branches else None
+        self._group_index = {f"k{i}": i for i in range(len(self._patterns))}
+        self._singles = [re.compile(p) for p in self._patterns]
+        prefixes = [_literal_prefix(p) for p in self._patterns]
+        self._prefixes = None if not all(prefixes) else tuple(dict.fromkeys(prefixes))
+
+        # Keywords that could match at the same start position as each keyword.
+        self._siblings: List[List[int]] = [[] for _ in self._patterns]
+        for members in buckets.values():
+            for i in members:
+                self._siblings[i] = [j for j in members if j != i] + unfactored
+        for i in unfactored:
+            self._siblings[i] = [j for j in range(len(self._patterns)) if j != i]
+
+    def find(self, text: str) -> Set[int]:
+        """Return the indices of all keywords present in ``text``."""
+        found: Set[int] = set()
+        if self._combined is None:
+            return found
+        total = len(self._patterns)
+        search = self._combined.search
+        pos = 0
+        while len(found) < total:
+            match = search(text, pos)
+            if not match:
+                break
+            start = match.start()
+            index = self._group_index[match.lastgroup]
+            found.add(index)
+            for j in self._siblings[index]:
+                if j not in found and self._singles[j].match(text, start):
+                    found.add(j)
+            pos = start + 1
+        return found
+
+    def may_occur(self, text: str) -> bool:
+        """False when no keyword can be in ``text``, judged by substring checks of their literal prefixes.
+
+        Much cheaper than ``find`` when keywords lead with common letters
+        (``lic``, ``sbi``), which defeat the regex engine's prefilter, and
+        are usually absent. Always True if some keyword has no literal prefix.
+        """
+        return self._prefixes is None or any(prefix in text for prefix in self._prefixes)
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Count distinct keywords found per label, in label order; zero scores omitted."""
+        return self.label_scores(self.find(text))
+    
+    def label_scores(self, found: Iterable[int]) -> Dict[str, int]:
+        """``scores`` for keyword indices already found (e.g. merged from several chunks)."""
+        counts = dict.fromkeys(self._labels, 0)
+        for index in set(found):
+            for label in self._labels_by_keyword[index]:
+                counts[label] += 1
+        return {label: score for label, score in counts.items() if score > 0}
+
+
+# Longest match a windowed search is guaranteed to find across a window edge
+WINDOW_OVERLAP = 256
+
+
+class RegexBudgetExceeded(Exception):
+    """Raised when a request runs past its regex matching deadline."""
+
+
+def bounded_search(
+    pattern: Pattern[str],
+    text: str,
+    window: int,
+    deadline: Optional[float] = None,
+    pos: int = 0,
+    endpos: Optional[int] = None,
+) -> Optional[Match[str]]:
+    """``pattern.search(text, pos, endpos)`` run over overlapping windows of at most ``window`` characters.
+    
+    No single regex call sees more than ``window`` characters, which caps the
+    cost of backtracking on adversarial input, and the ``time.perf_counter``
+    ``deadline`` is checked before each call. Windows overlap by
+    ``WINDOW_OVERLAP`` characters. A match is only trusted when the window
+    holds at least that much text after it, since the edge may have cut off an
+    optional tail ("2,500" of "2,500.45"); otherwise the search is run again
+    from the match's start, so matches up to ``WINDOW_OVERLAP`` characters
+    long are found and returned whole.
+    """
+    length = len(text) if endpos is None else min(endpos, len(text))
+    if window <= 0 or length - pos <= window:
+        if deadline is not None and time.perf_counter() > deadline:
+            raise RegexBudgetExceeded
+        return pattern.search(text, pos, length)
+    while True:
+        if deadline is not None and time.perf_counter() > deadline:
+            raise RegexBudgetExceeded
+        end = min(length, pos + window)
+        match = pattern.search(text, pos, end)
+        if match:
+            # A match starting the window already had a full window from its start
+            if match.end() < end - WINDOW_OVERLAP or end == length or match.start() == pos:
+                return match
+            # Possibly truncated by the window edge: search again from its start
+            pos = match.start()
+            continue
+        if end == length:
+            return None
+        pos = max(pos + 1, end - WINDOW_OVERLAP)
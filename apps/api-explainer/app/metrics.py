@@ -0,0 +1,242 @@
+"""In-process latency histograms and Prometheus text exposition.
+
+Metrics are per worker process; scrape each worker (or aggregate upstream).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .cache import cache_stats
+from .codec import codec_stats
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by label values."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> (per-bucket counts with a trailing +Inf slot, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, seconds: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts, total = self._series.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += seconds
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.", ("route", "status"))
+STAGE_SECONDS = Histogram("explain_stage_seconds", "Latency of each /explain stage.", ("stage",))
+FIELD_SECONDS = Histogram(
+    "explain_field_seconds", "Time spent matching each template field.", ("doc_type", "field")
+)
+
+_chunk_lock = threading.Lock()
+_chunk_counts = {"reused": 0, "scanned": 0}
+
+
+def count_chunks(reused: int, scanned: int) -> None:
+    """Record how many of a document's chunks came from the cache and how many were scanned."""
+    with _chunk_lock:
+        _chunk_counts["reused"] += reused
+        _chunk_counts["scanned"] += scanned
+
+_redaction_lock = threading.Lock()
+_redaction_counts: Dict[str, int] = {}
+
+
+def count_redactions(counts: Dict[str, int]) -> None:
+    """Record values masked by the redactor, per PII kind."""
+    with _redaction_lock:
+        for kind, count in counts.items():
+            _redaction_counts[kind] = _redaction_counts.get(kind, 0) + count
+
+_issuer_lock = threading.Lock()
+# (doc type, issuer, source) -> fields; source is "issuer", "generic" or "missed"
+_issuer_counts: Dict[Tuple[str, str, str], int] = {}
+
+
+def count_issuer_fields(doc_type: str, issuer: Optional[str], field_sources: Dict[str, str]) -> None:
+    """Record, per detected issuer ("none" if none), which kind of pattern matched each field."""
+    issuer = issuer or "none"
+    with _issuer_lock:
+        for source in field_sources.values():
+            key = (doc_type, issuer, source)
+            _issuer_counts[key] = _issuer_counts.get(key, 0) + 1
+
+# Seconds each start-up step took in this process, in the order they ran
+_startup_seconds: Dict[str, float] = {}
+
+
+def record_startup(step: str, seconds: float) -> None:
+    _startup_seconds[step] = seconds
+
+
+def startup_report() -> Dict[str, float]:
+    """Start-up steps of this process and their durations in seconds."""
+    return dict(_startup_seconds)
+
+
+_coalesce_lock = threading.Lock()
+_coalesce_counts = {"computed": 0, "local": 0, "redis": 0}
+
+
+def count_coalesced(result: str) -> None:
+    """Record whether a cache miss computed its response or shared one (in-process or via Redis)."""
+    with _coalesce_lock:
+        _coalesce_counts[result] += 1
+
+
+class StageTimer:
+    """Collects ``perf_counter`` stage durations for one request."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        # doc type -> field -> seconds, kept so a timer filled in a worker process can be merged
+        self.fields: Dict[str, Dict[str, float]] = {}
+        # (doc type, issuer, field -> pattern source) of the document's extraction
+        self.issuer_fields: List[Tuple[str, str, Dict[str, str]]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, name)
+
+    def observe_fields(self, doc_type: str, field_timings: Dict[str, float]) -> None:
+        self.fields.setdefault(doc_type, {}).update(field_timings)
+        observe_fields(doc_type, field_timings)
+
+    def observe_issuer_fields(self, doc_type: str, issuer: Optional[str], field_sources: Dict[str, str]) -> None:
+        self.issuer_fields.append((doc_type, issuer or "none", field_sources))
+        count_issuer_fields(doc_type, issuer, field_sources)
+
+    def merge(self, other: "StageTimer") -> None:
+        """Record the stages, field timings and issuer stats of a timer filled in another process."""
+        for name, seconds in other.stages.items():
+            self.record(name, seconds)
+        for doc_type, field_timings in other.fields.items():
+            self.observe_fields(doc_type, field_timings)
+        for doc_type, issuer, field_sources in other.issuer_fields:
+            self.observe_issuer_fields(doc_type, issuer, field_sources)
+
+    def server_timing(self, total_seconds: float) -> str:
+        """``Server-Timing`` header value, durations in milliseconds."""
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total_seconds * 1000:.3f}")
+        return ", ".join(entries)
+
+
+def stage(timer: Optional[StageTimer], name: str) -> ContextManager[None]:
+    """``timer.stage(name)``, or a no-op when no timer is attached."""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def observe_fields(doc_type: str, field_timings: Dict[str, float]) -> None:
+    for field, seconds in field_timings.items():
+        FIELD_SECONDS.observe(seconds, doc_type, field)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for histogram in (REQUEST_SECONDS, STAGE_SECONDS, FIELD_SECONDS):
+        lines.extend(histogram.render())
+
+    stats = cache_stats()
+    lines.append("# HELP explain_cache_requests_total Cache lookups by tier and result.")
+    lines.append("# TYPE explain_cache_requests_total counter")
+    for tier, counters in stats.items():
+        for result in ("hits", "misses"):
+            lines.append(f'explain_cache_requests_total{{tier="{tier}",result="{result}"}} {counters[result]}')
+    lines.append("# HELP explain_cache_hit_ratio Fraction of lookups served by each cache tier.")
+    lines.append("# TYPE explain_cache_hit_ratio gauge")
+    for tier, counters in stats.items():
+        lookups = counters["hits"] + counters["misses"]
+        ratio = counters["hits"] / lookups if lookups else 0.0
+        lines.append(f'explain_cache_hit_ratio{{tier="{tier}"}} {ratio}')
+    encoded = codec_stats()
+    lines.append("# HELP explain_cache_bytes_total Bytes of cache values written to Redis, as compact JSON and as stored.")
+    lines.append("# TYPE explain_cache_bytes_total counter")
+    lines.append(f'explain_cache_bytes_total{{encoding="json"}} {encoded["json_bytes"]}')
+    lines.append(f'explain_cache_bytes_total{{encoding="stored"}} {encoded["stored_bytes"]}')
+    lines.append("# HELP explain_cache_bytes_saved_total Bytes the cache codec saved over storing compact JSON.")
+    lines.append("# TYPE explain_cache_bytes_saved_total counter")
+    lines.append(f"explain_cache_bytes_saved_total {encoded['json_bytes'] - encoded['stored_bytes']}")
+    lines.append("# HELP explain_chunks_total Document chunks by whether their scan records were reused.")
+    lines.append("# TYPE explain_chunks_total counter")
+    with _chunk_lock:
+        chunk_counts = dict(_chunk_counts)
+    for result, count in chunk_counts.items():
+        lines.append(f'explain_chunks_total{{result="{result}"}} {count}')
+    lines.append("# HELP explain_redactions_total Values masked by the PII redactor, by kind.")
+    lines.append("# TYPE explain_redactions_total counter")
+    with _redaction_lock:
+        redaction_counts = dict(_redaction_counts)
+    for kind, count in sorted(redaction_counts.items()):
+        lines.append(f'explain_redactions_total{{kind="{kind}"}} {count}')
+    lines.append("# HELP explain_issuer_fields_total Template fields by detected issuer and the patterns that matched them.")
+    lines.append("# TYPE explain_issuer_fields_total counter")
+    with _issuer_lock:
+        issuer_counts = dict(_issuer_counts)
+    for (doc_type, issuer, source), count in sorted(issuer_counts.items()):
+        lines.append(
+            f'explain_issuer_fields_total{{doc_type="{_escape(doc_type)}",issuer="{_escape(issuer)}",source="{source}"}} {count}'
+        )
+    lines.append("# HELP explain_issuer_hit_ratio Fraction of fields matched by the detected issuer's own patterns.")
+    lines.append("# TYPE explain_issuer_hit_ratio gauge")
+    searched: Dict[Tuple[str, str], int] = {}
+    for (doc_type, issuer, _), count in issuer_counts.items():
+        searched[doc_type, issuer] = searched.get((doc_type, issuer), 0) + count
+    for (doc_type, issuer), total in sorted(searched.items()):
+        ratio = issuer_counts.get((doc_type, issuer, "issuer"), 0) / total
+        lines.append(f'explain_issuer_hit_ratio{{doc_type="{_escape(doc_type)}",issuer="{_escape(issuer)}"}} {ratio}')
+    lines.append("# HELP explain_coalesce_total Cache misses by whether they computed or shared a response.")
+    lines.append("# TYPE explain_coalesce_total counter")
+    with _coalesce_lock:
+        coalesce_counts = dict(_coalesce_counts)
+    for result, count in coalesce_counts.items():
+        lines.append(f'explain_coalesce_total{{result="{result}"}} {count}')
+    lines.append("# HELP explain_startup_seconds Time each start-up step of this worker process took.")
+    lines.append("# TYPE explain_startup_seconds gauge")
+    for step, seconds in startup_report().items():
+        lines.append(f'explain_startup_seconds{{step="{step}"}} {seconds}')
+    return "\n".join(lines) + "\n"
@@ -4,15 +4,20 @@ from typing import Callable
 
 from fastapi import Request, Response
 
+from .metrics import REQUEST_SECONDS, StageTimer
+
 
 async def request_id_middleware(request: Request, call_next: Callable) -> Response:
     req_id = str(uuid.uuid4())
     request.state.request_id = req_id
-    start = time.time()
+    # Handlers record their stages here; reported back as Server-Timing
+    timer = request.state.timer = StageTimer()
+    start = time.perf_counter()
     response = await call_next(request)
-    duration_ms = int((time.time() - start) * 1000)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(elapsed, route.path if route else "unmatched", str(response.status_code))
     response.headers["x-request-id"] = req_id
-    response.headers["x-response-time-ms"] = str(duration_ms)
+    response.headers["x-response-time-ms"] = str(int(elapsed * 1000))
+    response.headers["server-timing"] = timer.server_timing(elapsed)
     return response
-
-
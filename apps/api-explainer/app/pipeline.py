@@ -0,0 +1,170 @@
+"""Document explanation pipeline shared by the HTTP handlers and worker processes."""
+
+from typing import Any, Optional, Union
+
+from .chunks import DocumentChunks
+from .document import Document
+from .extractors import ActionGenerator, DocumentClassifier, StreamingExtraction, SummaryGenerator, TemplateExtractor
+from .config import settings
+from .metrics import StageTimer, stage
+from .redact import redact_extraction, redact_text
+from .registry import get_registry
+
+_extractor: Optional[TemplateExtractor] = None
+
+
+def get_extractor() -> TemplateExtractor:
+    """Process-wide extractor, loaded on first use."""
+    global _extractor
+    if _extractor is None:
+        _extractor = TemplateExtractor(get_registry())
+    return _extractor
+
+
+def explain_document(
+    text: Union[str, Document],
+    type_hint: Optional[str],
+    pages: Optional[int],
+    locale: str,
+    timer: Optional[StageTimer] = None,
+    chunks: Optional[DocumentChunks] = None,
+) -> dict[str, Any]:
+    """Run the CPU-bound classify/extract/summarize pipeline for one document.
+    
+    ``text`` is normalized once into a ``Document`` (unless it already is
+    one) that every stage reads. Stage durations are recorded on ``timer``
+    when one is given. With ``chunks``, classification and unsectioned field
+    matching reuse the chunks' cached scan records and fill in the missing
+    ones. PII in extracted values and transaction descriptions is masked
+    before the summary is written (``REDACT_PII``), so no later stage, cache
+    entry or response sees it; the masked counts are reported under
+    ``redactions``.
+    """
+    document = Document.wrap(text, pages)
+    
+    # Classify document type
+    with stage(timer, "classify"):
+        keywords = chunks.keywords(DocumentClassifier.keywords) if chunks is not None and not type_hint else None
+        doc_type = DocumentClassifier.classify(document, type_hint, keywords)
+    
+    # Extract fields using templates
+    field_timings: Optional[dict[str, float]] = {} if timer is not None else None
+    field_sources: Optional[dict[str, str]] = {} if timer is not None else None
+    with stage(timer, "extract"):
+        extraction_result = get_extractor().extract(document, doc_type, pages, field_timings, chunks, field_sources)
+    if field_timings:
+        timer.observe_fields(doc_type, field_timings)
+    if field_sources:
+        timer.observe_issuer_fields(doc_type, extraction_result.get("issuer"), field_sources)
+    redactions = {}
+    if settings.redact_pii:
+        with stage(timer, "redact"):
+            redactions = redact_extraction(extraction_result)
+    extractions = extraction_result["extractions"]
+    citations = extraction_result["citations"]
+    confidence = extraction_result["confidence"]
+    
+    # Generate summary and actions
+    with stage(timer, "summarize"):
+        summary = SummaryGenerator.generate(extractions, doc_type, locale)
+        actions = ActionGenerator.generate(extractions, doc_type)
+    
+    response = {
+        "summary": summary,
+        "extractions": extractions,
+        "actions": actions,
+        "confidence": confidence,
+        "docType": doc_type,
+        "citations": citations
+    }
+    for key in ("issuer", "transactions", "redFlags", "timedOutFields"):
+        if key in extraction_result:
+            response[key] = extraction_result[key]
+    if redactions:
+        response["redactions"] = redactions
+    return response
+
+
+# Pages buffered to classify a streamed document that has no type hint
+STREAM_CLASSIFY_PAGES = 2
+
+
+class StreamingExplainer:
+    """Explain a document delivered page by page, emitting events as fields resolve.
+    
+    Events are ``docType`` (once the type is known), one ``extraction`` per
+    resolved field, and a final ``result`` with the same shape as ``/explain``.
+    """
+    
+    def __init__(self, type_hint: Optional[str], locale: str):
+        self._locale = locale
+        self._doc_type: Optional[str] = type_hint
+        self._buffer: list[str] = []
+        self._extraction: Optional[StreamingExtraction] = None
+        self._started = False
+    
+    def feed(self, text: str) -> list[dict[str, Any]]:
+        """Consume one page of text."""
+        if self._started:
+            return self._scan(text)
+        self._buffer.append(text)
+        if self._doc_type is None and len(self._buffer) < STREAM_CLASSIFY_PAGES:
+            return []
+        return self._start()
+    
+    def finish(self) -> list[dict[str, Any]]:
+        """Flush buffered pages and emit the final result."""
+        events = [] if self._started else self._start()
+        if self._extraction is not None:
+            events.extend(self._extraction_event(c) for c in self._extraction.finish())
+            extraction_result = self._extraction.result()
+        else:
+            extraction_result = {"extractions": {}, "citations": [], "confidence": 0.0}
+        redactions = redact_extraction(extraction_result) if settings.redact_pii else {}
+        extractions = extraction_result["extractions"]
+        result = {
+            "event": "result",
+            "summary": SummaryGenerator.generate(extractions, self._doc_type, self._locale),
+            "extractions": extractions,
+            "actions": ActionGenerator.generate(extractions, self._doc_type),
+            "confidence": extraction_result["confidence"],
+            "docType": self._doc_type,
+            "citations": extraction_result["citations"]
+        }
+        for key in ("issuer", "transactions", "redFlags", "timedOutFields"):
+            if key in extraction_result:
+                result[key] = extraction_result[key]
+        if redactions:
+            result["redactions"] = redactions
+        events.append(result)
+        return events
+    
+    def _start(self) -> list[dict[str, Any]]:
+        """Fix the doc type from the buffered pages and scan them."""
+        if self._doc_type is None:
+            self._doc_type = DocumentClassifier.classify("\f".join(self._buffer))
+        self._extraction = get_extractor().stream(self._doc_type, "\f".join(self._buffer))
+        self._started = True
+        events = [{"event": "docType", "docType": self._doc_type}]
+        for page in self._buffer:
+            events.extend(self._scan(page))
+        self._buffer = []
+        return events
+    
+    def _scan(self, text: str) -> list[dict[str, Any]]:
+        if self._extraction is None:
+            return []
+        return [self._extraction_event(c) for c in self._extraction.feed(text)]
+    
+    def _extraction_event(self, citation: dict[str, Any]) -> dict[str, Any]:
+        field = citation["field"]
+        value = self._extraction.extractions[field]
+        if settings.redact_pii and isinstance(value, str):
+            # Values are whole matches, so a number is never split across events; counted in ``result``
+            value = redact_text(value)
+        return {
+            "event": "extraction",
+            "field": field,
+            "value": value,
+            "citation": citation
+        }
@@ -0,0 +1,169 @@
+"""Per-device sliding-window rate limiting.
+
+Uses the sliding-window-counter approximation: the previous fixed window's
+count is weighted by how much of it still overlaps the trailing window, so
+there is no 2x burst at window boundaries. With Redis the check-and-increment
+is a single Lua script call (one round trip); without ``REDIS_URL`` the same
+algorithm runs in process memory, which limits per worker.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .cache import get_redis
+from .config import settings
+
+WINDOW_SECONDS = 60
+_LOCAL_MAX_KEYS = 10_000
+
+# KEYS[1]: current window counter, KEYS[2]: previous window counter
+# ARGV: limit, window_ms, elapsed_ms, cost, partial (1: count as much of cost as fits)
+_SLIDING_WINDOW_LUA = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local weighted = previous * (window - elapsed) / window + current
+local granted = cost
+if weighted + cost > limit then
+  granted = 0
+  if ARGV[5] == '1' then
+    granted = math.max(0, math.floor(limit - weighted))
+  end
+  if granted == 0 then
+    return {0, current, previous, 0}
+  end
+end
+current = redis.call('INCRBY', KEYS[1], granted)
+if current == granted then
+  redis.call('PEXPIRE', KEYS[1], window * 2)
+end
+return {1, current, previous, granted}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after_seconds: int = 0
+    # Requests counted: the whole cost when allowed, or with ``partial`` as many as fitted
+    granted: int = 0
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_seconds),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after_seconds)
+        return headers
+
+
+def _result(
+    allowed: bool, current: int, previous: int, elapsed: float, limit: int, cost: int, granted: int
+) -> RateLimitResult:
+    """Derive quota headers from the two window counters."""
+    remaining_window = WINDOW_SECONDS - elapsed
+    weighted = previous * remaining_window / WINDOW_SECONDS + current
+    remaining = max(0, math.floor(limit - weighted))
+    retry_after = 0
+    if not allowed:
+        # Wait until the previous window's weight has decayed enough, or the window rolls over.
+        headroom = limit - cost - current
+        if previous > 0 and headroom >= 0:
+            retry_after = math.ceil(WINDOW_SECONDS * (1 - headroom / previous) - elapsed)
+        else:
+            retry_after = math.ceil(remaining_window)
+        retry_after = max(1, retry_after)
+    return RateLimitResult(
+        allowed=allowed,
+        limit=limit,
+        remaining=remaining,
+        reset_seconds=math.ceil(remaining_window),
+        retry_after_seconds=retry_after,
+        granted=granted,
+    )
+
+
+class LocalRateLimiter:
+    """In-memory sliding-window counters, used when Redis is not configured."""
+
+    def __init__(self, max_keys: int = _LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._windows: dict[str, tuple[int, int, int]] = {}
+
+    def hit(self, device_id: str, window: int, elapsed: float, limit: int, cost: int) -> tuple[bool, int, int]:
+        granted, current, previous = self.take(device_id, window, elapsed, limit, cost, partial=False)
+        return granted > 0, current, previous
+
+    def take(
+        self, device_id: str, window: int, elapsed: float, limit: int, cost: int, partial: bool = True
+    ) -> tuple[int, int, int]:
+        """Count as many of ``cost`` requests as fit (all or none unless ``partial``); returns that number."""
+        start, current, previous = self._windows.get(device_id, (window, 0, 0))
+        if start != window:
+            previous = current if start == window - 1 else 0
+            current = 0
+        weighted = previous * (WINDOW_SECONDS - elapsed) / WINDOW_SECONDS + current
+        if weighted + cost <= limit:
+            granted = cost
+        else:
+            granted = max(0, math.floor(limit - weighted)) if partial else 0
+        current += granted
+        self._windows[device_id] = (window, current, previous)
+        if len(self._windows) > self.max_keys:
+            self._prune(window)
+        return granted, current, previous
+
+    def _prune(self, window: int) -> None:
+        stale = [key for key, (start, _, _) in self._windows.items() if start < window - 1]
+        for key in stale:
+            del self._windows[key]
+        while len(self._windows) > self.max_keys:
+            del self._windows[next(iter(self._windows))]
+
+    def clear(self) -> None:
+        self._windows.clear()
+
+
+_local = LocalRateLimiter()
+_script = None
+
+
+async def rate_limit_check(
+    device_id: str, cost: int = 1, limit: Optional[int] = None, partial: bool = False
+) -> RateLimitResult:
+    """Count ``cost`` requests for this device and report whether they fit in RATE_LIMIT_RPM.
+
+    With ``partial``, as many of them as still fit are counted (``granted``)
+    and the result is allowed if any were.
+    """
+    global _script
+    limit = settings.rate_limit_rpm if limit is None else limit
+    now = time.time()
+    window = int(now // WINDOW_SECONDS)
+    elapsed = now - window * WINDOW_SECONDS
+
+    client = get_redis()
+    if not client:
+        granted, current, previous = _local.take(device_id, window, elapsed, limit, cost, partial)
+        return _result(granted > 0, current, previous, elapsed, limit, cost, granted)
+
+    if _script is None:
+        _script = client.register_script(_SLIDING_WINDOW_LUA)
+    # Hash tag keeps both windows in one cluster slot
+    keys = [f"ratelimit:{{{device_id}}}:{window}", f"ratelimit:{{{device_id}}}:{window - 1}"]
+    allowed, current, previous, granted = await _script(
+        keys=keys,
+        args=[limit, WINDOW_SECONDS * 1000, int(elapsed * 1000), cost, int(partial)],
+        client=client,
+    )
+    return _result(bool(allowed), int(current), int(previous), elapsed, limit, cost, int(granted))
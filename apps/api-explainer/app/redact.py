@@ -1,13 +1,102 @@
+"""PII redaction for values leaving the service (responses, cache entries, stream events).
+
+Phone, PAN, Aadhaar, card and account numbers are found in one pass of a
+combined pattern and masked in place: every letter and digit but the last four
+becomes ``X`` ("9876543210" -> "XXXXXX3210"), so values keep their shape and a
+user can still recognise their own number.
+"""
+
 import re
+from collections import Counter
+from typing import Any, Dict, List, Sequence, Union
+
+from .document import Document
+
+KEEP_LAST = 4
+# Joins values for the combined pass; no pattern can match across it
+_SEPARATOR = "\x00"
+
+# Alternatives are tried in order at each position: a 16-digit card before the
+# 12-digit Aadhaar it contains, a mobile number before the generic account number
+_NUMBERS = re.compile(
+    r"(?P<card>(?<![\d-])\d{4}(?:[ -]?\d{4}){3}(?![\d-]))"
+    r"|(?P<aadhaar>(?<![\d-])[2-9]\d{3}[ -]?\d{4}[ -]?\d{4}(?![\d-]))"
+    r"|(?P<phone>(?<![\d+])(?:\+?91[- ]?)?[6-9]\d{4}[ -]?\d{5}(?!\d))"
+    r"|(?P<account>(?<![\d.,])\d{9,18}(?![\d.,]))"
+)
+# Every number above has a run of at least 4 digits followed by 5 more digits,
+# spaces or dashes. This single-class pattern keeps the regex engine's fast
+# first-character scan, so the combined pattern only runs around its hits
+_NUMBER_CANDIDATE = re.compile(r"[+0-9][0-9]{3}[0-9 -]{5,}")
+# Room before a candidate for a "+91 " prefix
+_PREFIX_CHARS = 4
+_PAN = re.compile(r"(?<![A-Za-z0-9])[A-Z]{5}[0-9]{4}[A-Z](?![A-Za-z0-9])")
+PII_KINDS = (*_NUMBERS.groupindex, "pan")
+_ALNUM = re.compile(r"[0-9A-Za-z]")
+
 
+def mask(value: str) -> str:
+    """``value`` with every letter and digit except the last ``KEEP_LAST`` replaced by ``X``."""
+    hidden = len(_ALNUM.findall(value)) - KEEP_LAST
+    return _ALNUM.sub("X", value, count=hidden) if hidden > 0 else value
 
-_PHONE = re.compile(r"(?<!\d)(?:\+?91[- ]?)?[6-9]\d{9}(?!\d)")
-_PAN = re.compile(r"\b[A-Z]{5}[0-9]{4}[A-Z]\b")
 
+def redact_text(text: Union[str, Document], counts: "Counter[str] | None" = None, pan: bool = True) -> str:
+    """Mask every PII number in ``text``, adding per-kind counts to ``counts`` if given.
 
-def redact_text(text: str) -> str:
-    redacted = _PHONE.sub("[REDACTED_PHONE]", text)
-    redacted = _PAN.sub("[REDACTED_PAN]", redacted)
+    Masks keep the text's length, so offsets into it stay valid. ``pan=False``
+    skips the PAN scan for text that cannot hold one (transaction descriptions).
+    """
+    if isinstance(text, Document):
+        text = text.text
+    pieces: List[str] = []
+    last = 0
+    for candidate in _NUMBER_CANDIDATE.finditer(text):
+        # Lookbehinds see the text before ``pos``; one extra character lets lookaheads see past the run
+        for match in _NUMBERS.finditer(text, max(last, candidate.start() - _PREFIX_CHARS), candidate.end() + 1):
+            if counts is not None:
+                counts[match.lastgroup] += 1
+            pieces.append(text[last:match.start()])
+            pieces.append(mask(match.group()))
+            last = match.end()
+    if pieces:
+        pieces.append(text[last:])
+        text = "".join(pieces)
+    if pan:
+        text = _PAN.sub(lambda match: _count(counts, "pan", mask(match.group())), text)
+    return text
+
+
+def _count(counts: "Counter[str] | None", kind: str, replacement: str) -> str:
+    if counts is not None:
+        counts[kind] += 1
+    return replacement
+
+
+def redact_values(values: Sequence[str], counts: "Counter[str] | None" = None, pan: bool = True) -> List[str]:
+    """``redact_text`` over many short values, joined into a single pass."""
+    found: Counter[str] = Counter()
+    if any(_SEPARATOR in value for value in values):
+        redacted = [redact_text(value, found, pan) for value in values]
+    else:
+        joined = redact_text(_SEPARATOR.join(values), found, pan)
+        redacted = joined.split(_SEPARATOR) if found else list(values)
+    if counts is not None:
+        counts.update(found)
     return redacted
 
 
+def redact_extraction(result: Dict[str, Any]) -> Dict[str, int]:
+    """Mask PII in an extraction result's string values and transaction descriptions, in place.
+
+    Returns the number of values masked per kind (kinds with none omitted).
+    """
+    counts: Counter[str] = Counter()
+    extractions = result.get("extractions", {})
+    names = [name for name, value in extractions.items() if isinstance(value, str)]
+    for name, value in zip(names, redact_values([extractions[name] for name in names], counts)):
+        extractions[name] = value
+    descriptions = result.get("transactions", {}).get("columns", {}).get("description")
+    if descriptions:
+        descriptions[:] = redact_values(descriptions, counts, pan=False)
+    return dict(counts)
@@ -0,0 +1,476 @@
+"""Compiled-pattern registry built once from the compiled template manifests."""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Pattern, Tuple
+
+from .config import settings
+from .matching import KeywordMatcher
+from .rules import EnsureAmountNumeric, RedFlagRules, RuleError, compile_post_rules, compile_red_flags
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).parent.parent.parent.parent / "packages" / "templates" / "compiled"
+
+# Must match the writer in packages/templates/compiler.py
+BUNDLE_NAME = "templates.bundle"
+BUNDLE_MAGIC = b"SDTB"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_HEADER = struct.Struct(">4sHH32sI")
+
+DEFAULT_SECTION_CHARS = 4000
+# Fee lines when a template sets no ``fees`` pattern; matched against lowercased
+# descriptions of debit rows. The lookbehinds skip words ending in "fee"
+# ("coffee") while keeping a literal lead, so the scan stays fast. Bare
+# "interest" is left out: on a bank statement it is usually interest paid.
+DEFAULT_FEE_PATTERN = r"(?:fees?|charges?|penalty|gst|finance)(?<![a-z]fee)(?<![a-z]fees)\b"
+TRANSACTION_GROUPS = ("date", "description")
+# A row pattern needs at least one of these
+TRANSACTION_AMOUNT_GROUPS = ("amount", "withdrawal", "deposit")
+# Issuers are detected from the start of the document, where letterheads and logos' text sit
+ISSUER_SCAN_CHARS = 4000
+# Issuer entry for templates that are not issuer-specific
+GENERIC_ISSUER = "Generic"
+
+
+class TemplateError(ValueError):
+    """Raised when a compiled template cannot be loaded or its patterns do not compile."""
+
+
+@dataclass(frozen=True)
+class CompiledField:
+    """A template field with its patterns normalized and compiled."""
+
+    name: str
+    patterns: Tuple[Pattern[str], ...]
+    group_name: str = "value"
+    section: Optional[str] = None
+    # Leading patterns that come from the detected issuer's overrides
+    issuer_patterns: int = 0
+
+
+@dataclass(frozen=True)
+class CompiledSection:
+    """A named document section: starts at the first anchor hit, spans at most ``max_chars``."""
+
+    name: str
+    anchors: Tuple[Pattern[str], ...]
+    max_chars: int = DEFAULT_SECTION_CHARS
+
+
+@dataclass(frozen=True)
+class CompiledTransactionTable:
+    """Row pattern of a statement's transaction table.
+
+    ``row`` has ``date`` and ``description`` groups and the row's amount in an
+    ``amount`` group, a ``withdrawal`` or ``deposit`` group, or alternatives
+    holding either. An optional ``type`` group marks the amount a credit when
+    its value starts with ``C`` (a debit otherwise), and an optional
+    ``balance`` group holds the running balance, from which unmarked rows are
+    signed. ``fees`` is matched against lowercased descriptions.
+    """
+
+    row: Pattern[str]
+    fees: Pattern[str]
+    section: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Immutable, request-ready view of one compiled template."""
+
+    id: str
+    version: str
+    issuers: Tuple[str, ...]
+    fields: Tuple[CompiledField, ...]
+    post_rules: Tuple[EnsureAmountNumeric, ...]
+    red_flags: RedFlagRules
+    sections: Mapping[str, CompiledSection] = field(default_factory=lambda: MappingProxyType({}))
+    transactions: Optional[CompiledTransactionTable] = None
+    # Set on the per-issuer variants, whose fields try the issuer's patterns first
+    issuer: Optional[str] = None
+    issuer_matcher: Optional[KeywordMatcher] = None
+    issuer_variants: Mapping[str, "CompiledTemplate"] = field(default_factory=lambda: MappingProxyType({}))
+
+    @property
+    def scan_key(self) -> str:
+        """Key of this template's (or issuer variant's) pattern scans in cached chunk records."""
+        return f"{self.id}@{self.issuer}" if self.issuer else self.id
+
+    def detect_issuer(self, text: str, lowercase: bool = False) -> Optional[str]:
+        """The issuer whose keywords score highest near the start of ``text`` (first declared wins ties).
+
+        Pass ``lowercase=True`` when ``text`` is already lowercased.
+        """
+        if self.issuer_matcher is None:
+            return None
+        header = text[:ISSUER_SCAN_CHARS] if lowercase else text[:ISSUER_SCAN_CHARS].lower()
+        if not self.issuer_matcher.may_occur(header):
+            return None
+        scores = self.issuer_matcher.scores(header)
+        return max(scores, key=scores.__getitem__) if scores else None
+
+    def for_issuer(self, issuer: Optional[str]) -> "CompiledTemplate":
+        """The variant with ``issuer``'s pattern overrides, or this template if it has none."""
+        return self.issuer_variants.get(issuer, self) if issuer else self
+
+
+@dataclass(frozen=True)
+class TemplateSet:
+    """One loaded generation of compiled templates."""
+
+    templates: Mapping[str, CompiledTemplate]
+    index: Dict[str, Any]
+    fingerprint: str
+
+    @property
+    def version(self) -> str:
+        """Short content hash identifying this generation (cache keys, ETags)."""
+        return self.fingerprint[:16]
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+
+def normalize_pattern(pattern_str: str) -> str:
+    r"""Collapse the repeated backslash escaping that JSON/YAML leave on patterns.
+
+    Templates store patterns double- or triple-escaped (``\\\s`` for ``\s``);
+    reduce ``\\`` to ``\`` until the pattern stops changing.
+    """
+    normalized = pattern_str
+    previous = ""
+    while normalized != previous:
+        previous = normalized
+        normalized = normalized.replace("\\\\", "\\")
+    return normalized
+
+
+def compile_template(template: Dict[str, Any], normalized: bool = False) -> CompiledTemplate:
+    """Normalize and compile every pattern of a compiled JSON template.
+    
+    Pass ``normalized=True`` for patterns that were already unescaped by the
+    compiler (bundle payloads), which must not be collapsed a second time.
+    """
+    try:
+        template_id = template["id"]
+    except KeyError:
+        raise TemplateError("Template missing 'id'") from None
+
+    sections = {}
+    for section_name, section_def in template.get("sections", {}).items():
+        anchors = []
+        for anchor_str in section_def.get("anchors", []):
+            try:
+                anchors.append(re.compile(anchor_str if normalized else normalize_pattern(anchor_str)))
+            except re.error as e:
+                raise TemplateError(
+                    f"Invalid anchor in template '{template_id}' section '{section_name}': {e}"
+                ) from e
+        sections[section_name] = CompiledSection(
+            name=section_name,
+            anchors=tuple(anchors),
+            max_chars=int(section_def.get("max_chars", DEFAULT_SECTION_CHARS)),
+        )
+
+    fields = []
+    for field_name, field_def in template.get("fields", {}).items():
+        section = field_def.get("section")
+        if section is not None and section not in sections:
+            raise TemplateError(
+                f"Field '{field_name}' in template '{template_id}' uses undeclared section '{section}'"
+            )
+        group_name = field_def.get("group_name", "value")
+        patterns = _compile_field_patterns(
+            template_id, field_name, field_def.get("patterns", []), group_name, normalized
+        )
+        fields.append(CompiledField(
+            name=field_name, patterns=patterns, group_name=group_name, section=section
+        ))
+
+    transactions = None
+    table_def = template.get("transactions")
+    if table_def:
+        transactions = _compile_transaction_table(template_id, table_def, sections, normalized)
+
+    try:
+        post_rules = compile_post_rules(template.get("post_rules", []))
+        red_flags = compile_red_flags(template.get("red_flags", []))
+    except RuleError as e:
+        raise TemplateError(f"Invalid rule in template '{template_id}': {e}") from e
+
+    compiled = CompiledTemplate(
+        id=template_id,
+        version=str(template.get("version", "")),
+        issuers=tuple(template.get("issuers", [])),
+        fields=tuple(fields),
+        post_rules=post_rules,
+        red_flags=red_flags,
+        sections=MappingProxyType(sections),
+        transactions=transactions,
+    )
+    return _with_issuers(compiled, template.get("issuer_overrides", {}), normalized)
+
+
+def _compile_field_patterns(
+    template_id: str, field_name: str, pattern_strs: Any, group_name: str, normalized: bool
+) -> Tuple[Pattern[str], ...]:
+    patterns = []
+    for pattern_str in pattern_strs:
+        try:
+            pattern = re.compile(pattern_str if normalized else normalize_pattern(pattern_str))
+        except re.error as e:
+            raise TemplateError(
+                f"Invalid regex in template '{template_id}' field '{field_name}': {e}"
+            ) from e
+        if group_name not in pattern.groupindex:
+            raise TemplateError(
+                f"Pattern in template '{template_id}' field '{field_name}' "
+                f"has no '{group_name}' group"
+            )
+        patterns.append(pattern)
+    return tuple(patterns)
+
+
+def issuer_keyword(issuer: str) -> str:
+    """Default detection keyword for an issuer: its lowercased name as a whole word, with any spacing.
+
+    The word-start check is a lookbehind after the first word rather than a
+    leading ``\\b``, so the keyword keeps a literal lead and the scan stays fast.
+    """
+    first, *rest = (re.escape(word) for word in issuer.lower().split())
+    return first + f"(?<![a-z0-9]{first})" + "".join(r"\s*" + word for word in rest) + r"\b"
+
+
+def _with_issuers(
+    template: CompiledTemplate, overrides: Mapping[str, Any], normalized: bool
+) -> CompiledTemplate:
+    """Attach issuer detection and the per-issuer variants of ``template``.
+
+    A variant's fields try the issuer's override patterns, then the
+    template's own; fields without overrides are shared with the template.
+    """
+    keywords = {}
+    for issuer in template.issuers:
+        if issuer == GENERIC_ISSUER:
+            continue
+        override_keywords = overrides.get(issuer, {}).get("keywords")
+        if override_keywords is None:
+            keywords[issuer] = [issuer_keyword(issuer)]
+        else:
+            keywords[issuer] = [k if normalized else normalize_pattern(k) for k in override_keywords]
+    if not keywords:
+        return template
+    try:
+        matcher = KeywordMatcher(keywords)
+    except re.error as e:
+        raise TemplateError(f"Invalid issuer keyword in template '{template.id}': {e}") from e
+
+    variants = {}
+    for issuer, override in overrides.items():
+        if issuer not in keywords:
+            raise TemplateError(f"Template '{template.id}' overrides undeclared issuer '{issuer}'")
+        fields = []
+        for compiled_field in template.fields:
+            field_override = override.get("fields", {}).get(compiled_field.name)
+            if not field_override:
+                fields.append(compiled_field)
+                continue
+            issuer_patterns = _compile_field_patterns(
+                template.id, compiled_field.name, field_override.get("patterns", []),
+                compiled_field.group_name, normalized,
+            )
+            fields.append(replace(
+                compiled_field,
+                patterns=issuer_patterns + compiled_field.patterns,
+                issuer_patterns=len(issuer_patterns),
+            ))
+        variants[issuer] = replace(template, fields=tuple(fields), issuer=issuer, issuer_matcher=matcher)
+    return replace(template, issuer_matcher=matcher, issuer_variants=MappingProxyType(variants))
+
+
+def _compile_transaction_table(
+    template_id: str, table_def: Dict[str, Any], sections: Mapping[str, CompiledSection], normalized: bool
+) -> CompiledTransactionTable:
+    patterns = []
+    for key, default in (("row", None), ("fees", DEFAULT_FEE_PATTERN)):
+        pattern_str = table_def.get(key, default)
+        if pattern_str is None:
+            raise TemplateError(f"Transaction table in template '{template_id}' has no 'row' pattern")
+        if key in table_def and not normalized:
+            pattern_str = normalize_pattern(pattern_str)
+        try:
+            patterns.append(re.compile(pattern_str))
+        except re.error as e:
+            raise TemplateError(f"Invalid transaction {key} regex in template '{template_id}': {e}") from e
+    row, fees = patterns
+    missing = [group for group in TRANSACTION_GROUPS if group not in row.groupindex]
+    if not any(group in row.groupindex for group in TRANSACTION_AMOUNT_GROUPS):
+        missing.append(" or ".join(TRANSACTION_AMOUNT_GROUPS))
+    if missing:
+        raise TemplateError(
+            f"Transaction row pattern in template '{template_id}' has no {', '.join(missing)} group(s)"
+        )
+    section = table_def.get("section")
+    if section is not None and section not in sections:
+        raise TemplateError(f"Transaction table in template '{template_id}' uses undeclared section '{section}'")
+    return CompiledTransactionTable(row=row, fees=fees, section=section)
+
+
+def read_bundle(path: Path) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Read and verify a compiled template bundle with a single mapped read.
+    
+    Returns the decoded payload and its hex SHA-256, or ``None`` when the
+    bundle uses a format version this loader does not know, so callers can
+    fall back to the JSON manifests.
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header = data[:BUNDLE_HEADER.size]
+            payload = data[BUNDLE_HEADER.size:]
+    except (OSError, ValueError) as e:
+        raise TemplateError(f"Cannot read template bundle {path.name}: {e}") from e
+
+    if len(header) < BUNDLE_HEADER.size:
+        raise TemplateError(f"Truncated template bundle {path.name}")
+    magic, version, _, digest, length = BUNDLE_HEADER.unpack(header)
+    if magic != BUNDLE_MAGIC:
+        raise TemplateError(f"{path.name} is not a template bundle")
+    if version != BUNDLE_FORMAT_VERSION:
+        return None
+    if len(payload) != length or hashlib.sha256(payload).digest() != digest:
+        raise TemplateError(f"Template bundle {path.name} failed its integrity check")
+    return json.loads(zlib.decompress(payload)), digest.hex()
+
+
+def _load_json_manifests(templates_dir: Path) -> TemplateSet:
+    templates: Dict[str, CompiledTemplate] = {}
+    index: Dict[str, Any] = {"docTypes": []}
+    digest = hashlib.sha256()
+    for template_file in sorted(templates_dir.glob("*.json")):
+        try:
+            raw_bytes = template_file.read_bytes()
+            raw = json.loads(raw_bytes)
+        except (OSError, ValueError) as e:
+            raise TemplateError(f"Cannot read template {template_file.name}: {e}") from e
+        digest.update(raw_bytes)
+        if template_file.name == "index.json":
+            index = raw
+            continue
+        compiled = compile_template(raw)
+        templates[compiled.id] = compiled
+    return TemplateSet(MappingProxyType(templates), index, digest.hexdigest())
+
+
+def load_template_set(templates_dir: Path = TEMPLATES_DIR) -> TemplateSet:
+    """Load and compile all templates in ``templates_dir`` with their index.
+
+    The binary bundle is preferred (one read, patterns already normalized);
+    without it, or if its format is newer than this loader, each JSON manifest
+    is parsed. A missing directory yields an empty set; a malformed template
+    raises ``TemplateError`` so broken patterns fail at load rather than being
+    skipped on every request.
+    """
+    if not templates_dir.exists():
+        return TemplateSet(MappingProxyType({}), {"docTypes": []}, hashlib.sha256().hexdigest())
+
+    bundle = None
+    bundle_path = templates_dir / BUNDLE_NAME
+    if bundle_path.exists():
+        bundle = read_bundle(bundle_path)
+    if bundle is None:
+        return _load_json_manifests(templates_dir)
+
+    payload, digest = bundle
+    normalized = bool(payload.get("patterns_normalized"))
+    templates: Dict[str, CompiledTemplate] = {}
+    for raw in payload["templates"]:
+        compiled = compile_template(raw, normalized=normalized)
+        templates[compiled.id] = compiled
+    return TemplateSet(MappingProxyType(templates), payload.get("index", {"docTypes": []}), digest)
+
+
+def load_templates(templates_dir: Path = TEMPLATES_DIR) -> Mapping[str, CompiledTemplate]:
+    """Load and compile all templates in ``templates_dir`` into a read-only registry."""
+    return load_template_set(templates_dir).templates
+
+
+class TemplateRegistry:
+    """Holds the current template set and swaps in a new one when the artifacts change.
+    
+    ``current()`` stats the compiled directory at most once per
+    ``poll_seconds`` (0 disables polling). When file names, sizes or mtimes
+    change, the set is reloaded and replaced with a single reference
+    assignment, so callers holding the previous set keep a consistent view. A
+    set that fails to load is logged and the previous one stays in service.
+    """
+    
+    def __init__(self, templates_dir: Path = TEMPLATES_DIR, poll_seconds: float = 0):
+        self.templates_dir = templates_dir
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._stamp = self._scan()
+        self._current = load_template_set(templates_dir)
+        self._next_check = time.monotonic() + poll_seconds
+    
+    def _scan(self) -> Tuple[Tuple[str, int, int], ...]:
+        entries = []
+        try:
+            for entry in os.scandir(self.templates_dir):
+                if entry.name.endswith(".json") or entry.name == BUNDLE_NAME:
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            return ()
+        return tuple(sorted(entries))
+    
+    def current(self) -> TemplateSet:
+        if self.poll_seconds > 0 and time.monotonic() >= self._next_check:
+            self.refresh()
+        return self._current
+    
+    def refresh(self) -> bool:
+        """Reload if the compiled artifacts changed; returns True when a new set was swapped in."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.poll_seconds
+            stamp = self._scan()
+            if stamp == self._stamp:
+                return False
+            try:
+                template_set = load_template_set(self.templates_dir)
+            except TemplateError:
+                logger.exception("Template reload failed; keeping version %s", self._current.version)
+                return False
+            self._stamp = stamp
+            if template_set.fingerprint == self._current.fingerprint:
+                return False
+            self._current = template_set
+            logger.info("Loaded templates version %s", template_set.version)
+            return True
+        finally:
+            self._lock.release()
+
+
+_registry: Optional[TemplateRegistry] = None
+
+
+def get_registry() -> TemplateRegistry:
+    """Process-wide registry over the compiled templates, loaded on first use."""
+    global _registry
+    if _registry is None:
+        _registry = TemplateRegistry(TEMPLATES_DIR, settings.template_poll_seconds)
+    return _registry
@@ -1,70 +1,311 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import Any
+import json
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import APIRouter, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, AsyncIterator
 from fastapi import HTTPException
-from ..cache import cache_get, cache_set, content_hash, rate_limit_allow
-from ..extractors import DocumentClassifier, TemplateExtractor, SummaryGenerator, ActionGenerator
+from starlette.concurrency import run_in_threadpool
+from ..cache import cache_get, cache_get_many, cache_set, cache_set_many, content_hash
+from ..chunks import DocumentChunks
+from ..coalesce import coalesce
+from ..config import settings
+from ..document import Document, normalize_text
+from ..executor import ExecutorSaturated, ExplainTimeout, run_explain, run_jobs
+from ..metrics import StageTimer, count_chunks, count_redactions
+from ..pipeline import StreamingExplainer
+from ..registry import get_registry
+from ..ratelimit import rate_limit_check
+from ..rules import seconds_until_tomorrow
 
 
 router = APIRouter()
 
-# Initialize extractors
-_extractor = TemplateExtractor()
-
 
 class DocMeta(BaseModel):
     typeHint: str | None = None
-    pages: int | None = None
+    pages: int | None = Field(default=None, ge=1)
 
 
 class ExplainRequest(BaseModel):
-    docText: str
+    docText: str = Field(min_length=1)
     docMeta: DocMeta
-    locale: str
+    locale: str = Field(pattern=r"^[a-z]{2}-[A-Z]{2}$")
     hints: bool | None = False
-    deviceId: str
+    deviceId: str = Field(min_length=3)
+
+
+class ExplainBatchRequest(BaseModel):
+    items: list[ExplainRequest] = Field(min_length=1)
+
+
+class ExplainStreamHeader(BaseModel):
+    """First NDJSON line of a streamed request; page lines follow."""
+    docMeta: DocMeta
+    locale: str = Field(pattern=r"^[a-z]{2}-[A-Z]{2}$")
+    hints: bool | None = False
+    deviceId: str = Field(min_length=3)
+
+
+class ExplainStreamPage(BaseModel):
+    text: str
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that leaves ``receive`` to the body iterator.
+    
+    The stock response listens for client disconnects on ``receive``, which
+    would swallow request body chunks that are still being read while events
+    are already being sent.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+class _LineTooLong(Exception):
+    """An NDJSON line of the request exceeds ``STREAM_MAX_LINE_BYTES``."""
+
+
+async def _ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield non-blank lines of the request body as they arrive.
+
+    Each byte is searched for a newline once, however the body is chunked.
+    Raises ``_LineTooLong`` instead of buffering a line past the limit.
+    """
+    max_bytes = settings.stream_max_line_bytes
+    pending = bytearray()
+    async for chunk in request.stream():
+        scanned = len(pending)
+        pending += chunk
+        start = 0
+        while (end := pending.find(b"\n", scanned)) >= 0:
+            if end - start > max_bytes:
+                raise _LineTooLong()
+            line = bytes(pending[start:end])
+            if line.strip():
+                yield line
+            start = scanned = end + 1
+        # Only the tail after the last newline is kept, so a long line is never copied per chunk
+        del pending[:start]
+        if len(pending) > max_bytes:
+            raise _LineTooLong()
+    if pending.strip():
+        yield bytes(pending)
+
+
+def _ndjson(event: dict[str, Any]) -> bytes:
+    return json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _cache_key(text: str, type_hint: str | None, pages: int | None, locale: str) -> str:
+    """Explain cache key: the document and the request options the response depends on.
+
+    Includes the template version so a template change is never served stale.
+    """
+    options = f"{type_hint or ''}\x00{pages or ''}\x00{locale}\x00"
+    return f"explain:{get_registry().current().version}:{content_hash(options + text)}"
+
+
+def _response_ttl(resp: dict[str, Any]) -> int | None:
+    """Cache lifetime of a response: the default, or the rest of the day when its flags use ``days_since``."""
+    template = get_registry().current().templates.get(resp.get("docType"))
+    if template is not None and template.red_flags.date_relative:
+        return seconds_until_tomorrow()
+    return None
+
+
+def _item_error(status: int, detail: str) -> dict[str, Any]:
+    return {"ok": False, "error": {"status": status, "detail": detail}}
+
+
+def _job_error(error: Any) -> dict[str, Any]:
+    """The per-item error for a batch job that failed with ``error``, using the ``/explain`` statuses."""
+    if isinstance(error, ExecutorSaturated):
+        return _item_error(503, "Server busy")
+    if isinstance(error, ExplainTimeout):
+        return _item_error(503, "Document took too long to explain")
+    if isinstance(error, BrokenProcessPool):
+        return _item_error(503, "Worker restarting")
+    return _item_error(500, "Internal server error")
+
+
+async def _compute(key: str, document: Document, req: ExplainRequest, timer: StageTimer) -> dict[str, Any]:
+    """Explain a document that missed the cache, and store the response under ``key``."""
+    # Near-duplicates of earlier documents reuse the scan records of their unchanged chunks
+    chunks = None
+    if settings.chunk_cache:
+        with timer.stage("chunk_cache_get"):
+            # Hashing every chunk is CPU work; keep it off the event loop like the pipeline
+            chunks = await run_in_threadpool(DocumentChunks, document, get_registry().current().version)
+            chunks.load(await cache_get_many(chunks.keys))
+
+    # Regex work runs on the extraction executor, off the event loop and (in process mode) the GIL
+    try:
+        resp = await run_explain(document, req.docMeta.typeHint, req.docMeta.pages, req.locale, timer, chunks)
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=503, detail="Server busy", headers={"Retry-After": str(e.retry_after)}
+        )
+    except ExplainTimeout:
+        raise HTTPException(status_code=503, detail="Document took too long to explain", headers={"Retry-After": "1"})
+    except BrokenProcessPool:
+        # run_explain has already discarded the pool; the next document starts a new one
+        raise HTTPException(status_code=503, detail="Worker restarting", headers={"Retry-After": "1"})
+    count_redactions(resp.get("redactions", {}))
+
+    with timer.stage("cache_set"):
+        # Chunk records are only stored once complete, so they are kept even when the budget ran out
+        if chunks is not None:
+            updated = chunks.updated()
+            count_chunks(chunks.reused, len(updated))
+            if updated:
+                # Only near-duplicates arriving soon after benefit; don't hold records as long as responses
+                await cache_set_many(updated, settings.chunk_cache_ttl_seconds)
+        # A timed-out extraction may succeed on retry; don't pin it in the cache
+        if "timedOutFields" not in resp:
+            await cache_set(key, resp, _response_ttl(resp))
+    return resp
 
 
 @router.post("/explain")
-def explain(req: ExplainRequest) -> dict[str, Any]:
-    if not rate_limit_allow(req.deviceId):
-        raise HTTPException(status_code=429, detail="Too many requests")
+async def explain(req: ExplainRequest, request: Request, response: Response) -> dict[str, Any]:
+    timer: StageTimer = request.state.timer
+    with timer.stage("rate_limit"):
+        limit = await rate_limit_check(req.deviceId)
+    if not limit.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests", headers=limit.headers())
+    response.headers.update(limit.headers())
     
     text = req.docText.strip()
     if not text:
         raise HTTPException(status_code=400, detail="Document text is required")
+    # Normalized once; every later stage reads this document
+    with timer.stage("normalize"):
+        document = Document(text, req.docMeta.pages)
     
     # Check cache
-    key = f"explain:{content_hash(text)}"
-    cached = cache_get(key)
+    key = _cache_key(document.text, req.docMeta.typeHint, req.docMeta.pages, req.locale)
+    with timer.stage("cache_get"):
+        cached = await cache_get(key)
     if cached:
         return cached
     
-    # Classify document type
-    doc_type = DocumentClassifier.classify(text, req.docMeta.typeHint)
+    # Concurrent requests for this document share one computation
+    return await coalesce(key, lambda: _compute(key, document, req, timer), timer)
+
+
+@router.post("/explain/batch")
+async def explain_batch(req: ExplainBatchRequest, request: Request) -> dict[str, Any]:
+    """Explain many documents in one call; results are returned in request order."""
+    timer: StageTimer = request.state.timer
+    if len(req.items) > settings.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.batch_max_items} items")
     
-    # Extract fields using templates
-    extraction_result = _extractor.extract(text, doc_type)
-    extractions = extraction_result["extractions"]
-    citations = extraction_result["citations"]
-    confidence = extraction_result["confidence"]
+    # Each device is charged one request per item; its items past the remaining quota get 429
+    admitted = {}
+    with timer.stage("rate_limit"):
+        for device_id, count in Counter(item.deviceId for item in req.items).items():
+            admitted[device_id] = (await rate_limit_check(device_id, cost=count, partial=True)).granted
     
-    # Generate summary
-    summary = SummaryGenerator.generate(extractions, doc_type, req.locale)
+    results: list[dict[str, Any] | None] = [None] * len(req.items)
+    pending = []
+    for i, item in enumerate(req.items):
+        if admitted[item.deviceId] <= 0:
+            results[i] = _item_error(429, "Too many requests")
+            continue
+        admitted[item.deviceId] -= 1
+        if not item.docText.strip():
+            results[i] = _item_error(400, "Document text is required")
+        else:
+            pending.append(i)
+    # Normalizing is CPU work; keep it off the event loop like the pipeline
+    with timer.stage("normalize"):
+        normalized = await run_in_threadpool(
+            lambda: [normalize_text(req.items[i].docText.strip()) for i in pending]
+        )
+    keys: dict[str, list[int]] = {}
+    texts: dict[str, str] = {}
+    for i, text in zip(pending, normalized):
+        item = req.items[i]
+        key = _cache_key(text, item.docMeta.typeHint, item.docMeta.pages, item.locale)
+        keys.setdefault(key, []).append(i)
+        texts.setdefault(key, text)
     
-    # Generate actions
-    actions = ActionGenerator.generate(extractions, doc_type)
+    # Deduplicated lookup: L1, then a single MGET
+    unique_keys = list(keys)
+    misses = []
+    with timer.stage("cache_get"):
+        cached_values = await cache_get_many(unique_keys)
+    for key, cached in zip(unique_keys, cached_values):
+        if cached:
+            for i in keys[key]:
+                results[i] = {"ok": True, "result": cached}
+        else:
+            misses.append(key)
     
-    resp = {
-        "summary": summary,
-        "extractions": extractions,
-        "actions": actions,
-        "confidence": confidence,
-        "docType": doc_type,
-        "citations": citations
-    }
+    # Compute each distinct miss once on the extraction executor
+    jobs = []
+    for key in misses:
+        first = req.items[keys[key][0]]
+        jobs.append((texts[key], first.docMeta.typeHint, first.docMeta.pages, first.locale))
+    fresh: dict[int | None, dict[str, dict[str, Any]]] = {}
+    with timer.stage("compute"):
+        outcomes = await run_jobs(jobs)
+    for key, (ok, payload) in zip(misses, outcomes):
+        if ok:
+            count_redactions(payload.get("redactions", {}))
+            if "timedOutFields" not in payload:
+                fresh.setdefault(_response_ttl(payload), {})[key] = payload
+            outcome = {"ok": True, "result": payload}
+        else:
+            outcome = _job_error(payload)
+        for i in keys[key]:
+            results[i] = outcome
     
-    cache_set(key, resp)
-    return resp
+    with timer.stage("cache_set"):
+        for ttl_seconds, items in fresh.items():
+            await cache_set_many(items, ttl_seconds)
+    return {"results": results}
 
 
+@router.post("/explain/stream")
+async def explain_stream(request: Request) -> StreamingResponse:
+    """Explain a document sent as NDJSON pages, streaming NDJSON events back."""
+    lines = _ndjson_lines(request)
+    try:
+        header = ExplainStreamHeader.model_validate_json(await anext(lines))
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Document text is required")
+    except _LineTooLong:
+        raise HTTPException(status_code=413, detail=f"Line exceeds {settings.stream_max_line_bytes} bytes")
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    
+    limit = await rate_limit_check(header.deviceId)
+    if not limit.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests", headers=limit.headers())
+    
+    async def events() -> AsyncIterator[bytes]:
+        explainer = StreamingExplainer(header.docMeta.typeHint, header.locale)
+        try:
+            async for line in lines:
+                try:
+                    page = ExplainStreamPage.model_validate_json(line)
+                except ValidationError:
+                    yield _ndjson({"event": "error", "status": 400, "detail": "Invalid page line"})
+                    return
+                for event in await run_in_threadpool(explainer.feed, page.text):
+                    yield _ndjson(event)
+        except _LineTooLong:
+            detail = f"Line exceeds {settings.stream_max_line_bytes} bytes"
+            yield _ndjson({"event": "error", "status": 413, "detail": detail})
+            return
+        for event in await run_in_threadpool(explainer.finish):
+            if event["event"] == "result":
+                count_redactions(event.get("redactions", {}))
+            yield _ndjson(event)
+    
+    return _DuplexStreamingResponse(events(), media_type="application/x-ndjson", headers=limit.headers())
@@ -1,23 +1,18 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 from typing import Any
-import json
-from pathlib import Path
+from ..registry import get_registry
 
 
 router = APIRouter()
 
-# Load templates index
-TEMPLATES_DIR = Path(__file__).parent.parent.parent.parent.parent / "packages" / "templates" / "compiled"
-INDEX_PATH = TEMPLATES_DIR / "index.json"
-
 
 @router.get("/templates")
-def get_templates() -> dict[str, Any]:
+def get_templates(request: Request, response: Response) -> Any:
     """List all supported document types and versions."""
-    if INDEX_PATH.exists():
-        with open(INDEX_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+    template_set = get_registry().current()
+    headers = {"ETag": template_set.etag, "Cache-Control": "no-cache"}
+    if template_set.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
     
-    # Fallback: return empty index if compiled templates not available
-    return {"docTypes": []}
-
+    response.headers.update(headers)
+    return template_set.index
@@ -0,0 +1,259 @@
+"""Template post-rules and red flags, compiled to predicate objects at template load.
+
+The template compiler parses rule declarations into structured JSON (see
+``packages/templates/compiler.py``); here each becomes a frozen object whose
+operator, operands and keywords are resolved once, so evaluating a template's
+rules per request is a few attribute lookups and comparisons.
+"""
+
+import operator
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Collection, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+# Characters dropped from amounts; values come from normalized text, so whitespace is only spaces and newlines
+AMOUNT_NOISE = str.maketrans("", "", "₹, \n\f")
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+# Date values as the templates extract them: "01 Oct 2025", "01October2025", "2025-10-01"
+_DAY_MONTH_YEAR = re.compile(r"(\d{1,2})\s*([A-Za-z]{3})[A-Za-z]*\s*(\d{4})")
+_ISO_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+# Month abbreviations, looked up directly: strptime re-checks the locale on every call
+_MONTHS = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1
+)}
+
+
+class RuleError(ValueError):
+    """Raised when a compiled rule declaration is malformed."""
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """The date an extracted value names, or None when it is not a recognised date."""
+    if not isinstance(value, str):
+        return None
+    try:
+        match = _ISO_DATE.search(value)
+        if match:
+            return date(*map(int, match.groups()))
+        match = _DAY_MONTH_YEAR.search(value)
+        if match:
+            day, month, year = match.groups()
+            month_number = _MONTHS.get(month.lower())
+            return date(int(year), month_number, int(day)) if month_number else None
+    except ValueError:
+        pass
+    return None
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.translate(AMOUNT_NOISE))
+        except ValueError:
+            return None
+    return None
+
+
+@dataclass(frozen=True)
+class EnsureAmountNumeric:
+    """Post-rule: convert the fields' string values to floats where they parse as amounts."""
+
+    fields: Tuple[str, ...]
+
+    def apply(self, extractions: Dict[str, Any]) -> None:
+        for field in self.fields:
+            value = extractions.get(field)
+            if isinstance(value, str):
+                number = _number(value)
+                if number is not None:
+                    extractions[field] = number
+
+
+@dataclass(frozen=True)
+class Operand:
+    """One side of a comparison: a (scaled) field value, days since a date field, or a constant."""
+
+    field: Optional[str] = None
+    factor: float = 1.0
+    days_since: bool = False
+    constant: Any = None
+
+    def resolve(self, extractions: Mapping[str, Any], today: date) -> Any:
+        """The operand's value, or None when its field is missing or not usable."""
+        if self.field is None:
+            return self.constant
+        value = extractions.get(self.field)
+        if self.days_since:
+            day = parse_date(value)
+            return float((today - day).days) if day is not None else None
+        if isinstance(value, str) and self.factor == 1.0 and _number(value) is None:
+            return value.strip().lower()
+        number = _number(value)
+        return number * self.factor if number is not None else None
+
+
+@dataclass(frozen=True)
+class Compare:
+    """Holds when both operands resolve and compare true (strings case-insensitively)."""
+
+    left: Operand
+    op: Callable[[Any, Any], bool]
+    right: Operand
+
+    def __call__(
+        self, extractions: Mapping[str, Any], keywords: Collection[str], unknown: Collection[str], today: date
+    ) -> bool:
+        left = self.left.resolve(extractions, today)
+        right = self.right.resolve(extractions, today)
+        if left is None or right is None or isinstance(left, str) != isinstance(right, str):
+            return False
+        return self.op(left, right)
+
+
+@dataclass(frozen=True)
+class KeywordPresent:
+    """Holds when any of the (lowercase) keywords occurs in the document."""
+
+    keywords: Tuple[str, ...]
+
+    def __call__(
+        self, extractions: Mapping[str, Any], keywords: Collection[str], unknown: Collection[str], today: date
+    ) -> bool:
+        return any(keyword in keywords for keyword in self.keywords)
+
+
+@dataclass(frozen=True)
+class FieldsMissing:
+    """Holds when none of the fields was extracted (fields the regex budget skipped do not count)."""
+
+    fields: Tuple[str, ...]
+
+    def __call__(
+        self, extractions: Mapping[str, Any], keywords: Collection[str], unknown: Collection[str], today: date
+    ) -> bool:
+        return all(field not in extractions and field not in unknown for field in self.fields)
+
+
+@dataclass(frozen=True)
+class RedFlag:
+    """A named warning raised when all of its conditions hold."""
+
+    id: str
+    message: str
+    conditions: Tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class RedFlagRules:
+    """A template's red flags, with every keyword they look for gathered for one scan."""
+
+    flags: Tuple[RedFlag, ...] = ()
+    keywords: FrozenSet[str] = frozenset()
+    # Some flag compares ``days_since``, so its result can change when the date does
+    date_relative: bool = False
+
+    def find_keywords(self, lowercase_text: str) -> FrozenSet[str]:
+        """The rule keywords occurring in ``lowercase_text``; results of several texts can be unioned."""
+        return frozenset(keyword for keyword in self.keywords if keyword in lowercase_text)
+
+    def evaluate(
+        self,
+        extractions: Mapping[str, Any],
+        keywords: Collection[str] = frozenset(),
+        unknown: Collection[str] = (),
+        today: Optional[date] = None,
+    ) -> List[Dict[str, str]]:
+        """``{"id", "message"}`` of every flag whose conditions all hold, in template order.
+
+        ``keywords`` are those ``find_keywords`` found in the document and
+        ``unknown`` the fields that were not searched (timed out). Date
+        arithmetic is relative to ``today`` (default: the current date).
+        """
+        if not self.flags:
+            return []
+        today = today or date.today()
+        return [
+            {"id": flag.id, "message": flag.message}
+            for flag in self.flags
+            if all(condition(extractions, keywords, unknown, today) for condition in flag.conditions)
+        ]
+
+
+def _operand(operand: Mapping[str, Any]) -> Operand:
+    if "days_since" in operand:
+        return Operand(field=operand["days_since"], days_since=True)
+    if "field" in operand:
+        return Operand(field=operand["field"], factor=float(operand.get("factor", 1.0)))
+    if "value" in operand:
+        value = operand["value"]
+        return Operand(constant=value.strip().lower() if isinstance(value, str) else float(value))
+    raise RuleError(f"Unknown operand {dict(operand)!r}")
+
+
+def _condition(condition: Mapping[str, Any]) -> Any:
+    if len(condition) != 1:
+        raise RuleError(f"Condition must have one kind, got {dict(condition)!r}")
+    (kind, arg), = condition.items()
+    if kind == "compare":
+        try:
+            op = _OPERATORS[arg["op"]]
+        except KeyError:
+            raise RuleError(f"Unknown comparison operator in {arg!r}") from None
+        return Compare(left=_operand(arg["left"]), op=op, right=_operand(arg["right"]))
+    if kind == "keyword":
+        return KeywordPresent(keywords=tuple(keyword.lower() for keyword in arg))
+    if kind == "missing":
+        return FieldsMissing(fields=tuple(arg))
+    raise RuleError(f"Unknown condition '{kind}'")
+
+
+def compile_post_rules(rules: Sequence[Mapping[str, Any]]) -> Tuple[EnsureAmountNumeric, ...]:
+    """Post-rule objects for a compiled template's ``post_rules``."""
+    compiled = []
+    for rule in rules:
+        if "ensure_amount_numeric" not in rule:
+            raise RuleError(f"Unknown post-rule {dict(rule)!r}")
+        compiled.append(EnsureAmountNumeric(fields=tuple(rule["ensure_amount_numeric"])))
+    return tuple(compiled)
+
+
+def compile_red_flags(flags: Sequence[Mapping[str, Any]]) -> RedFlagRules:
+    """Red-flag predicates for a compiled template's ``red_flags``."""
+    compiled = []
+    for flag in flags:
+        try:
+            conditions = tuple(_condition(condition) for condition in flag["when"])
+            compiled.append(RedFlag(id=flag["id"], message=flag["message"], conditions=conditions))
+        except (KeyError, TypeError) as e:
+            raise RuleError(f"Malformed red flag {dict(flag)!r}: {e}") from e
+    keywords = frozenset(
+        keyword
+        for flag in compiled
+        for condition in flag.conditions
+        if isinstance(condition, KeywordPresent)
+        for keyword in condition.keywords
+    )
+    date_relative = any(
+        isinstance(condition, Compare) and (condition.left.days_since or condition.right.days_since)
+        for flag in compiled
+        for condition in flag.conditions
+    )
+    return RedFlagRules(flags=tuple(compiled), keywords=keywords, date_relative=date_relative)
+
+
+def seconds_until_tomorrow(now: Optional[datetime] = None) -> int:
+    """Seconds left in the current (local) date, for which ``days_since`` results stay valid."""
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+    return max(1, int((midnight - now).total_seconds()))
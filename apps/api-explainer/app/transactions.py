@@ -0,0 +1,240 @@
+"""Columnar transaction-table extraction for statement templates.
+
+Rows are matched in bulk with ``findall`` over line-aligned chunks and kept
+column-wise: parallel lists of dates and descriptions, an ``array('d')`` of
+amounts and byte masks of debits and credits. Aggregates are computed over
+whole columns with ``map``/``compress``/``fsum`` instead of per-row dicts.
+
+A row's direction comes from its withdrawal or deposit column, its Dr/Cr
+marker, or the change in the running balance since the previous row. Rows
+where none of these tells are left unsigned rather than guessed.
+"""
+
+import math
+import re
+import time
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate, compress, repeat
+from operator import mul
+from typing import Any, Dict, List, Optional, Sequence
+
+from .document import lower_text
+from .matching import RegexBudgetExceeded
+from .registry import CompiledTransactionTable
+
+TOP_MERCHANTS = 5
+
+# Payment rails and filler words that prefix merchant names in descriptions
+_CHANNEL_WORDS = frozenset({
+    "UPI", "NEFT", "IMPS", "RTGS", "POS", "ATM", "ACH", "ECS", "NACH", "BIL", "INB", "TO", "BY", "TRF", "TRANSFER",
+})
+_MERCHANT_TOKEN = re.compile(r"[A-Za-z][A-Za-z&'.]+(?: [A-Za-z][A-Za-z&'.]+)*")
+_DROP_DIGITS = str.maketrans("", "", "0123456789")
+# Largest difference between a row's balance and the previous balance plus its amount that still reconciles
+_BALANCE_TOLERANCE = 0.005
+# Row directions, and byte tables turning a column of them into debit and credit masks
+_DEBIT, _CREDIT, _UNSIGNED = 0, 1, 2
+_DEBIT_MASK = bytes.maketrans(b"\x00\x01\x02", b"\x01\x00\x00")
+_CREDIT_MASK = bytes.maketrans(b"\x00\x01\x02", b"\x00\x01\x00")
+
+
+@lru_cache(maxsize=4096)
+def merchant_name(description: str) -> str:
+    """First run of words in a description that is not a payment-channel marker.
+
+    Callers strip digits first so descriptions differing only in reference
+    numbers share a cache entry.
+    """
+    for token in _MERCHANT_TOKEN.findall(description):
+        words = [word for word in token.upper().split() if word not in _CHANNEL_WORDS]
+        if words:
+            return " ".join(words)
+    return "OTHER"
+
+
+class TransactionColumns:
+    """Transaction rows of one document, accumulated column-wise."""
+
+    def __init__(self, table: CompiledTransactionTable):
+        self._table = table
+        groups = table.row.groupindex
+        self._date = groups["date"] - 1
+        self._description = groups["description"] - 1
+        self._columns = {
+            name: groups[name] - 1 if name in groups else None
+            for name in ("amount", "type", "withdrawal", "deposit", "balance")
+        }
+        self.dates: List[str] = []
+        self.descriptions: List[str] = []
+        self.amounts = array("d")
+        self.debits = bytearray()
+        self.credits = bytearray()
+        # Running balance after each row (None where the row shows none), when the table has a balance column
+        self.balances: Optional[List[Optional[float]]] = [] if self._columns["balance"] is not None else None
+        self._last_balance: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def scan(self, text: str, chunk_chars: int = 0, deadline: Optional[float] = None,
+             pos: int = 0, endpos: Optional[int] = None) -> None:
+        """Add every row in ``text[pos:endpos]``, one ``findall`` per line-aligned chunk.
+
+        Chunks hold whole lines of at most about ``chunk_chars`` characters
+        (unbounded when 0) and the deadline is checked before each one.
+        """
+        length = len(text) if endpos is None else min(endpos, len(text))
+        findall = self._table.row.findall
+        while pos < length:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise RegexBudgetExceeded
+            end = length
+            if 0 < chunk_chars < length - pos:
+                end = text.rfind("\n", pos, pos + chunk_chars)
+                if end <= pos:
+                    end = text.find("\n", pos + chunk_chars)
+                    end = length if end == -1 else end
+            self._add(findall(text, pos, end))
+            pos = end + 1
+
+    def _add(self, rows: List[Any]) -> None:
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        count = len(rows)
+        self.dates.extend(columns[self._date])
+        self.descriptions.extend(columns[self._description])
+        amounts, withdrawals, deposits = (
+            _parse_column(self._column(columns, name)) for name in ("amount", "withdrawal", "deposit")
+        )
+        kinds = self._column(columns, "type") or ("",) * count
+        balance = self._column(columns, "balance")
+        balances = [_parse_amount(value) if value else None for value in balance] if any(balance) else [None] * count
+        if withdrawals is None and deposits is None and balances.count(None) == count:
+            # Markers are all there is to sign these rows by
+            directions = bytes(map(_marker_direction, kinds))
+        else:
+            zeros = [0.0] * count
+            amounts, withdrawals, deposits = (column or zeros for column in (amounts, withdrawals, deposits))
+            # Rows without a balance carry the last one shown forward; it must still reconcile exactly
+            known = list(accumulate([self._last_balance, *balances], _carry_balance))
+            directions = bytes(map(_direction, amounts, kinds, withdrawals, deposits, known, balances))
+            # A row holds one amount, in whichever column it appeared
+            amounts = list(map(max, amounts, withdrawals, deposits))
+            self._last_balance = known[-1]
+        self.amounts.extend(amounts or [0.0] * count)
+        self.debits.extend(directions.translate(_DEBIT_MASK))
+        self.credits.extend(directions.translate(_CREDIT_MASK))
+        if self.balances is not None:
+            self.balances.extend(balances)
+
+    def _column(self, columns: List[Any], name: str) -> Sequence[str]:
+        index = self._columns[name]
+        return columns[index] if index is not None else ()
+
+    def summary(self) -> Dict[str, Any]:
+        """Columns plus totals, top merchants by spend, fee rows and rows whose direction is unknown."""
+        debits_mask = self.debits
+        credit_column = list(map(mul, self.amounts, self.credits))
+        debit_column = list(map(mul, self.amounts, debits_mask))
+        total_credit = math.fsum(credit_column)
+        total_debit = math.fsum(debit_column)
+
+        # One joined copy of the description column serves both merchant keys and the fee scan
+        joined = "\n".join(self.descriptions)
+        merchants = map(merchant_name, joined.translate(_DROP_DIGITS).split("\n"))
+        spend: Dict[str, List[float]] = {}
+        for merchant, amount in compress(zip(merchants, self.amounts), debits_mask):
+            totals = spend.setdefault(merchant, [0, 0.0])
+            totals[0] += 1
+            totals[1] += amount
+        top = sorted(spend.items(), key=lambda item: item[1][1], reverse=True)[:TOP_MERCHANTS]
+
+        # Fees are charged, so a credit ("INTEREST CREDITED", a fee reversal) never counts
+        fee_rows = [i for i in self._fee_rows(lower_text(joined)) if debits_mask[i]]
+        unsigned_rows = [i for i, signed in enumerate(map(max, debits_mask, self.credits)) if not signed]
+        columns = {
+            "date": self.dates,
+            "description": self.descriptions,
+            "debit": debit_column,
+            "credit": credit_column,
+        }
+        if self.balances is not None:
+            columns["balance"] = self.balances
+        return {
+            "count": len(self),
+            "columns": columns,
+            "totals": {
+                "debit": round(total_debit, 2),
+                "credit": round(total_credit, 2),
+                "net": round(total_credit - total_debit, 2),
+            },
+            "topMerchants": [
+                {"merchant": merchant, "count": count, "debit": round(amount, 2)}
+                for merchant, (count, amount) in top
+            ],
+            "fees": {
+                "count": len(fee_rows),
+                "total": round(math.fsum(self.amounts[i] for i in fee_rows), 2),
+                "rows": fee_rows,
+            },
+            "unsigned": {
+                "count": len(unsigned_rows),
+                "total": round(math.fsum(self.amounts[i] for i in unsigned_rows), 2),
+                "rows": unsigned_rows,
+            },
+        }
+
+    def _fee_rows(self, joined: str) -> List[int]:
+        """Row indices whose description matches the fee pattern, found in one scan of ``joined``."""
+        starts = [0, *accumulate(len(d) + 1 for d in self.descriptions)]
+        rows: Dict[int, None] = {}
+        for match in self._table.fees.finditer(joined):
+            rows[bisect_right(starts, match.start()) - 1] = None
+        return list(rows)
+
+
+def _parse_amount(value: str) -> float:
+    return float(value.replace(",", "")) if value else 0.0
+
+
+def _parse_column(values: Sequence[str]) -> Optional[List[float]]:
+    """Amounts of one column (0.0 for rows without one), or None when no row has one."""
+    if not any(values):
+        return None
+    if all(values):
+        return list(map(float, map(str.replace, values, repeat(","), repeat(""))))
+    return list(map(_parse_amount, values))
+
+
+def _marker_direction(kind: str) -> int:
+    return _UNSIGNED if not kind else _CREDIT if kind[0] in "Cc" else _DEBIT
+
+
+def _carry_balance(last: Optional[float], balance: Optional[float]) -> Optional[float]:
+    return last if balance is None else balance
+
+
+def _direction(
+    amount: float,
+    kind: Optional[str],
+    withdrawal: float,
+    deposit: float,
+    previous: Optional[float],
+    balance: Optional[float],
+) -> int:
+    """Whether a row is a debit or a credit, from the first column that says so; unsigned if none does."""
+    if withdrawal:
+        return _DEBIT
+    if deposit:
+        return _CREDIT
+    if kind:
+        return _marker_direction(kind)
+    if previous is not None and balance is not None and amount:
+        if abs(previous + amount - balance) < _BALANCE_TOLERANCE:
+            return _CREDIT
+        if abs(previous - amount - balance) < _BALANCE_TOLERANCE:
+            return _DEBIT
+    return _UNSIGNED
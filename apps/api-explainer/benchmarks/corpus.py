@@ -0,0 +1,56 @@
+"""Synthetic benchmark documents built from the template samples."""
+
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import yaml
+
+TEMPLATES_SRC_DIR = Path(__file__).parent.parent.parent.parent / "packages" / "templates"
+
+LINES_PER_PAGE = 40
+SCALES = (1, 10, 100)
+
+_MERCHANTS = ["SWIGGY", "AMAZON", "BIGBASKET", "IRCTC", "UBER", "ZOMATO", "FLIPKART", "MYNTRA"]
+_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def load_samples() -> Dict[str, str]:
+    """First sample of every YAML template, keyed by template id."""
+    samples = {}
+    for path in sorted(TEMPLATES_SRC_DIR.glob("*.yaml")):
+        with open(path, "r", encoding="utf-8") as f:
+            template = yaml.safe_load(f)
+        if template.get("samples"):
+            sample = template["samples"][0]
+            samples[template["id"]] = sample["text"] if isinstance(sample, dict) else sample
+    return samples
+
+
+def _filler_line(rng: random.Random) -> str:
+    """A statement-like row that matches no field pattern."""
+    day = rng.randint(1, 28)
+    month = rng.choice(_MONTHS)
+    merchant = rng.choice(_MERCHANTS)
+    amount = rng.randint(10, 99999) / 100
+    return f"{day:02d} {month} 2025  UPI/{rng.randint(100000, 999999)}/{merchant}  {amount:,.2f}  Dr"
+
+
+def build_document(sample: str, pages: int, seed: int = 0) -> str:
+    """Sample text on the first page, then ``pages`` pages of rows separated by form feeds."""
+    rng = random.Random(seed)
+    page_texts: List[str] = []
+    for page in range(pages):
+        rows = [_filler_line(rng) for _ in range(LINES_PER_PAGE)]
+        if page == 0:
+            rows = sample.splitlines() + rows[len(sample.splitlines()):]
+        page_texts.append("\n".join(rows))
+    return "\f".join(page_texts)
+
+
+def build_corpus(scales=SCALES) -> Dict[str, Dict[int, str]]:
+    """``{doc_type: {pages: text}}`` for every template sample and scale."""
+    return {
+        doc_type: {pages: build_document(sample, pages, seed=pages) for pages in scales}
+        for doc_type, sample in load_samples().items()
+    }
@@ -0,0 +1,232 @@
+"""Benchmark the explain pipeline stage by stage and compare against a stored baseline.
+
+Usage (from apps/api-explainer):
+
+    python -m benchmarks.run                    # print timings
+    python -m benchmarks.run --check            # exit 1 if any minimum time regressed
+    python -m benchmarks.run --update-baseline  # overwrite benchmarks/baseline.json
+
+``--check`` compares each benchmark's fastest sample: noise from other load
+only ever adds time, so the minimum moves far less between unchanged runs
+than the median does. Each run also times a fixed pure-Python workload and,
+when that ran slower than when the baseline was recorded, scales the baseline
+up by as much, so a slower machine is not reported as a regression. A faster
+run never tightens the gate: the workload's own timing is too noisy for that.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Keep the HTTP benchmark from being rate limited or served from Redis
+os.environ["RATE_LIMIT_RPM"] = str(10**9)
+os.environ["REDIS_URL"] = ""
+os.environ["L1_CACHE_SIZE"] = "0"
+
+from fastapi.testclient import TestClient
+
+from app.document import Document
+from app.extractors import ActionGenerator, DocumentClassifier, SummaryGenerator
+from app.main import app
+from app.pipeline import get_extractor
+
+from .corpus import SCALES, build_corpus
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+# Iterations even for the largest documents, so their minimum and median are not one lucky or unlucky sample
+MIN_ITERATIONS = 30
+_CALIBRATION_TEXT = "Amount Due: 2,500.00 Due Date: 15 Nov 2025\n" * 2000
+_CALIBRATION_PATTERN = re.compile(r"Due\s*:\s*(?P<value>[0-9,.]+)")
+
+
+def measure(fn: Callable[[int], object], iterations: int, warmup: int = 2) -> Dict[str, float]:
+    """Run ``fn(i)`` repeatedly and return min/p50/p99/max in milliseconds.
+
+    p99 is interpolated between the two slowest samples when there are fewer than 100.
+    """
+    for i in range(warmup):
+        fn(-1 - i)
+    samples: List[float] = []
+    # As in timeit: a collection landing in one sample would time the garbage of earlier ones
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(iterations):
+            start = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+    return {
+        "min_ms": round(min(samples), 4),
+        "p50_ms": round(statistics.median(samples), 4),
+        "p99_ms": round(statistics.quantiles(samples, n=100, method="inclusive")[98], 4),
+        "max_ms": round(max(samples), 4),
+        "n": len(samples),
+    }
+
+
+def calibrate(iterations: int = 51) -> float:
+    """Fastest milliseconds of a fixed workload like the pipeline's (regex scans, string and dict churn)."""
+
+    def workload(i: int) -> None:
+        counts: Dict[str, int] = {}
+        for match in _CALIBRATION_PATTERN.finditer(_CALIBRATION_TEXT):
+            value = match.group("value").replace(",", "")
+            counts[value] = counts.get(value, 0) + 1
+        _CALIBRATION_TEXT.lower().split("\n")
+
+    return measure(workload, iterations, warmup=5)["min_ms"]
+
+
+def environment() -> Dict[str, Any]:
+    """What the timings were measured on, recorded with the baseline."""
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(iterations: int, scales=SCALES) -> Dict[str, Dict[str, float]]:
+    extractor = get_extractor()
+    client = TestClient(app)
+    results: Dict[str, Dict[str, float]] = {}
+
+    for doc_type, documents in build_corpus(scales).items():
+        for pages, text in documents.items():
+            n = max(MIN_ITERATIONS, iterations // pages) if pages > 1 else iterations
+            # Stages after the normalization pre-pass share one Document, as in the pipeline
+            document = Document(text, pages)
+            extraction = extractor.extract(document, doc_type)["extractions"]
+            name = f"{doc_type}/p{pages}"
+
+            def normalize(i: int, text: str = text, pages: int = pages) -> None:
+                prepared = Document(text, pages)
+                _ = prepared.lower, prepared.lines.line_starts
+
+            results[f"normalize/{name}"] = measure(normalize, n)
+            def classify(i: int, document: Document = document) -> None:
+                DocumentClassifier.classify(document)
+
+            def extract(i: int, document: Document = document, doc_type: str = doc_type) -> None:
+                extractor.extract(document, doc_type)
+
+            def summarize(i: int, extraction: Dict[str, Any] = extraction, doc_type: str = doc_type) -> None:
+                SummaryGenerator.generate(extraction, doc_type)
+                ActionGenerator.generate(extraction, doc_type)
+
+            results[f"classify/{name}"] = measure(classify, n)
+            results[f"extract/{name}"] = measure(extract, n)
+            results[f"summarize/{name}"] = measure(summarize, n)
+
+            def post(i: int, text: str = text, doc_type: str = doc_type, pages: int = pages) -> None:
+                # A unique trailer per call keeps every request a cache miss
+                body = {
+                    "docText": f"{text}\nRef: {i}",
+                    "docMeta": {"typeHint": doc_type, "pages": pages},
+                    "locale": "en-IN",
+                    "deviceId": "benchmark",
+                }
+                response = client.post("/explain", json=body)
+                response.raise_for_status()
+
+            results[f"explain/{name}"] = measure(post, n)
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    min_delta_ms: float,
+    scale: float = 1.0,
+) -> List[str]:
+    """Benchmarks whose minimum exceeds the baseline's by more than ``tolerance`` and ``min_delta_ms``.
+
+    Baseline timings are multiplied by ``scale``, the machine's current speed relative to the baseline's.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or "min_ms" not in previous:
+            continue
+        expected = previous["min_ms"] * scale
+        delta = current["min_ms"] - expected
+        if delta > min_delta_ms and current["min_ms"] > expected * (1 + tolerance):
+            regressions.append(
+                f"{name}: min {current['min_ms']:.3f}ms vs baseline {expected:.3f}ms "
+                f"({previous['min_ms']:.3f}ms x{scale:.2f})"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100, help="iterations for 1-page documents")
+    parser.add_argument("--check", action="store_true", help="fail if a minimum time regressed beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="allowed slowdown of the minimum (1.0 = +100%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.25, help="ignore slowdowns smaller than this")
+    parser.add_argument("--update-baseline", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    args = parser.parse_args(argv)
+
+    calibration_ms = calibrate()
+    results = run(args.iterations)
+    # Calibrating on both sides of the run and keeping the faster discards load that came and went
+    calibration_ms = round(min(calibration_ms, calibrate()), 4)
+    width = max(len(name) for name in results)
+    for name, stats in sorted(results.items()):
+        print(
+            f"{name:<{width}}  min {stats['min_ms']:10.3f}ms  p50 {stats['p50_ms']:10.3f}ms"
+            f"  p99 {stats['p99_ms']:10.3f}ms  max {stats['max_ms']:10.3f}ms  n={stats['n']}"
+        )
+    print(f"Calibration workload: {calibration_ms:.3f}ms")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(
+                {"environment": environment(), "calibration_ms": calibration_ms, "results": results},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print("No baseline to compare against; run with --update-baseline first")
+            return 1
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        # Baselines recorded without a calibration are compared as is
+        scale = max(1.0, calibration_ms / baseline["calibration_ms"]) if baseline.get("calibration_ms") else 1.0
+        print(f"Machine speed vs baseline: x{scale:.2f} ({baseline.get('environment', {}).get('cpu', 'unknown CPU')})")
+        regressions = compare(results, baseline["results"], args.tolerance, args.min_delta_ms, scale)
+        if regressions:
+            print(f"{len(regressions)} regression(s):")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
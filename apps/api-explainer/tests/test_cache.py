@@ -0,0 +1,118 @@
+"""Unit tests for the cache and rate-limit layer."""
+
+import asyncio
+import json
+
+import pytest
+
+from app import cache
+from app.cache import LRUCache
+from app.codec import CacheCodec, codec_for_name, decode_value, encode_value
+from app.coalesce import coalesce
+from app.ratelimit import LocalRateLimiter, rate_limit_check
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2, ttl_seconds=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_redis_hits_keep_no_longer_in_l1_than_in_redis(monkeypatch):
+    lru = LRUCache(maxsize=4, ttl_seconds=300)
+    monkeypatch.setattr(cache, "_l1", lru)
+    cache._l1_set_remaining("persistent", {}, -1)
+    cache._l1_set_remaining("until-midnight", {}, 1500)
+    cache._l1_set_remaining("expired", {}, -2)
+    expiries = {key: expires_at - cache.time.monotonic() for key, (expires_at, _) in lru._entries.items()}
+    assert set(expiries) == {"persistent", "until-midnight"}
+    assert 299 < expiries["persistent"] <= 300 and expiries["until-midnight"] <= 1.5
+
+
+def test_lru_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(maxsize=4, ttl_seconds=10)
+    lru.set("a", 1)
+    now[0] += 11
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_cache_get_counts_l1_hits_and_misses():
+    before = cache.cache_stats()["l1"]
+    asyncio.run(cache.cache_set("explain:test-l1", {"summary": "x"}))
+    assert asyncio.run(cache.cache_get("explain:test-l1")) == {"summary": "x"}
+    assert asyncio.run(cache.cache_get("explain:test-l1-missing")) is None
+    after = cache.cache_stats()["l1"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"] + 1
+
+
+def test_codec_compresses_large_values_and_reads_legacy_json():
+    value = {"summary": "Pay by 5 Dec", "citations": [{"field": "totalDue", "page": 1}] * 50}
+    encoded = encode_value(value)
+    assert encoded[0] == 2 and len(encoded) < len(json.dumps(value))
+    assert decode_value(encoded) == value
+    small = encode_value({"summary": "x"})
+    assert small[0] == 1 and decode_value(small) == {"summary": "x"}
+    # Entries written before the format byte, and formats this reader does not know
+    assert decode_value(json.dumps(value).encode("utf-8")) == value
+    assert decode_value(b"\x7fpayload") is None
+
+
+def test_unknown_codec_names_fail_with_the_known_ones():
+    assert codec_for_name("zlib").format == 2
+    with pytest.raises(ValueError, match="Unknown CACHE_CODEC 'brotli'; expected one of: plain, zlib"):
+        codec_for_name("brotli")
+    with pytest.raises(TypeError):
+        CacheCodec()
+
+
+def test_coalesce_computes_concurrent_duplicates_once():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"summary": "shared"}
+
+    async def run():
+        return await asyncio.gather(*(coalesce("explain:test-coalesce", compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"summary": "shared"}] * 5
+    assert len(calls) == 1
+
+
+def test_local_rate_limiter_slides_across_window_boundary():
+    limiter = LocalRateLimiter()
+    assert all(limiter.hit("dev", 100, 50.0, 10, 1)[0] for _ in range(10))
+    assert not limiter.hit("dev", 100, 59.0, 10, 1)[0]
+    # Half of the previous window still counts: 10 * 0.5 = 5 slots left
+    allowed = [limiter.hit("dev", 101, 30.0, 10, 1)[0] for _ in range(6)]
+    assert allowed == [True] * 5 + [False]
+    # Two windows later the old counts are gone
+    assert limiter.hit("dev", 103, 0.0, 10, 10)[0]
+
+
+def test_local_rate_limiter_takes_what_fits_of_a_partial_cost():
+    limiter = LocalRateLimiter()
+    assert limiter.take("dev", 100, 0.0, 10, 4) == (4, 4, 0)
+    assert limiter.take("dev", 100, 0.0, 10, 8) == (6, 10, 0)
+    assert limiter.take("dev", 100, 0.0, 10, 1) == (0, 10, 0)
+    assert limiter.take("other", 100, 0.0, 10, 11, partial=False) == (0, 0, 0)
+
+
+def test_rate_limit_check_limits_without_redis():
+    async def run():
+        return [await rate_limit_check("local-limit-device", limit=3) for _ in range(4)]
+
+    results = asyncio.run(run())
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[2].headers()["X-RateLimit-Remaining"] == "0"
+    assert int(results[3].headers()["Retry-After"]) >= 1
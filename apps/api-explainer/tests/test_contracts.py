@@ -106,6 +106,21 @@ def test_explain_response_contract(client):
     assert "citations" in data
 
 
+def test_explain_redacts_pii(client):
+    """PII in extracted values is masked before it reaches the response or the cache."""
+    response = client.post("/explain", json={
+        "docText": "Airtel Phone Bill\nMobile No: 9876543210\nTotal Due: ₹599\nDue Date: 20 Nov 2025",
+        "docMeta": {"typeHint": "phone-bill"},
+        "locale": "en-IN",
+        "deviceId": "redact-device"
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert not validate_against_schema(data, load_schema("explain.response"))
+    assert data["extractions"]["phoneNumber"] == "XXXXXX3210"
+    assert data["redactions"] == {"phone": 1}
+    assert "9876543210" not in response.text
+
 def test_explain_rate_limit(client):
     """Test rate limiting (if Redis is not configured, should pass)."""
     request_data = {
@@ -150,3 +165,296 @@ def test_explain_caching(client):
     # Responses should be identical (cached)
     assert data1 == data2
 
+
+def test_explain_caches_date_relative_red_flags_only_until_tomorrow(client, monkeypatch):
+    """Responses whose flags count days since a date are not served from cache on a later day."""
+    from app import cache
+    from app.routers import explain
+
+    monkeypatch.setattr(explain, "seconds_until_tomorrow", lambda: 5)
+    docs = {
+        "insurance-claim": "Claim No: CLM-TTL-1\nStatus: Pending\nSubmitted: 01 Oct 2025",
+        "rent-agreement": "Rental Agreement TTL\nMonthly Rent: ₹15,000\nSecurity Deposit: ₹60,000",
+    }
+    for doc_type, text in docs.items():
+        response = client.post("/explain", json={
+            "docText": text, "docMeta": {"typeHint": doc_type}, "locale": "en-IN", "deviceId": "ttl-device"
+        })
+        assert response.status_code == 200
+        expires_at, _ = cache._l1._entries[explain._cache_key(text, doc_type, None, "en-IN")]
+        remaining = expires_at - cache.time.monotonic()
+        assert remaining <= 5 if doc_type == "insurance-claim" else remaining > 5
+
+
+def test_explain_sheds_load_when_executor_saturated(client, monkeypatch):
+    """A full extraction queue answers 503 with Retry-After instead of queueing."""
+    from app import executor
+
+    monkeypatch.setattr(executor, "_in_flight", executor.settings.extract_workers + executor.settings.explain_queue_size)
+    response = client.post("/explain", json={
+        "docText": "uncached document while saturated",
+        "docMeta": {},
+        "locale": "en-IN",
+        "deviceId": "saturated-device"
+    })
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+
+def test_explain_replaces_a_broken_process_pool(monkeypatch):
+    """After a worker dies, the next document runs on a new pool instead of failing too."""
+    import asyncio
+    import time
+    from concurrent.futures.process import BrokenProcessPool
+
+    from app import executor
+    from app.document import Document
+    from app.metrics import StageTimer
+
+    monkeypatch.setattr(executor.settings, "explain_executor", "process")
+    monkeypatch.setattr(executor.settings, "extract_workers", 1)
+    executor.shutdown_process_pool()
+    document = Document("Electricity Bill\nAmount Due: ₹2,500.00")
+    try:
+        broken = executor.get_process_pool()
+        asyncio.run(executor.run_explain(document, "electricity-bill", None, "en-IN", StageTimer()))
+        for process in list(broken._processes.values()):
+            process.kill()
+        deadline = time.monotonic() + 10
+        while not broken._broken and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with pytest.raises(BrokenProcessPool):
+            asyncio.run(executor.run_explain(document, "electricity-bill", None, "en-IN", StageTimer()))
+        response = asyncio.run(executor.run_explain(document, "electricity-bill", None, "en-IN", StageTimer()))
+        assert response["docType"] == "electricity-bill"
+        assert executor.get_process_pool() is not broken
+    finally:
+        executor.shutdown_process_pool()
+
+
+def test_explain_batch_contract(client):
+    """Test /explain/batch returns per-item results in request order."""
+    statement = "HDFC Credit Card Statement\nTotal Due: ₹4,250\nDue Date: 15 Nov 2025"
+    bill = "Electricity Bill\nConsumer No: BRPL123456\nAmount Due: ₹2,500.00\nUnits: 450 kWh"
+    items = [
+        {"docText": text, "docMeta": {}, "locale": "en-IN", "deviceId": "batch-test-device"}
+        for text in (statement, bill, statement, "   ")
+    ]
+    
+    response = client.post("/explain/batch", json={"items": items})
+    assert response.status_code == 200
+    
+    results = response.json()["results"]
+    assert len(results) == 4
+    schema = load_schema("explain.response")
+    for item in results[:3]:
+        assert item["ok"]
+        errors = validate_against_schema(item["result"], schema)
+        assert not errors, f"Schema validation errors: {errors}"
+    assert results[0]["result"]["docType"] == "credit-card-statement"
+    assert results[1]["result"]["docType"] == "electricity-bill"
+    assert results[2] == results[0]
+    assert results[3] == {"ok": False, "error": {"status": 400, "detail": "Document text is required"}}
+    
+    # Empty batches are rejected
+    assert client.post("/explain/batch", json={"items": []}).status_code == 422
+
+
+def test_explain_batch_keys_items_by_their_options(client):
+    """Identical texts with different type hints are explained separately."""
+    text = "Amount Due: ₹2,500.00\nDue Date: 15 Nov 2025"
+    items = [
+        {"docText": text, "docMeta": {"typeHint": doc_type}, "locale": "en-IN", "deviceId": "batch-hint-device"}
+        for doc_type in ("electricity-bill", "credit-card-statement", "electricity-bill")
+    ]
+    results = client.post("/explain/batch", json={"items": items}).json()["results"]
+    assert [item["result"]["docType"] for item in results] == [
+        "electricity-bill", "credit-card-statement", "electricity-bill"
+    ]
+
+
+def test_explain_batch_admits_items_up_to_the_remaining_quota(client, monkeypatch):
+    """Each item costs one request; only the items past the device's quota are refused."""
+    from app.ratelimit import settings as ratelimit_settings
+
+    monkeypatch.setattr(ratelimit_settings, "rate_limit_rpm", 3)
+    too_many = {"ok": False, "error": {"status": 429, "detail": "Too many requests"}}
+
+    def batch(count: int, offset: int) -> list:
+        items = [
+            {"docText": f"Amount Due: ₹{offset + n}", "docMeta": {}, "locale": "en-IN", "deviceId": "batch-cost-device"}
+            for n in range(count)
+        ]
+        return client.post("/explain/batch", json={"items": items}).json()["results"]
+
+    first = batch(2, 0)
+    assert all(item["ok"] for item in first)
+    second = batch(3, 10)
+    assert second[0]["ok"] and second[1:] == [too_many] * 2
+    assert batch(2, 20) == [too_many] * 2
+
+def test_explain_answers_503_when_its_worker_died(client, monkeypatch):
+    """A dead worker process fails the document with a retryable 503, not a bare 500."""
+    from concurrent.futures.process import BrokenProcessPool
+
+    from app import executor
+
+    class BrokenPool:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("A worker process terminated abruptly")
+
+    discarded = []
+    monkeypatch.setattr(executor.settings, "explain_executor", "process")
+    monkeypatch.setattr(executor, "get_process_pool", lambda: BrokenPool())
+    monkeypatch.setattr(executor, "_discard_process_pool", discarded.append)
+    response = client.post("/explain", json={
+        "docText": "uncached document on a dead worker",
+        "docMeta": {},
+        "locale": "en-IN",
+        "deviceId": "broken-pool-device"
+    })
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Worker restarting"
+    assert response.headers["Retry-After"] == "1"
+    assert len(discarded) == 1
+    assert executor._in_flight == 0
+
+
+def test_explain_batch_reports_per_item_executor_failures(client, monkeypatch):
+    """A saturated executor or a dead worker fails the affected items, not the batch."""
+    from concurrent.futures.process import BrokenProcessPool
+
+    from app import executor
+
+    class BrokenPool:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("A worker process terminated abruptly")
+
+    items = [
+        {"docText": f"Broken pool document {n}", "docMeta": {}, "locale": "en-IN", "deviceId": "batch-failure-device"}
+        for n in range(2)
+    ]
+    monkeypatch.setattr(executor.settings, "explain_executor", "process")
+    monkeypatch.setattr(executor, "get_process_pool", lambda: BrokenPool())
+    response = client.post("/explain/batch", json={"items": items})
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"ok": False, "error": {"status": 503, "detail": "Worker restarting"}}
+    ] * 2
+    assert executor._in_flight == 0
+
+    monkeypatch.setattr(executor, "_in_flight", executor.settings.extract_workers + executor.settings.explain_queue_size)
+    assert client.post("/explain/batch", json={"items": items}).json()["results"] == [
+        {"ok": False, "error": {"status": 503, "detail": "Server busy"}}
+    ] * 2
+
+
+def test_explain_stream_contract(client):
+    """Test /explain/stream emits NDJSON events ending in a full explain response."""
+    lines = [
+        {"docMeta": {"typeHint": "credit-card-statement"}, "locale": "en-IN", "deviceId": "stream-test-device"},
+        {"text": "HDFC Credit Card Statement\nTotal Due: ₹4,250"},
+        {"text": "Transactions\nDue Date: 15 Nov 2025"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+    
+    response = client.post("/explain/stream", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0] == {"event": "docType", "docType": "credit-card-statement"}
+    extracted = {e["field"]: e for e in events if e["event"] == "extraction"}
+    assert extracted["totalDue"]["value"] == 4250.0
+    assert extracted["dueDate"]["citation"]["page"] == 2
+    
+    result = events[-1]
+    assert result.pop("event") == "result"
+    errors = validate_against_schema(result, load_schema("explain.response"))
+    assert not errors, f"Schema validation errors: {errors}"
+    assert result["extractions"]["dueDate"] == "15 Nov 2025"
+    
+    # Header line is validated like /explain
+    bad = json.dumps({"docMeta": {}, "locale": "invalid", "deviceId": "abc"})
+    assert client.post("/explain/stream", content=bad).status_code == 422
+
+
+def test_explain_stream_rejects_overlong_lines(client, monkeypatch):
+    """Lines are split however the body is chunked, and one past STREAM_MAX_LINE_BYTES is refused."""
+    from app.routers.explain import settings as explain_settings
+
+    monkeypatch.setattr(explain_settings, "stream_max_line_bytes", 200)
+    header = json.dumps({"docMeta": {"typeHint": "electricity-bill"}, "locale": "en-IN", "deviceId": "stream-long"})
+    page = json.dumps({"text": "Amount Due: ₹2,500.00"})
+
+    def chunked(body: str):
+        data = body.encode("utf-8")
+        for i in range(0, len(data), 7):
+            yield data[i:i + 7]
+
+    events = [json.loads(line) for line in client.post(
+        "/explain/stream", content=chunked(f"{header}\n\n{page}\n")
+    ).text.splitlines()]
+    assert events[-1]["event"] == "result"
+    assert events[-1]["extractions"]["billAmount"] == 2500.0
+
+    long_page = json.dumps({"text": "x" * 300})
+    events = [json.loads(line) for line in client.post(
+        "/explain/stream", content=chunked(f"{header}\n{page}\n{long_page}\n{page}")
+    ).text.splitlines()]
+    assert events[-1] == {"event": "error", "status": 413, "detail": "Line exceeds 200 bytes"}
+    assert client.post("/explain/stream", content=chunked(" " * 100 + "x" * 300)).status_code == 413
+
+
+def test_templates_contract(client):
+    """Test /templates matches schema and supports conditional requests."""
+    response = client.get("/templates")
+    assert response.status_code == 200
+    
+    data = response.json()
+    errors = validate_against_schema(data, load_schema("templates.index"))
+    assert not errors, f"Schema validation errors: {errors}"
+    assert any(t["id"] == "credit-card-statement" for t in data["docTypes"])
+    
+    etag = response.headers["etag"]
+    cached = client.get("/templates", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+
+def test_metrics_contract(client):
+    """Test /explain reports stage timings and /metrics exposes them."""
+    response = client.post("/explain", json={
+        "docText": "HDFC Credit Card Statement\nTotal Due: ₹1,990\nDue Date: 02 Dec 2025",
+        "docMeta": {"typeHint": "credit-card-statement"},
+        "locale": "en-IN",
+        "deviceId": "metrics-device"
+    })
+    assert response.status_code == 200
+    stages = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    assert stages[:3] == ["rate_limit", "normalize", "cache_get"]
+    assert "extract" in stages and stages[-1] == "total"
+    
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    body = metrics.text
+    assert 'explain_stage_seconds_count{stage="classify"}' in body
+    assert 'explain_field_seconds_bucket{doc_type="credit-card-statement",field="totalDue",le="+Inf"}' in body
+    assert 'explain_cache_hit_ratio{tier="l1"}' in body
+    assert 'http_request_duration_seconds_count{route="/explain",status="200"}' in body
+
+
+def test_warm_start_reports_startup_steps(monkeypatch):
+    """Test the lifespan warm-up loads templates and starts the workers before serving."""
+    from app import executor
+    monkeypatch.setattr(executor.settings, "explain_executor", "process")
+    monkeypatch.setattr(executor.settings, "extract_workers", 1)
+    with TestClient(app) as client:
+        assert executor._pool is not None
+        body = client.get("/metrics").text
+        for step in ("import", "templates", "workers"):
+            assert f'explain_startup_seconds{{step="{step}"}}' in body
+    assert executor._pool is None
+
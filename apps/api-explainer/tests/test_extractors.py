@@ -0,0 +1,492 @@
+"""Unit tests for the template registry and extraction engine."""
+
+import io
+import json
+import os
+import re
+from collections import Counter
+from datetime import date
+
+import pytest
+
+from app.bulk import read_directory, read_jsonl, run_bulk
+from app.chunks import DocumentChunks, split_chunks
+from app.document import Document, LineIndex, normalize_text
+from app.extractors import DocumentClassifier, TemplateExtractor
+from app import extractors
+from app.matching import KeywordMatcher, bounded_search
+from app.redact import redact_text
+from app.registry import (
+    BUNDLE_NAME,
+    TEMPLATES_DIR,
+    TemplateError,
+    TemplateRegistry,
+    load_templates,
+    normalize_pattern,
+)
+
+
+def write_template(tmp_path, template: dict) -> None:
+    with open(tmp_path / f"{template['id']}.json", "w", encoding="utf-8") as f:
+        json.dump(template, f)
+
+
+def test_normalize_pattern_collapses_escaping():
+    assert normalize_pattern("Total\\\\\\s*Due") == "Total\\s*Due"
+    assert normalize_pattern("Total\\\\s*Due") == "Total\\s*Due"
+    assert normalize_pattern("Total\\s*Due") == "Total\\s*Due"
+
+
+def test_registry_is_compiled_once_and_read_only():
+    templates = load_templates()
+    template = templates["credit-card-statement"]
+    assert all(hasattr(p, "search") for f in template.fields for p in f.patterns)
+    with pytest.raises(TypeError):
+        templates["credit-card-statement"] = template
+
+
+def test_invalid_pattern_fails_at_load(tmp_path):
+    write_template(tmp_path, {
+        "id": "broken",
+        "version": "1.0.0",
+        "fields": {"amount": {"patterns": ["Amount: (?P<value>[0-9"]}},
+    })
+    with pytest.raises(TemplateError, match="broken"):
+        load_templates(tmp_path)
+
+
+def test_pattern_without_value_group_fails_at_load(tmp_path):
+    write_template(tmp_path, {
+        "id": "nogroup",
+        "version": "1.0.0",
+        "fields": {"amount": {"patterns": ["Amount: ([0-9]+)"]}},
+    })
+    with pytest.raises(TemplateError, match="value"):
+        load_templates(tmp_path)
+
+
+def test_extract_credit_card_sample():
+    extractor = TemplateExtractor()
+    result = extractor.extract("Total Due: ₹4,250\nDue Date: 15 Nov 2025\nIssuer: HDFC", "credit-card-statement")
+    assert result["extractions"]["totalDue"] == 4250.0
+    assert result["extractions"]["dueDate"] == "15 Nov 2025"
+    assert {c["field"] for c in result["citations"]} == {"totalDue", "dueDate", "issuer"}
+
+
+def test_section_fields_prefer_their_window_and_fall_back_to_full_text():
+    extractor = TemplateExtractor()
+    rows = "\n".join(f"0{i} Oct 2025  NEFT  Closing Balance 9{i}.00" for i in range(1, 6))
+    text = (
+        "Account No: XXXX1234\nPeriod: 01 Oct 2025 to 31 Oct 2025\n"
+        f"{rows}\nAccount Summary\nClosing Balance: ₹12,345.67"
+    )
+    result = extractor.extract(text, "bank-statement")
+    assert result["extractions"]["closingBalance"] == 12345.67
+    assert result["extractions"]["accountNumber"] == "XXXX1234"
+    
+    without_anchor = extractor.extract("Closing Balance: ₹500", "bank-statement")
+    assert without_anchor["extractions"]["closingBalance"] == 500.0
+
+
+def test_field_with_undeclared_section_fails_at_load(tmp_path):
+    write_template(tmp_path, {
+        "id": "nosection",
+        "version": "1.0.0",
+        "fields": {"amount": {"section": "summary", "patterns": ["Amount: (?P<value>[0-9]+)"]}},
+    })
+    with pytest.raises(TemplateError, match="summary"):
+        load_templates(tmp_path)
+
+
+def test_transactions_are_extracted_column_wise_with_aggregates():
+    text = "\n".join([
+        "Account No: XXXX1234",
+        "05 Oct 2025  UPI/123456/SWIGGY  1,234.56  Dr",
+        "06 Oct 2025  NEFT/SALARY ACME CORP  50,000.00  Cr",
+        "08 Oct 2025  ANNUAL FEE  499.00  Dr",
+        "09 Oct 2025  CAFE COFFEE DAY  89.82  Dr",
+        "10 Oct 2025  UPI/99/SWIGGY  300.00  Dr",
+        "Closing Balance: ₹12,345.67",
+    ])
+    transactions = TemplateExtractor().extract(text, "bank-statement")["transactions"]
+    assert transactions["count"] == 5
+    assert transactions["columns"]["debit"] == [1234.56, 0.0, 499.0, 89.82, 300.0]
+    assert transactions["columns"]["credit"] == [0.0, 50000.0, 0.0, 0.0, 0.0]
+    assert transactions["totals"] == {"debit": 2123.38, "credit": 50000.0, "net": 47876.62}
+    assert transactions["topMerchants"][0] == {"merchant": "SWIGGY", "count": 2, "debit": 1534.56}
+    assert transactions["fees"] == {"count": 1, "total": 499.0, "rows": [2]}
+    
+    stream = TemplateExtractor().stream("bank-statement")
+    for page in text.split("\n09 Oct"):
+        stream.feed(page if page.startswith("Account") else "09 Oct" + page)
+    stream.finish()
+    assert stream.result()["transactions"] == transactions
+
+
+def test_transaction_directions_come_from_balance_columns_not_guesses():
+    text = "\n".join([
+        "Account No: XXXX1234",
+        "01 Oct 2025  NEFT/RENT REFUND  2,000.00 Cr  10,000.00",
+        "05 Oct 2025  UPI/123456/SWIGGY  1,234.56  8,765.44",
+        "06 Oct 2025  NEFT/SALARY ACME CORP  50,000.00  58,765.44",
+        "07 Oct 2025  INTEREST CREDITED  120.00  58,885.44",
+        "08 Oct 2025  DEBIT CARD ANNUAL FEE  500.00  58,385.44",
+        "09 Oct 2025  ANNUAL FEE REVERSAL  500.00 Cr  58,885.44",
+        "10 Oct 2025  ATM WDL  2,000.00  0.00  56,885.44",
+        "11 Oct 2025  CHQ DEPOSIT  1,000.00",
+    ])
+    transactions = TemplateExtractor().extract(text, "bank-statement")["transactions"]
+    columns = transactions["columns"]
+    assert columns["description"][1] == "UPI/123456/SWIGGY"
+    assert columns["debit"] == [0.0, 1234.56, 0.0, 0.0, 500.0, 0.0, 2000.0, 0.0]
+    assert columns["credit"] == [2000.0, 0.0, 50000.0, 120.0, 0.0, 500.0, 0.0, 0.0]
+    assert columns["balance"] == [10000.0, 8765.44, 58765.44, 58885.44, 58385.44, 58885.44, 56885.44, None]
+    assert transactions["totals"] == {"debit": 3734.56, "credit": 52620.0, "net": 48885.44}
+    # Only charged fees count; a row with no marker and no balance is left unsigned
+    assert transactions["fees"] == {"count": 1, "total": 500.0, "rows": [4]}
+    assert transactions["unsigned"] == {"count": 1, "total": 1000.0, "rows": [7]}
+
+
+def test_transaction_rows_end_at_page_breaks():
+    rows = [
+        "01 Oct 2025  NEFT/RENT REFUND  2,000.00 Cr  10,000.00",
+        "05 Oct 2025  UPI/123456/SWIGGY  1,234.56  8,765.44",
+        "06 Oct 2025  CHQ DEPOSIT  1,000.00",
+        "07 Oct 2025  ATM WDL  2,000.00  6,765.44",
+    ]
+    one_page = TemplateExtractor().extract("\n".join(rows), "bank-statement")["transactions"]
+    pages = TemplateExtractor().extract("\f".join(rows), "bank-statement")["transactions"]
+    assert pages == one_page
+    assert pages["count"] == 4
+    # The balance-less row leaves the last balance shown for the next row to reconcile against
+    assert pages["columns"]["debit"] == [0.0, 1234.56, 0.0, 2000.0]
+    assert pages["unsigned"]["rows"] == [2]
+
+    cards = ["05 Oct 2025  AMAZON PAY  1,499.00 Dr", "06 Oct 2025  REFUND AMAZON  499.00 Cr"]
+    card_pages = TemplateExtractor().extract("\f".join(cards), "credit-card-statement")["transactions"]
+    assert card_pages["columns"]["description"] == ["AMAZON PAY", "REFUND AMAZON"]
+    assert card_pages["totals"] == {"debit": 1499.0, "credit": 499.0, "net": -1000.0}
+
+
+def test_extract_unknown_doc_type_returns_empty_result():
+    result = TemplateExtractor().extract("anything", "generic")
+    assert result == {"extractions": {}, "citations": [], "confidence": 0.0}
+
+
+def test_bounded_search_matches_full_search_across_window_edges():
+    pattern = re.compile(r"Total Due: (?P<value>[0-9,]+)")
+    for offset in range(90, 130):
+        text = "x" * offset + "Total Due: 1,234,567\n" + "y" * 300
+        windowed = bounded_search(pattern, text, window=128)
+        assert windowed.span() == pattern.search(text).span()
+    assert bounded_search(pattern, "z" * 1000, window=128) is None
+
+
+def test_bounded_search_keeps_optional_tails_cut_by_the_window_edge():
+    pattern = re.compile(r"Amount Due: (?P<value>[0-9,]+(?:\.[0-9]{2})?)")
+    extractor = TemplateExtractor()
+    # The 4096-character window edge falls inside the value, e.g. right after "2,500."
+    for offset in range(4070, 4086):
+        text = "x" * offset + "Amount Due: 2,500.45\n" + "y" * 300
+        assert bounded_search(pattern, text, window=4096).group("value") == "2,500.45"
+        assert extractor.extract(text, "electricity-bill")["extractions"]["billAmount"] == 2500.45
+
+
+def test_extract_reports_timed_out_fields(monkeypatch):
+    monkeypatch.setattr(extractors, "_regex_deadline", lambda: 0.0)
+    result = TemplateExtractor().extract("Total Due: ₹4,250", "credit-card-statement")
+    assert result["extractions"] == {}
+    assert result["timedOutFields"] == ["issuer", "totalDue", "dueDate", "transactions"]
+
+
+def test_red_flags_are_raised_by_compiled_rules():
+    extractor = TemplateExtractor()
+    result = extractor.extract(
+        "Monthly Rent: ₹15,000\nSecurity Deposit: ₹60,000", "rent-agreement"
+    )
+    assert result["redFlags"] == [{"id": "security_deposit_high", "message": "Security deposit > 3x monthly rent"}]
+    assert "redFlags" not in extractor.extract("Monthly Rent: ₹15,000\nSecurity Deposit: ₹30,000", "rent-agreement")
+    assert extractor.extract("Amount Due: ₹2,500\nLate Fee: ₹50", "electricity-bill")["redFlags"][0]["id"] == \
+        "late_fee_charged"
+
+    claim = extractor._templates["insurance-claim"].red_flags
+    pending = {"status": "Pending", "submittedDate": "01 Oct 2025"}
+    assert [f["id"] for f in claim.evaluate(pending, today=date(2025, 11, 15))] == ["claim_pending_long"]
+    assert claim.evaluate(pending, today=date(2025, 10, 20)) == []
+    assert claim.evaluate({**pending, "status": "Approved"}, today=date(2025, 11, 15)) == []
+    assert claim.date_relative
+    assert not extractor._templates["rent-agreement"].red_flags.date_relative
+
+
+def test_issuer_overrides_are_tried_before_generic_patterns():
+    extractor = TemplateExtractor()
+    text = "HDFC Bank Credit Card\nTotal Amount Due: Rs. 12,345.50\nPayment Due Date: 05 Dec 2025"
+    sources = {}
+    result = extractor.extract(text, "credit-card-statement", field_sources=sources)
+    assert result["issuer"] == "HDFC"
+    assert result["extractions"] == {"totalDue": 12345.5, "dueDate": "05 Dec 2025"}
+    assert sources == {"issuer": "missed", "totalDue": "issuer", "dueDate": "issuer"}
+
+    sources = {}
+    result = extractor.extract("Total Due: ₹4,250\nDue Date: 15 Nov 2025", "credit-card-statement", field_sources=sources)
+    assert "issuer" not in result
+    assert sources["totalDue"] == "generic"
+
+
+def test_rule_with_unknown_condition_fails_at_load(tmp_path):
+    write_template(tmp_path, {
+        "id": "bad-rule",
+        "fields": {"total": {"patterns": ["Total: (?P<value>\\d+)"]}},
+        "red_flags": [{"id": "odd", "message": "Odd", "when": [{"sometimes": ["total"]}]}],
+    })
+    with pytest.raises(TemplateError, match="bad-rule"):
+        load_templates(tmp_path)
+
+
+def test_keyword_matcher_finds_overlapping_and_shared_prefix_keywords():
+    matcher = KeywordMatcher({"a": ["hdfc", "lic"], "b": ["hdfc\\s*life", "insurance\\s*policy"]})
+    assert matcher.scores("hdfc life insurance policy") == {"a": 2, "b": 2}
+    assert matcher.scores("nothing here") == {}
+    assert matcher.may_occur("hdfc life") and not matcher.may_occur("nothing here")
+    assert KeywordMatcher({"a": ["(?:x|y)z"]}).may_occur("nothing here")
+
+
+def test_classifier_scores_match_per_keyword_search():
+    texts = [
+        "HDFC Credit Card Statement\nTotal Due: ₹4,250\nMinimum Payment: ₹200",
+        "HDFC Life Insurance Policy\nPremium: ₹12,000\nSum Assured: ₹10,00,000",
+        "Bank Statement\nAccount Number: XXXX1234\nClosing Balance: ₹12,345.67",
+        "Service charges for mobile data used",
+    ]
+    for text in texts:
+        expected = {}
+        for doc_type, patterns in DocumentClassifier.KEYWORD_PATTERNS.items():
+            score = sum(1 for p in patterns if re.search(p, text.lower()))
+            if score:
+                expected[doc_type] = score
+        assert DocumentClassifier.score(text) == expected
+    assert DocumentClassifier.classify(texts[0]) == "credit-card-statement"
+    assert DocumentClassifier.classify("") == "generic"
+
+
+def test_redact_text_masks_each_pii_kind_in_one_pass():
+    text = (
+        "Call +91 98765 43210, PAN ABCDE1234F, Aadhaar 2345 6789 0123, card 4111-1111-1111-1111, "
+        "A/c 123456789012 paid 1234567890.00 on 2025-11-15 via UPI/123456"
+    )
+    counts = Counter()
+    redacted = redact_text(text, counts)
+    assert redacted == (
+        "Call +XX XXXXX X3210, PAN XXXXXX234F, Aadhaar XXXX XXXX 0123, card XXXX-XXXX-XXXX-1111, "
+        "A/c XXXXXXXX9012 paid 1234567890.00 on 2025-11-15 via UPI/123456"
+    )
+    assert len(redacted) == len(text)
+    assert counts == {"phone": 1, "pan": 1, "aadhaar": 1, "card": 1, "account": 1}
+
+def test_line_index_locates_lines_and_pages():
+    text = "a\nb\nc\fd\ne"
+    index = LineIndex(text)
+    assert index.line(0) == 1
+    assert index.line(text.index("c")) == 3
+    assert index.locate(text.index("e")) == (2, 2)
+
+    estimated = LineIndex("\n".join(str(i) for i in range(10)), pages=2)
+    assert estimated.locate(0) == (1, 1)
+    assert estimated.locate(18) == (2, 5)
+
+
+def test_normalize_text_folds_characters_one_for_one():
+    raw = "Total\u00a0Due:\t₹４,2O0\r\nDue Date: १५ Nov 2O25 \u2013 Bill for Ollie"
+    normalized = normalize_text(raw)
+    assert normalized == "Total Due: ₹4,200 \nDue Date: 15 Nov 2025 - Bill for Ollie"
+    assert len(normalized) == len(raw)
+    assert normalize_text(normalized) == normalized
+    
+    document = Document(raw)
+    assert document.lower is document.lower
+    result = TemplateExtractor().extract(document, "credit-card-statement")
+    assert result["extractions"]["totalDue"] == 4200.0
+    start, end = result["citations"][0]["span"]
+    assert raw[start:end] == "４,2O0"
+
+
+def test_normalize_text_leaves_letters_after_numbers_alone():
+    for text in ("Water: 5l", "Tank 10l", "Reply 2o", "Pay 4,25O"):
+        assert normalize_text(text) == text
+    assert normalize_text("2O25 1I0 1,2O0.00 3.l4") == "2025 110 1,200.00 3.14"
+
+
+def test_document_lower_keeps_offsets_of_the_text():
+    document = Document("İSTANBUL Total Due: 4,250")
+    assert document.lower == "istanbul total due: 4,250"
+    assert document.lower_prefix(8) == "istanbul"
+
+
+def test_citations_carry_page_line_and_span():
+    text = "Statement\nTotal Due: ₹4,250\fDue Date: 15 Nov 2025"
+    result = TemplateExtractor().extract(text, "credit-card-statement", pages=2)
+    citations = {c["field"]: c for c in result["citations"]}
+    start, end = citations["totalDue"]["span"]
+    assert text[start:end] == "4,250"
+    assert citations["totalDue"]["source"] == "page1:line2"
+    assert (citations["dueDate"]["page"], citations["dueDate"]["line"]) == (2, 1)
+
+
+def test_streaming_extraction_matches_full_text_extraction():
+    pages = [
+        "Landlord: Rajesh Kumar\nDeposit: ₹45,000",
+        "Tenant: Priya Sharma\nMonthly Rent: ₹15,000",
+        "Security Deposit: ₹50,000\nDuration: 11 months",
+    ]
+    extractor = TemplateExtractor()
+    stream = extractor.stream("rent-agreement")
+    for page in pages:
+        stream.feed(page)
+    stream.finish()
+    assert stream.result() == extractor.extract("\f".join(pages), "rent-agreement")
+
+
+def test_chunked_extraction_reuses_records_of_unchanged_chunks():
+    terms = "Terms: the premises are let for residential use only and may not be sublet. " * 4
+    pages = [
+        "Landlord: Rajesh Kumar\nDeposit: ₹45,000",
+        f"Tenant: Priya Sharma\n{terms}\nMonthly Rent: ₹15,000",
+        "Security Deposit: ₹50,000\nDuration: 11 months",
+    ]
+    text = "\f".join(pages)
+    assert [text[start:end] for start, end in split_chunks(text)] == pages
+    extractor = TemplateExtractor()
+    first = DocumentChunks(text, "v1")
+    assert extractor.extract(text, "rent-agreement", chunks=first) == extractor.extract(text, "rent-agreement")
+    records = first.updated()
+    
+    # Same pages re-uploaded with different spacing and one edited page
+    edited = "\f".join([
+        "Landlord:  Rajesh Kumar\nDeposit: ₹45,000",
+        f"Tenant: Priya Sharma\n{terms}\nMonthly Rent: ₹16,000",
+        pages[2],
+    ])
+    second = DocumentChunks(edited, "v1")
+    second.load(records.get(key) for key in second.keys)
+    # The respaced page shares its key but not its field records: offsets moved
+    assert second.keys[0] == first.keys[0] and second.keys[2] == first.keys[2]
+    assert second.reused == 1
+    assert extractor.extract(edited, "rent-agreement", chunks=second) == extractor.extract(edited, "rent-agreement")
+    assert list(second.updated()) == second.keys[:2]
+
+
+def test_chunked_extraction_finds_matches_across_chunk_boundaries():
+    notes = "\n".join(f"Note {i}: supply is billed at the notified tariff for the period" for i in range(8))
+    # "Amount Due:" is a content-defined cut point, so its value starts the next chunk
+    text = f"Consumer No: BRPL123456\n{notes}\nAmount Due:\n₹2,500.45\nDue Date: 20 Nov 2025\n{notes}\nUnits: 450"
+    spans = split_chunks(text)
+    assert any(text[start:end].endswith("Amount Due:") for start, end in spans[:-1])
+    extractor = TemplateExtractor()
+    expected = extractor.extract(text, "electricity-bill")
+    assert expected["extractions"]["billAmount"] == 2500.45
+    cold = DocumentChunks(text, "v1")
+    assert extractor.extract(text, "electricity-bill", chunks=cold) == expected
+    warm = DocumentChunks(text, "v1")
+    warm.load(cold.updated().get(key) for key in warm.keys)
+    assert extractor.extract(text, "electricity-bill", chunks=warm) == expected
+    assert not warm.updated()
+
+
+def test_content_defined_chunks_survive_an_inserted_line():
+    lines = [f"{i:04d} Lorem ipsum dolor sit amet, consectetur adipiscing elit" for i in range(400)]
+    text = "\n".join(lines)
+    edited = "\n".join(lines[:200] + ["An inserted line"] + lines[200:])
+    chunks = {text[start:end] for start, end in split_chunks(text)}
+    edited_chunks = [edited[start:end] for start, end in split_chunks(edited)]
+    assert sum(chunk not in chunks for chunk in edited_chunks) <= 2
+
+
+def test_bundle_matches_json_manifests(tmp_path):
+    bundled = load_templates()
+    for manifest in TEMPLATES_DIR.glob("*.json"):
+        (tmp_path / manifest.name).write_bytes(manifest.read_bytes())
+    from_json = load_templates(tmp_path)
+    assert set(bundled) == set(from_json)
+    for doc_type, template in bundled.items():
+        other = from_json[doc_type]
+        assert [f.name for f in template.fields] == [f.name for f in other.fields]
+        assert [[p.pattern for p in f.patterns] for f in template.fields] == \
+            [[p.pattern for p in f.patterns] for f in other.fields]
+        assert template.post_rules == other.post_rules
+        assert template.red_flags == other.red_flags
+        assert {issuer: [[p.pattern for p in f.patterns] for f in variant.fields]
+                for issuer, variant in template.issuer_variants.items()} == \
+            {issuer: [[p.pattern for p in f.patterns] for f in variant.fields]
+             for issuer, variant in other.issuer_variants.items()}
+
+
+def test_corrupt_bundle_fails_integrity_check(tmp_path):
+    data = bytearray((TEMPLATES_DIR / BUNDLE_NAME).read_bytes())
+    data[-1] ^= 0xFF
+    (tmp_path / BUNDLE_NAME).write_bytes(bytes(data))
+    with pytest.raises(TemplateError, match="integrity"):
+        load_templates(tmp_path)
+
+
+def test_registry_swaps_in_changed_templates(tmp_path):
+    template = {
+        "id": "memo",
+        "version": "1.0.0",
+        "fields": {"amount": {"patterns": ["Amount: (?P<value>[0-9]+)"]}},
+    }
+    write_template(tmp_path, template)
+    registry = TemplateRegistry(tmp_path)
+    extractor = TemplateExtractor(registry)
+    first = registry.current()
+    assert extractor.extract("Amount: 5", "memo")["extractions"] == {"amount": 5.0}
+    assert not registry.refresh()
+
+    template["version"] = "1.0.1"
+    template["fields"]["amount"]["patterns"] = ["Total: (?P<value>[0-9]+)"]
+    write_template(tmp_path, template)
+    os.utime(tmp_path / "memo.json", ns=(1, 1))
+    assert registry.refresh()
+    assert registry.current().version != first.version
+    assert extractor.extract("Total: 7", "memo")["extractions"] == {"amount": 7.0}
+
+    # A broken update keeps the last good set in service
+    template["fields"]["amount"]["patterns"] = ["Total: (?P<value>[0-9"]
+    write_template(tmp_path, template)
+    os.utime(tmp_path / "memo.json", ns=(2, 2))
+    assert not registry.refresh()
+    assert extractor.extract("Total: 7", "memo")["extractions"] == {"amount": 7.0}
+
+
+def test_bulk_explains_a_jsonl_corpus_in_order(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    lines = [
+        json.dumps({"id": "rent", "docText": "Landlord: Rajesh Kumar\nMonthly Rent: ₹15,000", "docMeta": {"typeHint": "rent-agreement"}}),
+        "not json",
+        json.dumps({"docText": "Total Due: ₹4,250\nDue Date: 15 Nov 2025\nIssuer: HDFC", "locale": "hi-IN"}),
+    ]
+    corpus.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    out = io.StringIO()
+    report = run_bulk(read_jsonl(corpus), out, workers=1).to_dict()
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["id"], r["ok"]) for r in results] == [("rent", True), ("2", False), ("3", True)]
+    assert results[0]["result"]["extractions"]["landlordName"] == "Rajesh Kumar"
+    assert results[2]["result"]["issuer"] == "HDFC"
+    assert (report["documents"], report["failed"]) == (3, 1)
+    rent = report["docTypes"]["rent-agreement"]
+    assert rent["fields"]["landlordName"] == 1.0 and rent["fields"]["tenantName"] == 0.0
+    assert report["docTypes"]["credit-card-statement"]["issuers"] == {"HDFC": 1}
+
+
+def test_bulk_reads_text_files_in_path_order(tmp_path):
+    for name in ("b.txt", "a/z.txt", "a/c/y.txt", "a.txt", "notes.md"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(name, encoding="utf-8")
+    records = list(read_directory(tmp_path))
+    assert [record.id for record in records] == ["a/c/y.txt", "a/z.txt", "a.txt", "b.txt"]
+    assert [record.text for record in records] == [record.id for record in records]
+
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text(json.dumps({"docText": ["not", "text"]}) + "\n", encoding="utf-8")
+    (record,) = read_jsonl(corpus)
+    assert record.error == "Invalid record: TypeError: 'docText' must be a string"
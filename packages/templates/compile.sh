@@ -2,5 +2,5 @@
 # Compile templates from YAML to JSON
 
 cd "$(dirname "$0")"
-python3 compiler.py
+python3 compiler.py "$@"
 
@@ -1,11 +1,57 @@
 #!/usr/bin/env python3
 """YAML template compiler to validated JSON for extraction engines."""
 
+import argparse
+import hashlib
 import json
+import os
 import re
+import struct
+import sys
+import time
+import zlib
 import yaml
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    # The regex parser moved to private modules in Python 3.11; their public aliases are deprecated there
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+# Binary bundle: header (magic, format version, reserved, sha256 of payload,
+# payload length) followed by a zlib-compressed compact JSON payload.
+BUNDLE_NAME = "templates.bundle"
+BUNDLE_MAGIC = b"SDTB"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_HEADER = struct.Struct(">4sHH32sI")
+
+# Section window length when a template does not set max_chars
+DEFAULT_SECTION_CHARS = 4000
+# Named groups every transactions row pattern must define (``type`` and ``balance`` are optional)
+TRANSACTION_GROUPS = ("date", "description")
+# A transactions row pattern needs at least one of these
+TRANSACTION_AMOUNT_GROUPS = ("amount", "withdrawal", "deposit")
+# Post-rule kinds the API knows how to apply
+POST_RULES = ("ensure_amount_numeric",)
+
+# Red-flag comparison: ``<operand> <op> <operand>``
+_COMPARISON = re.compile(r"\s*(.+?)\s*(>=|<=|==|!=|>|<)\s*(.+?)\s*")
+_DAYS_SINCE_OPERAND = re.compile(r"days_since\(\s*([A-Za-z_]\w*)\s*\)")
+_STRING_OPERAND = re.compile(r"\"([^\"]*)\"|'([^']*)'")
+_NUMBER_OPERAND = re.compile(r"-?\d+(?:\.\d+)?")
+_FIELD_OPERAND = re.compile(r"(?:(\d+(?:\.\d+)?)\s*\*\s*)?([A-Za-z_]\w*)")
+
+# The API service, whose extractor ``--check`` runs the samples through
+API_DIR = Path(__file__).resolve().parents[2] / "apps" / "api-explainer"
+
+# Part of every template's build key: changing the compiler invalidates all artifacts
+_COMPILER_HASH = hashlib.sha256(Path(__file__).read_bytes()).digest()
 
 
 def load_template(path: Path) -> Dict[str, Any]:
@@ -31,86 +77,561 @@ def validate_template(tpl: Dict[str, Any]) -> List[str]:
                 errors.append(f"Field '{field_name}' missing 'patterns'")
             elif not isinstance(field_def["patterns"], list):
                 errors.append(f"Field '{field_name}' patterns must be a list")
+            section = field_def.get("section")
+            if section is not None and section not in tpl.get("sections", {}):
+                errors.append(f"Field '{field_name}' uses undeclared section '{section}'")
+    for section_name, section_def in tpl.get("sections", {}).items():
+        if not isinstance(section_def.get("anchors"), list) or not section_def["anchors"]:
+            errors.append(f"Section '{section_name}' needs a non-empty 'anchors' list")
+    table = tpl.get("transactions")
+    if table is not None:
+        if not isinstance(table, dict) or "row" not in table:
+            errors.append("'transactions' needs a 'row' pattern")
+        elif table.get("section") is not None and table["section"] not in tpl.get("sections", {}):
+            errors.append(f"'transactions' uses undeclared section '{table['section']}'")
     return errors
 
 
+def normalize_pattern(pattern_str: str) -> str:
+    """Collapse repeated backslash escaping the same way the runtime loader does."""
+    normalized = pattern_str
+    previous = ""
+    while normalized != previous:
+        previous = normalized
+        normalized = normalized.replace("\\\\", "\\")
+    return normalized
+
+
+_REPEAT_OPS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+
+def _nested_repeats(items: Any, outer: str = "") -> List[str]:
+    """Describe unbounded quantifiers nested inside other unbounded quantifiers."""
+    problems = []
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            low, high, sub = av
+            unbounded = high == sre_constants.MAXREPEAT
+            here = {0: "*", 1: "+"}.get(low, "{%d,}" % low) if unbounded else ""
+            if unbounded and outer:
+                problems.append(f"'{here}' nested inside '{outer}'")
+            problems.extend(_nested_repeats(sub, outer or here))
+        elif op is sre_constants.SUBPATTERN:
+            problems.extend(_nested_repeats(av[-1], outer))
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                problems.extend(_nested_repeats(branch, outer))
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            problems.extend(_nested_repeats(av[1], outer))
+    return problems
+
+
+def lint_pattern(pattern: str) -> List[str]:
+    """Static backtracking checks for one normalized pattern. Returns problems found.
+    
+    Nested unbounded quantifiers such as ``(\\s*\\d+)*`` can backtrack
+    exponentially on near-miss input. Possessive quantifiers and atomic groups
+    never backtrack and are not flagged.
+    """
+    return _nested_repeats(sre_parse.parse(pattern))
+
+
 def compile_template(tpl: Dict[str, Any]) -> Dict[str, Any]:
     """Compile YAML template to JSON-ready extraction manifest."""
+    field_names = set(tpl.get("fields", {}))
     compiled = {
         "id": tpl["id"],
         "version": tpl["version"],
         "issuers": tpl.get("issuers", []),
         "fields": {},
-        "post_rules": tpl.get("post_rules", []),
-        "red_flags": tpl.get("red_flags", []),
+        "post_rules": compile_post_rules(tpl.get("post_rules", []), field_names),
+        "red_flags": compile_red_flags(tpl.get("red_flags", []), field_names),
+        "sections": {},
     }
     
-    # Compile regex patterns for each field
-    for field_name, field_def in tpl.get("fields", {}).items():
-        patterns = []
-        for pattern_str in field_def.get("patterns", []):
+    for section_name, section_def in tpl.get("sections", {}).items():
+        for anchor_str in section_def["anchors"]:
+            anchor = normalize_pattern(anchor_str)
             try:
-                # Validate regex
-                re.compile(pattern_str)
-                patterns.append(pattern_str)
+                re.compile(anchor)
             except re.error as e:
-                raise ValueError(f"Invalid regex in field '{field_name}': {e}")
-        
+                raise ValueError(f"Invalid anchor in section '{section_name}': {e}") from e
+            problems = lint_pattern(anchor)
+            if problems:
+                raise ValueError(f"Unsafe anchor in section '{section_name}': {'; '.join(problems)}")
+        compiled["sections"][section_name] = {
+            "anchors": section_def["anchors"],
+            "max_chars": section_def.get("max_chars", DEFAULT_SECTION_CHARS),
+        }
+    
+    # Compile regex patterns for each field
+    for field_name, field_def in tpl.get("fields", {}).items():
         compiled["fields"][field_name] = {
-            "patterns": patterns,
+            "patterns": compile_patterns(field_def.get("patterns", []), f"field '{field_name}'"),
             "group_name": "value"  # Default capture group name
         }
+        if "section" in field_def:
+            compiled["fields"][field_name]["section"] = field_def["section"]
+    
+    if "issuer_overrides" in tpl:
+        compiled["issuer_overrides"] = compile_issuer_overrides(tpl)
+    
+    if "transactions" in tpl:
+        compiled["transactions"] = compile_transaction_table(tpl["transactions"])
     
     return compiled
 
 
-def compile_all_templates(templates_dir: Path, output_dir: Path) -> None:
-    """Compile all YAML templates to JSON in output directory."""
-    output_dir.mkdir(parents=True, exist_ok=True)
-    templates = list(templates_dir.glob("*.yaml"))
-    
-    compiled_templates = []
-    errors = []
+def compile_patterns(patterns: List[str], where: str) -> List[str]:
+    """Check that each pattern compiles as the runtime will compile it and passes the lint."""
+    for pattern_str in patterns:
+        try:
+            re.compile(normalize_pattern(pattern_str))
+        except re.error as e:
+            raise ValueError(f"Invalid regex in {where}: {e}") from e
+        problems = lint_pattern(normalize_pattern(pattern_str))
+        if problems:
+            raise ValueError(f"Unsafe regex in {where}: {'; '.join(problems)}")
+    return list(patterns)
+
+
+def compile_issuer_overrides(tpl: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate issuer-specific detection keywords and field patterns.
     
-    for tpl_path in templates:
+    Each key names one of the template's ``issuers``. ``keywords`` (lowercase
+    regexes) replace the default detection keyword derived from the issuer
+    name; ``fields`` map template fields to patterns tried before the
+    field's own.
+    """
+    overrides = tpl["issuer_overrides"]
+    if not isinstance(overrides, dict):
+        raise ValueError("'issuer_overrides' must be a mapping of issuer to overrides")
+    compiled = {}
+    for issuer, override in overrides.items():
+        where = f"issuer override '{issuer}'"
+        if issuer not in tpl.get("issuers", []):
+            raise ValueError(f"{where} is not one of the template's issuers")
+        entry: Dict[str, Any] = {}
+        if "keywords" in override:
+            keywords = override["keywords"]
+            if not isinstance(keywords, list) or not keywords:
+                raise ValueError(f"{where} needs a non-empty 'keywords' list")
+            entry["keywords"] = compile_patterns(keywords, f"{where} keywords")
+        entry["fields"] = {}
+        for field_name, field_def in override.get("fields", {}).items():
+            if field_name not in tpl.get("fields", {}):
+                raise ValueError(f"{where} overrides unknown field '{field_name}'")
+            entry["fields"][field_name] = {
+                "patterns": compile_patterns(field_def.get("patterns", []), f"{where} field '{field_name}'"),
+            }
+        compiled[issuer] = entry
+    return compiled
+
+
+def compile_transaction_table(table: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a transaction-table row pattern (and optional fee pattern)."""
+    compiled = {key: table[key] for key in ("row", "fees", "section") if key in table}
+    for key in ("row", "fees"):
+        if key not in table:
+            continue
         try:
-            tpl = load_template(tpl_path)
-            validation_errors = validate_template(tpl)
-            if validation_errors:
-                errors.extend([f"{tpl_path.name}: {e}" for e in validation_errors])
-                continue
-            
+            pattern = re.compile(normalize_pattern(table[key]))
+        except re.error as e:
+            raise ValueError(f"Invalid transactions {key} regex: {e}") from e
+        problems = lint_pattern(normalize_pattern(table[key]))
+        if problems:
+            raise ValueError(f"Unsafe transactions {key} regex: {'; '.join(problems)}")
+        if key == "row":
+            missing = [g for g in TRANSACTION_GROUPS if g not in pattern.groupindex]
+            if not any(g in pattern.groupindex for g in TRANSACTION_AMOUNT_GROUPS):
+                missing.append(" or ".join(TRANSACTION_AMOUNT_GROUPS))
+            if missing:
+                raise ValueError(f"Transactions row regex missing group(s): {', '.join(missing)}")
+    return compiled
+
+
+def _check_fields(names: Any, field_names: set, where: str) -> List[str]:
+    if not isinstance(names, list) or not names:
+        raise ValueError(f"{where} needs a non-empty list of fields")
+    unknown = [name for name in names if name not in field_names]
+    if unknown:
+        raise ValueError(f"{where} uses unknown field(s): {', '.join(map(str, unknown))}")
+    return names
+
+
+def compile_post_rules(rules: List[Any], field_names: set) -> List[Dict[str, Any]]:
+    """Validate post-rules: single-key mappings of a known rule kind to its fields."""
+    compiled = []
+    for rule in rules:
+        if not isinstance(rule, dict) or len(rule) != 1:
+            raise ValueError(f"Post-rule must be a single-key mapping, got {rule!r}")
+        (kind, fields), = rule.items()
+        if kind not in POST_RULES:
+            raise ValueError(f"Unknown post-rule '{kind}'")
+        compiled.append({kind: _check_fields(fields, field_names, f"Post-rule '{kind}'")})
+    return compiled
+
+
+def compile_operand(text: str, field_names: set, where: str) -> Dict[str, Any]:
+    """Parse one side of a comparison into ``{"field", "factor"}``, ``{"days_since"}`` or ``{"value"}``."""
+    match = _DAYS_SINCE_OPERAND.fullmatch(text)
+    if match:
+        _check_fields([match.group(1)], field_names, where)
+        return {"days_since": match.group(1)}
+    match = _STRING_OPERAND.fullmatch(text)
+    if match:
+        return {"value": match.group(1) if match.group(1) is not None else match.group(2)}
+    if _NUMBER_OPERAND.fullmatch(text):
+        return {"value": float(text)}
+    match = _FIELD_OPERAND.fullmatch(text)
+    if not match:
+        raise ValueError(f"{where}: cannot parse operand '{text}'")
+    _check_fields([match.group(2)], field_names, where)
+    operand: Dict[str, Any] = {"field": match.group(2)}
+    if match.group(1):
+        operand["factor"] = float(match.group(1))
+    return operand
+
+
+def compile_condition(condition: Any, field_names: set, where: str) -> Dict[str, Any]:
+    """Parse one red-flag condition into the structured form the API compiles to predicates.
+
+    ``compare: "<operand> <op> <operand>"`` compares field values (optionally
+    scaled, ``3 * monthlyRent``), ``days_since(<dateField>)``, numbers and
+    quoted strings; ``keyword: [...]`` holds when any keyword appears in the
+    document (case-insensitive); ``missing: [...]`` when none of the fields
+    was extracted.
+    """
+    if not isinstance(condition, dict) or len(condition) != 1:
+        raise ValueError(f"{where}: condition must be a single-key mapping, got {condition!r}")
+    (kind, arg), = condition.items()
+    if kind == "compare":
+        match = _COMPARISON.fullmatch(arg) if isinstance(arg, str) else None
+        if not match:
+            raise ValueError(f"{where}: cannot parse comparison {arg!r}")
+        left, op, right = match.groups()
+        return {"compare": {
+            "left": compile_operand(left, field_names, where),
+            "op": op,
+            "right": compile_operand(right, field_names, where),
+        }}
+    if kind == "keyword":
+        if not isinstance(arg, list) or not arg or not all(isinstance(k, str) and k for k in arg):
+            raise ValueError(f"{where}: 'keyword' needs a non-empty list of strings")
+        return {"keyword": [keyword.lower() for keyword in arg]}
+    if kind == "missing":
+        return {"missing": _check_fields(arg, field_names, where)}
+    raise ValueError(f"{where}: unknown condition '{kind}'")
+
+
+def compile_red_flags(flags: List[Any], field_names: set) -> List[Dict[str, Any]]:
+    """Compile ``red_flags`` entries (``<id>: {message, when: [conditions]}``) to ``{"id", "message", "when"}``."""
+    compiled = []
+    for flag in flags:
+        if not isinstance(flag, dict) or len(flag) != 1:
+            raise ValueError(f"Red flag must be a single-key mapping, got {flag!r}")
+        (flag_id, flag_def), = flag.items()
+        where = f"Red flag '{flag_id}'"
+        if not isinstance(flag_def, dict) or not flag_def.get("message") or not flag_def.get("when"):
+            raise ValueError(f"{where} needs a 'message' and a non-empty 'when' list")
+        compiled.append({
+            "id": flag_id,
+            "message": flag_def["message"],
+            "when": [compile_condition(condition, field_names, where) for condition in flag_def["when"]],
+        })
+    return compiled
+
+
+def bundle_template(compiled: Dict[str, Any]) -> Dict[str, Any]:
+    """Bundle form of a compiled template: patterns and anchors pre-normalized."""
+    bundled = {key: value for key, value in compiled.items() if key not in ("source", "source_hash")}
+    bundled["fields"] = {
+        field_name: {**field_def, "patterns": [normalize_pattern(p) for p in field_def["patterns"]]}
+        for field_name, field_def in compiled["fields"].items()
+    }
+    bundled["sections"] = {
+        section_name: {**section_def, "anchors": [normalize_pattern(a) for a in section_def["anchors"]]}
+        for section_name, section_def in compiled["sections"].items()
+    }
+    if "issuer_overrides" in compiled:
+        bundled["issuer_overrides"] = {
+            issuer: {
+                **override,
+                **({"keywords": [normalize_pattern(k) for k in override["keywords"]]} if "keywords" in override else {}),
+                "fields": {
+                    field_name: {"patterns": [normalize_pattern(p) for p in field_def["patterns"]]}
+                    for field_name, field_def in override["fields"].items()
+                },
+            }
+            for issuer, override in compiled["issuer_overrides"].items()
+        }
+    if "transactions" in compiled:
+        bundled["transactions"] = {
+            key: normalize_pattern(value) if key in ("row", "fees") else value
+            for key, value in compiled["transactions"].items()
+        }
+    return bundled
+
+
+def write_bundle(compiled_templates: List[Dict[str, Any]], index: Dict[str, Any], path: Path) -> str:
+    """Write all compiled templates and the index as one binary bundle. Returns the payload hash."""
+    payload = json.dumps(
+        {
+            "patterns_normalized": True,
+            "templates": [bundle_template(t) for t in compiled_templates],
+            "index": index,
+        },
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+    payload = zlib.compress(payload, 9)
+    digest = hashlib.sha256(payload).digest()
+    header = BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, 0, digest, len(payload))
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header + payload)
+    tmp_path.replace(path)
+    return digest.hex()
+
+
+@dataclass
+class TemplateResult:
+    """Outcome of compiling (or checking) one YAML template."""
+
+    source: str
+    status: str  # "compiled", "cached" or "failed"
+    seconds: float = 0.0
+    compiled: Optional[Dict[str, Any]] = None
+    errors: List[str] = field(default_factory=list)
+    samples: int = 0
+
+
+def source_hash(source: bytes) -> str:
+    """Build key of a YAML template: its bytes and this compiler's source, so a compiler change rebuilds everything."""
+    return hashlib.sha256(_COMPILER_HASH + source).hexdigest()
+
+
+class _SampleRegistry:
+    """One compiled template in the shape the API's ``TemplateExtractor`` reads its registry."""
+
+    def __init__(self, template_set: Any):
+        self._set = template_set
+
+    def current(self) -> Any:
+        return self._set
+
+
+def _sample_extractor(compiled: Dict[str, Any]) -> Any:
+    """The API's ``TemplateExtractor`` over ``compiled`` alone; imports the API (``--check`` only)."""
+    if str(API_DIR) not in sys.path:
+        sys.path.insert(0, str(API_DIR))
+    from app.extractors import TemplateExtractor
+    from app.registry import TemplateSet, compile_template as compile_runtime_template
+
+    template = compile_runtime_template(compiled)
+    template_set = TemplateSet(MappingProxyType({template.id: template}), {"docTypes": []}, compiled["source_hash"])
+    return TemplateExtractor(_SampleRegistry(template_set))
+
+
+def extract_sample(extractor: Any, doc_type: str, text: str) -> Tuple[Dict[str, str], Optional[str]]:
+    """Field values the API extracts from ``text`` as ``doc_type``, and the issuer it detects.
+
+    The API's own ``Document`` and ``TemplateExtractor`` do the work (text
+    normalization, issuer detection and overrides, sections), so a sample
+    passes only if the service would find the same. Values are the matched
+    text at each field's citation span, before post-rules turn amounts into
+    numbers.
+    """
+    from app.document import Document
+
+    document = Document(text)
+    result = extractor.extract(document, doc_type)
+    values = {
+        citation["field"]: document.text[citation["span"][0]:citation["span"][1]].strip()
+        for citation in result["citations"]
+    }
+    return values, result.get("issuer")
+
+
+def check_samples(tpl: Dict[str, Any], compiled: Dict[str, Any]) -> List[str]:
+    """Extract every sample of ``tpl`` and compare with its ``expect`` values. Returns problems found.
+
+    A sample is a string, which must yield at least one field, or a mapping
+    with ``text``, an optional ``issuer`` the API must detect and ``expect``:
+    field values the sample must yield (``null`` for a field it must not).
+    """
+    problems = []
+    extractor = _sample_extractor(compiled) if tpl.get("samples") else None
+    for number, sample in enumerate(tpl.get("samples", []), 1):
+        if isinstance(sample, str):
+            sample = {"text": sample}
+        if not isinstance(sample, dict) or not isinstance(sample.get("text"), str):
+            problems.append(f"Sample {number} must be a string or a mapping with 'text'")
+            continue
+        values, issuer = extract_sample(extractor, compiled["id"], sample["text"])
+        if "issuer" in sample and issuer != sample["issuer"]:
+            problems.append(f"Sample {number}: expected issuer {sample['issuer']!r}, detected {issuer!r}")
+        expect = sample.get("expect")
+        if expect is None:
+            if not values:
+                problems.append(f"Sample {number} extracts no fields")
+            continue
+        for field_name, expected in expect.items():
+            if field_name not in compiled["fields"]:
+                problems.append(f"Sample {number} expects unknown field '{field_name}'")
+            elif values.get(field_name) != (None if expected is None else str(expected)):
+                problems.append(
+                    f"Sample {number} field '{field_name}': expected {expected!r}, got {values.get(field_name)!r}"
+                )
+    return problems
+
+
+def compile_source(path: Path, check: bool = False) -> TemplateResult:
+    """Load, validate and compile one YAML template; with ``check``, also run its samples.
+
+    Runs in compiler worker processes, so it only reports: writing the
+    artifacts is left to ``compile_all_templates``.
+    """
+    start = time.perf_counter()
+    result = TemplateResult(source=path.name, status="failed")
+    try:
+        source = path.read_bytes()
+        tpl = yaml.safe_load(source)
+        result.errors = validate_template(tpl)
+        if not result.errors:
             compiled = compile_template(tpl)
-            output_path = output_dir / f"{tpl['id']}.json"
-            
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(compiled, f, indent=2, ensure_ascii=False)
-            
-            compiled_templates.append({
-                "id": compiled["id"],
-                "version": compiled["version"],
-                "issuers": compiled["issuers"]
-            })
-            
-        except Exception as e:
-            errors.append(f"{tpl_path.name}: {e}")
+            compiled["source"] = path.name
+            compiled["source_hash"] = source_hash(source)
+            if check:
+                result.errors = check_samples(tpl, compiled)
+                result.samples = len(tpl.get("samples", []))
+            if not result.errors:
+                result.status, result.compiled = "compiled", compiled
+    except Exception as e:
+        result.errors = [str(e)]
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def load_artifacts(output_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Compiled templates in ``output_dir``, keyed by the YAML file they were built from."""
+    artifacts = {}
+    for path in sorted(output_dir.glob("*.json")):
+        if path.name == "index.json":
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                compiled = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(compiled, dict) and "source" in compiled:
+            artifacts[compiled["source"]] = compiled
+    return artifacts
+
+
+def _run(paths: List[Path], check: bool, jobs: int) -> List[TemplateResult]:
+    """Compile ``paths`` across ``jobs`` worker processes, in order."""
+    if jobs <= 1 or len(paths) <= 1:
+        return [compile_source(path, check) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+        return list(pool.map(compile_source, paths, [check] * len(paths)))
+
+
+def print_report(results: List[TemplateResult], wall_seconds: float, check: bool) -> None:
+    """Per-template status and compile time, slowest first, then totals."""
+    width = max((len(result.source) for result in results), default=8)
+    print(f"{'Template':<{width}}  {'Status':<8}  {'Time':>9}" + ("  Samples" if check else ""))
+    for result in sorted(results, key=lambda r: r.seconds, reverse=True):
+        line = f"{result.source:<{width}}  {result.status:<8}  {result.seconds * 1000:>6.1f} ms"
+        if check:
+            line += f"  {result.samples:>7}"
+        print(line)
+    counts = {status: sum(1 for r in results if r.status == status) for status in ("compiled", "cached", "failed")}
+    print(
+        f"{counts['compiled']} compiled, {counts['cached']} cached, {counts['failed']} failed "
+        f"in {wall_seconds * 1000:.0f} ms ({sum(r.seconds for r in results) * 1000:.0f} ms compiling)"
+    )
+
+
+def compile_all_templates(
+    templates_dir: Path,
+    output_dir: Path,
+    force: bool = False,
+    check: bool = False,
+    jobs: Optional[int] = None,
+) -> None:
+    """Compile all YAML templates to JSON in output directory.
+    
+    Templates whose build key matches the ``source_hash`` of their compiled
+    JSON are not recompiled unless ``force`` is set; the rest are compiled
+    across ``jobs`` processes (default: one per CPU). The index and bundle are
+    always rewritten from every template. If any template fails, nothing is
+    written.
     
-    # Write index
-    index_path = output_dir / "index.json"
-    with open(index_path, "w", encoding="utf-8") as f:
-        json.dump({"docTypes": compiled_templates}, f, indent=2, ensure_ascii=False)
+    With ``check``, nothing is written: every template is compiled, its
+    samples are extracted and compared with their expected values, and
+    compiled JSON that is out of date with its YAML is an error.
+    """
+    start = time.perf_counter()
+    templates = sorted(templates_dir.glob("*.yaml"))
+    artifacts = load_artifacts(output_dir) if output_dir.exists() else {}
+    jobs = jobs or os.cpu_count() or 1
     
+    results: Dict[str, TemplateResult] = {}
+    pending = []
+    for tpl_path in templates:
+        artifact = artifacts.get(tpl_path.name)
+        if force or check or artifact is None or artifact.get("source_hash") != source_hash(tpl_path.read_bytes()):
+            pending.append(tpl_path)
+        else:
+            results[tpl_path.name] = TemplateResult(source=tpl_path.name, status="cached", compiled=artifact)
+    for result in _run(pending, check, jobs):
+        results[result.source] = result
+    ordered = [results[tpl_path.name] for tpl_path in templates]
+    
+    errors = [f"{result.source}: {error}" for result in ordered for error in result.errors]
+    if check:
+        for result in ordered:
+            artifact = artifacts.get(result.source)
+            if result.compiled and (artifact is None or artifact.get("source_hash") != result.compiled["source_hash"]):
+                errors.append(f"{result.source}: compiled JSON is out of date, run compiler.py")
+    
+    compiled_templates = [result.compiled for result in ordered if result.compiled is not None]
+    index_entries = [
+        {"id": compiled["id"], "version": compiled["version"], "issuers": compiled["issuers"]}
+        for compiled in compiled_templates
+    ]
+    index = {"docTypes": index_entries}
+    
+    print_report(ordered, time.perf_counter() - start, check)
     if errors:
+        # Nothing is written, so the JSON, index and bundle never disagree
         print("Errors during compilation:")
         for error in errors:
             print(f"  - {error}")
         raise ValueError(f"Compilation failed with {len(errors)} error(s)")
     
-    print(f"Compiled {len(compiled_templates)} templates successfully")
+    if check:
+        print(f"Checked {len(compiled_templates)} templates and their samples")
+        return
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for result in ordered:
+        if result.status == "compiled":
+            with open(output_dir / f"{result.compiled['id']}.json", "w", encoding="utf-8") as f:
+                json.dump(result.compiled, f, indent=2, ensure_ascii=False)
+    with open(output_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    digest = write_bundle(compiled_templates, index, output_dir / BUNDLE_NAME)
+    print(f"Compiled {len(compiled_templates)} templates successfully (bundle sha256 {digest[:12]})")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check", action="store_true",
+                        help="validate templates and their samples without writing anything")
+    parser.add_argument("--force", action="store_true", help="recompile templates whose YAML is unchanged")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
     templates_dir = Path(__file__).parent
     output_dir = templates_dir / "compiled"
-    compile_all_templates(templates_dir, output_dir)
-
+    compile_all_templates(templates_dir, output_dir, force=args.force, check=args.check, jobs=args.jobs)